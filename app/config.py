@@ -9,6 +9,15 @@ DETECTION_CONFIG = {
     'fuzzy_match_threshold': 0.75,  # Fuzzy matching threshold
     'min_confidence': 0.5,  # Minimum confidence for spam detection
     'max_keywords_per_message': 10,  # Maximum keywords to extract
+    'fuzzy_memo_size': 50000,  # Maximum words kept in the fuzzy match memo
+    'custom_keyword_weight': 0.85,  # Weight of keywords added with /addkeyword
+    'blacklist_keyword_weight': 1.0,  # Weight of non-custom rows in the keywords table
+    'chat_detector_cache_size': 2000,  # Maximum chat detectors kept in memory
+    'chat_fuzzy_memo_size': 1000,  # Fuzzy match memo size per chat detector
+    'batch_vectorize_min_size': 16,  # Smaller batches are scored without NumPy
+    'process_pool_workers': 2,  # Processes running fuzzy matching of long messages
+    'process_pool_min_length': 1024,  # Shorter messages are detected in the event loop
+    'process_pool_timeout': 0.5,  # Seconds before falling back to the exact-match verdict
 }
 
 # ==================== Cache Settings ====================
@@ -16,6 +25,27 @@ CACHE_CONFIG = {
     'ttl': 3600,  # Time to live in seconds (1 hour)
     'max_size': 1000,  # Maximum cache entries
     'cleanup_interval': 300,  # Cleanup interval in seconds (5 minutes)
+    'verdict_max_size': 20000,  # Maximum cached detection verdicts
+    'verdict_ttl': 900,  # Verdict lifetime in seconds (15 minutes)
+    'chat_settings_max_size': 10000,  # Maximum chats with cached settings
+    'chat_settings_ttl': 600,  # Reload settings changed by another process (10 minutes)
+    'admin_roster_ttl': 600,  # Refresh chat administrators missed by member updates (10 minutes)
+    'admin_roster_max_size': 10000,  # Maximum chats with a cached administrator roster
+}
+
+# ==================== Near-Duplicate Index Settings ====================
+NEAR_DUPLICATE_CONFIG = {
+    'similarity_threshold': 0.75,  # Minimum estimated Jaccard similarity
+    'max_entries': 5000,  # Maximum deleted messages kept in the index
+    'ttl': 86400,  # Seconds a deleted message stays in the index (24 hours)
+    'num_bins': 64,  # MinHash signature length
+    'band_size': 4,  # Signature slots per LSH band (16 bands)
+    'shingle_size': 4,  # Characters per shingle
+    'min_length': 30,  # Shorter messages are not indexed or checked
+    'max_length': 500,  # Same prefix that is stored in deleted_messages
+    'max_bucket_size': 32,  # Newest messages kept per LSH bucket
+    'max_candidates': 64,  # Candidates verified per query
+    'min_band_hits': 2,  # Candidates sharing a single band are chance collisions
 }
 
 # ==================== Rate Limiting Settings ====================
@@ -24,6 +54,7 @@ RATE_LIMIT_CONFIG = {
     'message_time_window': 60,  # Time window in seconds
     'command_max_requests': 10,  # Max commands per minute
     'command_time_window': 60,  # Time window in seconds
+    'max_tracked_keys': 200000,  # Least recently seen users are dropped beyond this
 }
 
 # ==================== Database Settings ====================
@@ -32,6 +63,56 @@ DATABASE_CONFIG = {
     'batch_size': 100,  # Batch size for database operations
     'connection_timeout': 30,  # Connection timeout in seconds
     'max_retries': 3,  # Maximum retry attempts
+    'executor_workers': 4,  # Threads running database calls for async handlers
+    'write_behind_interval_ms': 200,  # Maximum delay before queued records are written
+    'write_behind_batch_rows': 500,  # Rows written per transaction
+    'write_behind_queue_size': 10000,  # Queued rows before producers wait
+    'write_behind_retry_ms': 500,  # Delay before retrying a failed batch, doubled per failure
+    'write_behind_max_retry_ms': 30000,  # Maximum delay between retries
+}
+
+# ==================== Dispatcher Settings ====================
+DISPATCHER_CONFIG = {
+    'workers': 8,  # Chats processed concurrently
+    'quantum': 4,  # Messages a chat processes per turn before the next chat
+    'max_queue_per_chat': 200,  # Queued messages per chat before new updates wait
+    'max_pending': 5000,  # Queued messages across all chats before new updates wait
+}
+
+# ==================== Outbound Telegram Requests ====================
+OUTBOUND_CONFIG = {
+    'workers': 8,  # Telegram requests in flight at the same time
+    'global_requests_per_second': 30,  # Bot API global limit
+    'chat_messages_per_minute': 20,  # Sent or edited messages per group per minute
+    'max_retries': 3,  # 429 retries before the error reaches the caller
+}
+
+# ==================== Member Reputation ====================
+REPUTATION_CONFIG = {
+    'trust_threshold': 100.0,  # Decayed score from which a member gets only the cheap stages
+    'half_life_days': 30,  # Days for a member's score to lose half its value
+    'spam_penalty': 200.0,  # Score subtracted (from at most zero) for each spam message
+    'max_entries': 200000,  # (chat, user) records kept in memory
+    'flush_interval': 30,  # Seconds between batched writes to user_statistics
+}
+
+# ==================== Admin Notifications ====================
+NOTIFICATION_CONFIG = {
+    'digest_window': 300,  # Seconds of spam events collected into one digest per chat
+    'top_keywords': 5,  # Keywords listed in a digest
+    'top_offenders': 3,  # Users listed in a digest
+    'max_chats': 10000,  # Chats with a pending digest before new events are dropped
+}
+
+# ==================== Webhook Settings ====================
+WEBHOOK_CONFIG = {
+    'host': '0.0.0.0',  # Interface the webhook server listens on
+    'port': 8443,  # Webhook server port
+    'path': '/telegram/webhook',  # URL path Telegram posts updates to
+    'max_queued_updates': 1000,  # Updates waiting in the application before 503
+    'retry_after': 1,  # Retry-After seconds sent with 503
+    'workers': 0,  # Prefork worker processes (0 = one per CPU core)
+    'worker_buffer_bytes': 1048576,  # Unsent bytes per worker before 503
 }
 
 # ==================== Logging Settings ====================
@@ -106,6 +187,8 @@ MESSAGE_CONFIG = {
     'max_message_length': 4096,  # Telegram max message length
     'min_message_length': 1,  # Minimum message length to process
     'spam_delete_delay': 5,  # Delay before deleting spam (seconds)
+    'bulk_delete_batch_size': 100,  # Message ids per deleteMessages request (Telegram max)
+    'delete_latency_buckets_ms': (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),  # Time-to-delete histogram
 }
 
 # ==================== Admin Settings ====================
@@ -125,6 +208,18 @@ FEATURES = {
     'enable_username_filtering': True,
     'enable_auto_cleanup': True,
     'enable_learning': False,  # Self-learning disabled for now
+    
+    # Detection pipeline stages (ordered by cost)
+    'enable_empty_message_stage': True,  # Messages without letters or digits are ham
+    'enable_verdict_cache': True,  # Known template fingerprints reuse their verdict
+    'enable_near_duplicate_detection': True,  # Near-copies of deleted spam are spam
+    'enable_early_exit': True,  # Skip fuzzy matching once the verdict cannot change
+    'enable_fuzzy_matching': True,  # Fuzzy keyword matching (most expensive stage)
+    'enable_detection_process_pool': False,  # Fuzzy matching of long messages in worker processes
+    'enable_trusted_fast_path': True,  # Trusted members get only the cheap stages
+    
+    # Notifications
+    'enable_group_spam_digest': False,  # Post spam digests (with offender names) into the group
 }
 
 # ==================== Error Messages ====================
@@ -7,6 +7,9 @@ from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler
 from app.models.init_db import SessionLocal
 from app.services.database_service import DatabaseService
+from app.services.admin_roster import admin_roster
+from app.services.outbound_scheduler import outbound
+from app.services.chat_detector_registry import chat_detector_registry
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,13 +33,14 @@ class AdminHandler:
             chat_id = update.effective_chat.id
             DatabaseService.set_chat_enabled(db, chat_id, True)
             
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "✅ تم تفعيل البوت بنجاح!\n\n"
                 "🤖 البوت الآن يراقب الرسائل ويحذف الإعلانات المزعجة."
             )
         except Exception as e:
             logger.error(f"خطأ في تفعيل البوت: {e}")
-            await update.message.reply_text(f"❌ خطأ: {str(e)}")
+            await outbound.reply_text(update.message, f"❌ خطأ: {str(e)}")
         finally:
             db.close()
     
@@ -55,13 +59,14 @@ class AdminHandler:
             chat_id = update.effective_chat.id
             DatabaseService.set_chat_enabled(db, chat_id, False)
             
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ تم تعطيل البوت.\n\n"
                 "🔇 البوت الآن لن يراقب الرسائل أو يحذفها."
             )
         except Exception as e:
             logger.error(f"خطأ في تعطيل البوت: {e}")
-            await update.message.reply_text(f"❌ خطأ: {str(e)}")
+            await outbound.reply_text(update.message, f"❌ خطأ: {str(e)}")
         finally:
             db.close()
     
@@ -76,7 +81,8 @@ class AdminHandler:
             return
         
         if not context.args or not context.args[0]:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ الاستخدام: /sensitivity <رقم من 0.1 إلى 1.0>\n\n"
                 "أمثلة:\n"
                 "  /sensitivity 0.5  (حساسية منخفضة)\n"
@@ -89,7 +95,8 @@ class AdminHandler:
             sensitivity = float(context.args[0])
             
             if not 0.1 <= sensitivity <= 1.0:
-                await update.message.reply_text(
+                await outbound.reply_text(
+                    update.message,
                     "❌ الرقم يجب أن يكون بين 0.1 و 1.0"
                 )
                 return
@@ -98,7 +105,8 @@ class AdminHandler:
             DatabaseService.set_chat_sensitivity(db, update.effective_chat.id, sensitivity)
             db.close()
             
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 f"✅ تم تعديل حساسية الكشف إلى {sensitivity * 100:.0f}%\n\n"
                 f"📊 التفسير:\n"
                 f"  • 0.1 = حساسية منخفضة جداً (قد تفوت بعض الإعلانات)\n"
@@ -106,7 +114,8 @@ class AdminHandler:
                 f"  • 1.0 = حساسية عالية جداً (قد تحذف رسائل عادية)"
             )
         except ValueError:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ الرجاء إدخال رقم صحيح (مثل 0.5 أو 0.7)"
             )
     
@@ -121,7 +130,8 @@ class AdminHandler:
             return
         
         if not context.args:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ الاستخدام: /whitelist <user_id>\n\n"
                 "مثال: /whitelist 123456789\n\n"
                 "💡 المستخدمون في القائمة البيضاء لن يتم حذف رسائلهم."
@@ -137,17 +147,19 @@ class AdminHandler:
             )
             db.close()
             
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 f"✅ تم إضافة المستخدم {user_id} إلى القائمة البيضاء\n\n"
                 f"🔐 رسائل هذا المستخدم لن يتم حذفها."
             )
         except ValueError:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ الرجاء إدخال معرف مستخدم صحيح (أرقام فقط)"
             )
         except Exception as e:
             logger.error(f"خطأ في إضافة المستخدم للقائمة البيضاء: {e}")
-            await update.message.reply_text(f"❌ خطأ: {str(e)}")
+            await outbound.reply_text(update.message, f"❌ خطأ: {str(e)}")
     
     @staticmethod
     async def manage_blacklist(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -160,7 +172,8 @@ class AdminHandler:
             return
         
         if not context.args:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ الاستخدام: /blacklist <user_id>\n\n"
                 "مثال: /blacklist 123456789\n\n"
                 "⚠️ رسائل المستخدمين في القائمة السوداء سيتم حذفها تلقائياً."
@@ -176,17 +189,19 @@ class AdminHandler:
             )
             db.close()
             
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 f"✅ تم إضافة المستخدم {user_id} إلى القائمة السوداء\n\n"
                 f"⚠️ جميع رسائل هذا المستخدم ستُحذف تلقائياً."
             )
         except ValueError:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ الرجاء إدخال معرف مستخدم صحيح (أرقام فقط)"
             )
         except Exception as e:
             logger.error(f"خطأ في إضافة المستخدم للقائمة السوداء: {e}")
-            await update.message.reply_text(f"❌ خطأ: {str(e)}")
+            await outbound.reply_text(update.message, f"❌ خطأ: {str(e)}")
     
     @staticmethod
     async def generate_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -222,12 +237,12 @@ class AdminHandler:
 
 ⏰ **آخر تحديث:** الآن
 """
-            
-            await update.message.reply_text(report, parse_mode="Markdown")
+
+            await outbound.reply_text(update.message, report, parse_mode="Markdown")
         
         except Exception as e:
             logger.error(f"خطأ في توليد التقرير: {e}")
-            await update.message.reply_text(f"❌ خطأ: {str(e)}")
+            await outbound.reply_text(update.message, f"❌ خطأ: {str(e)}")
         
         finally:
             db.close()
@@ -252,7 +267,8 @@ class AdminHandler:
             logs = DatabaseService.get_activity_logs(db, chat_id, days)
             
             if not logs:
-                await update.message.reply_text(
+                await outbound.reply_text(
+                    update.message,
                     f"ℹ️ لا توجد سجلات في آخر {days} يوم"
                 )
                 db.close()
@@ -265,11 +281,11 @@ class AdminHandler:
                 logs_text += f"  المستخدم: {log.get('user_name', 'N/A')}\n"
                 logs_text += f"  الوقت: {log.get('timestamp', 'N/A')}\n\n"
             
-            await update.message.reply_text(logs_text, parse_mode="Markdown")
+            await outbound.reply_text(update.message, logs_text, parse_mode="Markdown")
         
         except Exception as e:
             logger.error(f"خطأ في عرض السجلات: {e}")
-            await update.message.reply_text(f"❌ خطأ: {str(e)}")
+            await outbound.reply_text(update.message, f"❌ خطأ: {str(e)}")
         
         finally:
             db.close()
@@ -278,13 +294,16 @@ class AdminHandler:
     async def _check_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
         """التحقق من أن المستخدم مسؤول"""
         try:
-            member = await context.bot.get_chat_member(
+            # من قائمة المسؤولين المحفوظة بدلاً من get_chat_member لكل أمر
+            member = await admin_roster.get_member(
+                context.bot,
                 update.effective_chat.id,
                 update.effective_user.id
             )
             
-            if not member.status in ['creator', 'administrator']:
-                await update.message.reply_text(
+            if member is None:
+                await outbound.reply_text(
+                    update.message,
                     "❌ عذراً، هذا الأمر متاح فقط للمسؤولين."
                 )
                 return False
@@ -293,10 +312,18 @@ class AdminHandler:
         
         except Exception as e:
             logger.error(f"خطأ في التحقق من الصلاحيات: {e}")
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ خطأ في التحقق من الصلاحيات."
             )
             return False
+    
+    @staticmethod
+    async def track_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """تحديث قائمة المسؤولين عند ترقية عضو أو إزالته أو خروج البوت"""
+        member_update = update.chat_member or update.my_chat_member
+        if member_update:
+            admin_roster.apply_member_update(member_update, context.bot.id)
 
 
 class AdvancedFeatures:
@@ -313,7 +340,8 @@ class AdvancedFeatures:
             return
         
         if not context.args:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ الاستخدام: /addkeyword <الكلمة>\n\n"
                 "مثال: /addkeyword إجازة مرضية"
             )
@@ -326,15 +354,17 @@ class AdvancedFeatures:
             DatabaseService.add_keyword(
                 db, update.effective_chat.id, keyword
             )
+            chat_detector_registry.add_keyword(update.effective_chat.id, keyword)
             
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 f"✅ تم إضافة الكلمة المفتاحية:\n"
                 f"'{keyword}'\n\n"
                 f"🔍 البوت الآن سيكتشف هذه الكلمة تلقائياً."
             )
         except Exception as e:
             logger.error(f"خطأ في إضافة الكلمة: {e}")
-            await update.message.reply_text(f"❌ خطأ: {str(e)}")
+            await outbound.reply_text(update.message, f"❌ خطأ: {str(e)}")
         finally:
             db.close()
     
@@ -349,7 +379,8 @@ class AdvancedFeatures:
             return
         
         if not context.args:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ الاستخدام: /removekeyword <الكلمة>\n\n"
                 "مثال: /removekeyword إجازة مرضية"
             )
@@ -362,14 +393,16 @@ class AdvancedFeatures:
             DatabaseService.remove_keyword(
                 db, update.effective_chat.id, keyword
             )
+            chat_detector_registry.remove_keyword(update.effective_chat.id, keyword)
             
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 f"✅ تم إزالة الكلمة المفتاحية:\n"
                 f"'{keyword}'"
             )
         except Exception as e:
             logger.error(f"خطأ في إزالة الكلمة: {e}")
-            await update.message.reply_text(f"❌ خطأ: {str(e)}")
+            await outbound.reply_text(update.message, f"❌ خطأ: {str(e)}")
         finally:
             db.close()
     
@@ -385,7 +418,8 @@ class AdvancedFeatures:
             keywords = DatabaseService.get_keywords(db, chat_id)
             
             if not keywords:
-                await update.message.reply_text(
+                await outbound.reply_text(
+                    update.message,
                     "📚 لا توجد كلمات مفتاحية مخصصة للقروب."
                 )
                 db.close()
@@ -396,11 +430,11 @@ class AdvancedFeatures:
             for i, keyword in enumerate(keywords, 1):
                 keywords_text += f"{i}. {keyword}\n"
             
-            await update.message.reply_text(keywords_text, parse_mode="Markdown")
+            await outbound.reply_text(update.message, keywords_text, parse_mode="Markdown")
         
         except Exception as e:
             logger.error(f"خطأ في عرض الكلمات: {e}")
-            await update.message.reply_text(f"❌ خطأ: {str(e)}")
+            await outbound.reply_text(update.message, f"❌ خطأ: {str(e)}")
         
         finally:
             db.close()
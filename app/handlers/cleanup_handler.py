@@ -7,6 +7,7 @@ from telegram import Update, ChatMember
 from telegram.ext import ContextTypes
 from app.models.init_db import SessionLocal, DeletedMessage, ChatSettings
 from app.services.database_service import DatabaseService
+from app.services.outbound_scheduler import outbound
 from app.services.detection import detection_engine
 from app.handlers.message_deletion_handler import message_deletion_handler
 from datetime import datetime, timedelta
@@ -33,7 +34,8 @@ class ImprovedCleanupHandler:
         # التحقق من صلاحيات المستخدم
         user_perms = await message_deletion_handler.check_user_permissions(context, chat_id, user_id)
         if not user_perms["is_administrator"]:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ عذراً، يجب أن تكون مسؤول في القروب لاستخدام هذا الأمر."
             )
             return
@@ -41,7 +43,8 @@ class ImprovedCleanupHandler:
         # التحقق من صلاحيات البوت
         bot_perms = await message_deletion_handler.check_bot_permissions(context, chat_id)
         if not bot_perms["can_delete_messages"]:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ **خطأ في الصلاحيات:**\n\n"
                 "البوت لا يملك صلاحية حذف الرسائل.\n\n"
                 "**الحل:**\n"
@@ -57,11 +60,12 @@ class ImprovedCleanupHandler:
             days = int(context.args[0])
         
         if days < 1:
-            await update.message.reply_text("❌ يجب أن يكون عدد الأيام أكبر من 0")
+            await outbound.reply_text(update.message, "❌ يجب أن يكون عدد الأيام أكبر من 0")
             return
         
         # إرسال رسالة الانتظار
-        status_msg = await update.message.reply_text(
+        status_msg = await outbound.reply_text(
+            update.message,
             f"⏳ **جاري تنظيف الرسائل المزعجة...**\n\n"
             f"📅 الفترة: آخر {days} يوم\n"
             f"🔍 جاري البحث عن الرسائل المزعجة...\n"
@@ -81,7 +85,8 @@ class ImprovedCleanupHandler:
             ).all()
             
             if not deleted_messages:
-                await status_msg.edit_text(
+                await outbound.edit_text(
+                    status_msg,
                     f"ℹ️ **لا توجد رسائل مزعجة مسجلة للحذف**\n\n"
                     f"لم يتم العثور على رسائل مزعجة مسجلة في آخر {days} يوم.\n\n"
                     f"**ملاحظة:** البوت يحذف الرسائل المزعجة تلقائياً عند اكتشافها."
@@ -92,7 +97,8 @@ class ImprovedCleanupHandler:
             total_messages = len(deleted_messages)
             message_ids = [msg.message_id for msg in deleted_messages]
             
-            await status_msg.edit_text(
+            await outbound.edit_text(
+                status_msg,
                 f"⏳ **جاري حذف {total_messages} رسالة مزعجة...**\n\n"
                 f"📅 الفترة: آخر {days} يوم\n"
                 f"⚠️ هذا قد يستغرق بعض الوقت..."
@@ -117,6 +123,7 @@ class ImprovedCleanupHandler:
                 f"✅ **تم التنظيف بنجاح!**\n\n"
                 f"📊 **الإحصائيات:**\n"
                 f"• تم حذف: {stats['deleted']} رسالة\n"
+                f"• حُذفت أو لم تعد موجودة (حذف جماعي): {stats['unconfirmed']} رسالة\n"
                 f"• فشل الحذف: {stats['failed']} رسالة\n"
                 f"• غير موجودة: {stats['not_found']} رسالة\n"
                 f"• إجمالي المعالج: {stats['total']} رسالة\n"
@@ -128,13 +135,14 @@ class ImprovedCleanupHandler:
                 for error in stats['errors'][:3]:
                     response += f"• {error}\n"
             
-            await status_msg.edit_text(response)
+            await outbound.edit_text(status_msg, response)
             
-            logger.info(f"✅ تم تنظيف {stats['deleted']} رسالة من القروب {chat_id}")
+            logger.info(f"✅ تم تنظيف القروب {chat_id}: {stats}")
         
         except Exception as e:
             logger.error(f"❌ خطأ في التنظيف: {e}")
-            await status_msg.edit_text(
+            await outbound.edit_text(
+                status_msg,
                 f"❌ **حدث خطأ أثناء التنظيف:**\n\n"
                 f"`{str(e)}`\n\n"
                 f"**نصائح:**\n"
@@ -160,12 +168,13 @@ class ImprovedCleanupHandler:
         # التحقق من صلاحيات المستخدم
         user_perms = await message_deletion_handler.check_user_permissions(context, chat_id, user_id)
         if not user_perms["is_administrator"]:
-            await update.message.reply_text("❌ يجب أن تكون مسؤول في القروب")
+            await outbound.reply_text(update.message, "❌ يجب أن تكون مسؤول في القروب")
             return
         
         # الحصول على معرف المستخدم المراد حذف رسائله
         if not context.args or not context.args[0].isdigit():
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ **الاستخدام:** `/cleanup_user <user_id>`\n\n"
                 "**مثال:** `/cleanup_user 123456789`",
                 parse_mode="Markdown"
@@ -175,7 +184,8 @@ class ImprovedCleanupHandler:
         target_user_id = int(context.args[0])
         
         # إرسال رسالة الانتظار
-        status_msg = await update.message.reply_text(
+        status_msg = await outbound.reply_text(
+            update.message,
             f"⏳ جاري حذف رسائل المستخدم {target_user_id}..."
         )
         
@@ -189,7 +199,8 @@ class ImprovedCleanupHandler:
             ).all()
             
             if not user_messages:
-                await status_msg.edit_text(
+                await outbound.edit_text(
+                    status_msg,
                     f"ℹ️ لم يتم العثور على رسائل للمستخدم {target_user_id}"
                 )
                 db.close()
@@ -216,15 +227,16 @@ class ImprovedCleanupHandler:
                 f"✅ **تم الحذف بنجاح!**\n\n"
                 f"📊 **الإحصائيات:**\n"
                 f"• تم حذف: {stats['deleted']} رسالة\n"
+                f"• حُذفت أو لم تعد موجودة (حذف جماعي): {stats['unconfirmed']} رسالة\n"
                 f"• فشل: {stats['failed']} رسالة\n"
                 f"• إجمالي: {stats['total']} رسالة"
             )
             
-            await status_msg.edit_text(response)
+            await outbound.edit_text(status_msg, response)
         
         except Exception as e:
             logger.error(f"خطأ في حذف رسائل المستخدم: {e}")
-            await status_msg.edit_text(f"❌ حدث خطأ: {str(e)}")
+            await outbound.edit_text(status_msg, f"❌ حدث خطأ: {str(e)}")
         
         finally:
             db.close()
@@ -256,7 +268,8 @@ class ImprovedCleanupHandler:
             ).all()
             
             if not deleted_messages:
-                await update.message.reply_text(
+                await outbound.reply_text(
+                    update.message,
                     f"ℹ️ لا توجد رسائل محذوفة في آخر {days} يوم"
                 )
                 db.close()
@@ -292,11 +305,11 @@ class ImprovedCleanupHandler:
                 for keyword, count in top_keywords:
                     summary += f"• {keyword}: {count}\n"
             
-            await update.message.reply_text(summary)
+            await outbound.reply_text(update.message, summary)
         
         except Exception as e:
             logger.error(f"خطأ في الحصول على الملخص: {e}")
-            await update.message.reply_text(f"❌ حدث خطأ: {str(e)}")
+            await outbound.reply_text(update.message, f"❌ حدث خطأ: {str(e)}")
         
         finally:
             db.close()
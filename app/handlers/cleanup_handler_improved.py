@@ -7,6 +7,7 @@ from telegram import Update, ChatMember
 from telegram.ext import ContextTypes
 from app.models.init_db import SessionLocal, DeletedMessage, ChatSettings
 from app.services.database_service import DatabaseService
+from app.services.outbound_scheduler import outbound
 from app.services.detection import detection_engine
 from app.handlers.message_deletion_handler import message_deletion_handler
 from datetime import datetime, timedelta
@@ -34,7 +35,8 @@ class ImprovedCleanupHandlerV2:
         # التحقق من صلاحيات المستخدم
         user_perms = await message_deletion_handler.check_user_permissions(context, chat_id, user_id)
         if not user_perms["is_administrator"]:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ عذراً، يجب أن تكون مسؤول في القروب لاستخدام هذا الأمر."
             )
             return
@@ -42,7 +44,8 @@ class ImprovedCleanupHandlerV2:
         # التحقق من صلاحيات البوت
         bot_perms = await message_deletion_handler.check_bot_permissions(context, chat_id)
         if not bot_perms["can_delete_messages"]:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ **خطأ في الصلاحيات:**\n\n"
                 "البوت لا يملك صلاحية حذف الرسائل.\n\n"
                 "**الحل:**\n"
@@ -58,11 +61,12 @@ class ImprovedCleanupHandlerV2:
             days = int(context.args[0])
         
         if days < 1:
-            await update.message.reply_text("❌ يجب أن يكون عدد الأيام أكبر من 0")
+            await outbound.reply_text(update.message, "❌ يجب أن يكون عدد الأيام أكبر من 0")
             return
         
         # إرسال رسالة الانتظار
-        status_msg = await update.message.reply_text(
+        status_msg = await outbound.reply_text(
+            update.message,
             f"⏳ **جاري تنظيف الرسائل المزعجة...**\n\n"
             f"📅 الفترة: آخر {days} يوم\n"
             f"🔍 جاري البحث عن الرسائل المزعجة...\n"
@@ -82,7 +86,8 @@ class ImprovedCleanupHandlerV2:
             ).all()
             
             if not deleted_messages:
-                await status_msg.edit_text(
+                await outbound.edit_text(
+                    status_msg,
                     f"ℹ️ **لا توجد رسائل مزعجة مسجلة للحذف**\n\n"
                     f"لم يتم العثور على رسائل مزعجة مسجلة في آخر {days} يوم.\n\n"
                     f"**ملاحظة:** البوت يحذف الرسائل المزعجة تلقائياً عند اكتشافها."
@@ -93,7 +98,8 @@ class ImprovedCleanupHandlerV2:
             total_messages = len(deleted_messages)
             message_ids = [msg.message_id for msg in deleted_messages]
             
-            await status_msg.edit_text(
+            await outbound.edit_text(
+                status_msg,
                 f"⏳ **جاري حذف {total_messages} رسالة مزعجة...**\n\n"
                 f"📅 الفترة: آخر {days} يوم\n"
                 f"⚠️ هذا قد يستغرق بعض الوقت..."
@@ -118,6 +124,7 @@ class ImprovedCleanupHandlerV2:
                 f"✅ **تم التنظيف بنجاح!**\n\n"
                 f"📊 **الإحصائيات:**\n"
                 f"• تم حذف: {stats['deleted']} رسالة\n"
+                f"• حُذفت أو لم تعد موجودة (حذف جماعي): {stats['unconfirmed']} رسالة\n"
                 f"• فشل الحذف: {stats['failed']} رسالة\n"
                 f"• غير موجودة: {stats['not_found']} رسالة\n"
                 f"• إجمالي المعالج: {stats['total']} رسالة\n"
@@ -129,13 +136,14 @@ class ImprovedCleanupHandlerV2:
                 for error in stats['errors'][:3]:
                     response += f"• {error}\n"
             
-            await status_msg.edit_text(response)
+            await outbound.edit_text(status_msg, response)
             
-            logger.info(f"✅ تم تنظيف {stats['deleted']} رسالة من القروب {chat_id}")
+            logger.info(f"✅ تم تنظيف القروب {chat_id}: {stats}")
         
         except Exception as e:
             logger.error(f"❌ خطأ في التنظيف: {e}")
-            await status_msg.edit_text(
+            await outbound.edit_text(
+                status_msg,
                 f"❌ **حدث خطأ أثناء التنظيف:**\n\n"
                 f"`{str(e)}`\n\n"
                 f"**نصائح:**\n"
@@ -161,7 +169,8 @@ class ImprovedCleanupHandlerV2:
         # التحقق من صلاحيات المستخدم
         user_perms = await message_deletion_handler.check_user_permissions(context, chat_id, user_id)
         if not user_perms["is_administrator"]:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ عذراً، يجب أن تكون مسؤول في القروب لاستخدام هذا الأمر."
             )
             return
@@ -169,12 +178,13 @@ class ImprovedCleanupHandlerV2:
         # التحقق من صلاحيات البوت
         bot_perms = await message_deletion_handler.check_bot_permissions(context, chat_id)
         if not bot_perms["can_delete_messages"]:
-            await update.message.reply_text("❌ البوت لا يملك صلاحية حذف الرسائل")
+            await outbound.reply_text(update.message, "❌ البوت لا يملك صلاحية حذف الرسائل")
             return
         
         # الحصول على معرف المستخدم المراد حذف رسائله
         if not context.args:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ الرجاء تحديد معرف المستخدم\n"
                 "الاستخدام: /cleanup_user <user_id>"
             )
@@ -183,10 +193,11 @@ class ImprovedCleanupHandlerV2:
         try:
             target_user_id = int(context.args[0])
         except ValueError:
-            await update.message.reply_text("❌ معرف المستخدم غير صحيح")
+            await outbound.reply_text(update.message, "❌ معرف المستخدم غير صحيح")
             return
         
-        status_msg = await update.message.reply_text(
+        status_msg = await outbound.reply_text(
+            update.message,
             f"⏳ **جاري حذف رسائل المستخدم {target_user_id}...**"
         )
         
@@ -200,7 +211,8 @@ class ImprovedCleanupHandlerV2:
             ).all()
             
             if not user_messages:
-                await status_msg.edit_text(
+                await outbound.edit_text(
+                    status_msg,
                     f"ℹ️ **لا توجد رسائل مزعجة لهذا المستخدم**\n\n"
                     f"معرف المستخدم: {target_user_id}"
                 )
@@ -228,16 +240,17 @@ class ImprovedCleanupHandlerV2:
                 f"✅ **تم حذف رسائل المستخدم بنجاح!**\n\n"
                 f"📊 **الإحصائيات:**\n"
                 f"• تم حذف: {stats['deleted']} رسالة\n"
+                f"• حُذفت أو لم تعد موجودة (حذف جماعي): {stats['unconfirmed']} رسالة\n"
                 f"• فشل الحذف: {stats['failed']} رسالة\n"
                 f"• معرف المستخدم: {target_user_id}"
             )
             
-            await status_msg.edit_text(response)
-            logger.info(f"✅ تم حذف {stats['deleted']} رسالة للمستخدم {target_user_id}")
+            await outbound.edit_text(status_msg, response)
+            logger.info(f"✅ تم حذف رسائل المستخدم {target_user_id}: {stats}")
         
         except Exception as e:
             logger.error(f"❌ خطأ في حذف رسائل المستخدم: {e}")
-            await status_msg.edit_text(f"❌ حدث خطأ: {str(e)}")
+            await outbound.edit_text(status_msg, f"❌ حدث خطأ: {str(e)}")
         
         finally:
             db.close()
@@ -256,7 +269,8 @@ class ImprovedCleanupHandlerV2:
         # التحقق من صلاحيات المستخدم
         user_perms = await message_deletion_handler.check_user_permissions(context, chat_id, user_id)
         if not user_perms["is_administrator"]:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ عذراً، يجب أن تكون مسؤول في القروب لاستخدام هذا الأمر."
             )
             return
@@ -294,11 +308,11 @@ class ImprovedCleanupHandlerV2:
                 f"• `/cleanup_user <id>` - حذف رسائل مستخدم معين"
             )
             
-            await update.message.reply_text(response)
+            await outbound.reply_text(update.message, response)
         
         except Exception as e:
             logger.error(f"❌ خطأ في الحصول على الملخص: {e}")
-            await update.message.reply_text(f"❌ حدث خطأ: {str(e)}")
+            await outbound.reply_text(update.message, f"❌ حدث خطأ: {str(e)}")
         
         finally:
             db.close()
@@ -5,10 +5,14 @@ Advanced Message Deletion Handler
 
 from telegram import Update, ChatMember
 from telegram.ext import ContextTypes
-from telegram.error import TelegramError, BadRequest
+from telegram.error import TelegramError, BadRequest, RetryAfter
 import logging
 from datetime import datetime, timedelta
 
+from app.config import MESSAGE_CONFIG
+from app.services.admin_roster import admin_roster
+from app.services.outbound_scheduler import PRIORITY_CLEANUP, outbound
+
 logger = logging.getLogger(__name__)
 
 
@@ -30,14 +34,17 @@ class MessageDeletionHandler:
             False إذا فشل الحذف
         """
         try:
-            await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
+            # حذف أوامر التنظيف في آخر مسار حتى لا يؤخر حذف الإعلانات الجديدة
+            await outbound.delete_message(
+                context.bot, chat_id, message_id, priority=PRIORITY_CLEANUP
+            )
             logger.info(f"✅ تم حذف الرسالة {message_id} من القروب {chat_id} - السبب: {reason}")
             return True
         
         except BadRequest as e:
-            if "message to delete not found" in str(e):
+            if "message to delete not found" in str(e).lower():
                 logger.warning(f"⚠️ الرسالة {message_id} غير موجودة أو تم حذفها مسبقاً")
-            elif "message can't be deleted" in str(e):
+            elif "message can't be deleted" in str(e).lower():
                 logger.warning(f"⚠️ لا يمكن حذف الرسالة {message_id} - قد تكون قديمة جداً")
             else:
                 logger.warning(f"⚠️ خطأ في حذف الرسالة {message_id}: {e}")
@@ -63,12 +70,23 @@ class MessageDeletionHandler:
             قاموس بالصلاحيات
         """
         try:
-            bot_member = await context.bot.get_chat_member(chat_id, context.bot.id)
+            # البوت ضمن قائمة المسؤولين، وغيابه منها يعني أنه عضو بلا صلاحيات
+            bot_member = await admin_roster.get_member(context.bot, chat_id, context.bot.id)
+            if bot_member is None:
+                return {
+                    "can_delete_messages": False,
+                    "can_restrict_members": False,
+                    "can_pin_messages": False,
+                    "is_administrator": False,
+                    "status": ChatMember.MEMBER
+                }
             
+            # ChatMemberOwner لا يحتوي حقول الصلاحيات لأن المالك يملكها كلها
+            is_owner = bot_member.status == ChatMember.OWNER
             permissions = {
-                "can_delete_messages": bot_member.can_delete_messages,
-                "can_restrict_members": bot_member.can_restrict_members,
-                "can_pin_messages": bot_member.can_pin_messages,
+                "can_delete_messages": getattr(bot_member, "can_delete_messages", is_owner),
+                "can_restrict_members": getattr(bot_member, "can_restrict_members", is_owner),
+                "can_pin_messages": getattr(bot_member, "can_pin_messages", is_owner),
                 "is_administrator": bot_member.status in [ChatMember.ADMINISTRATOR, ChatMember.OWNER],
                 "status": bot_member.status
             }
@@ -96,12 +114,20 @@ class MessageDeletionHandler:
         التحقق من صلاحيات المستخدم في القروب
         """
         try:
-            user_member = await context.bot.get_chat_member(chat_id, user_id)
+            user_member = await admin_roster.get_member(context.bot, chat_id, user_id)
+            if user_member is None:
+                return {
+                    "is_administrator": False,
+                    "is_creator": False,
+                    "can_delete_messages": False,
+                    "status": ChatMember.MEMBER
+                }
             
+            is_owner = user_member.status == ChatMember.OWNER
             permissions = {
                 "is_administrator": user_member.status in [ChatMember.ADMINISTRATOR, ChatMember.OWNER],
-                "is_creator": user_member.status == ChatMember.OWNER,
-                "can_delete_messages": user_member.can_delete_messages,
+                "is_creator": is_owner,
+                "can_delete_messages": getattr(user_member, "can_delete_messages", is_owner),
                 "status": user_member.status
             }
             
@@ -116,6 +142,52 @@ class MessageDeletionHandler:
                 "status": "unknown"
             }
     
+    @staticmethod
+    async def _post_delete_messages(bot, chat_id: int, message_ids: list) -> bool:
+        if hasattr(bot, "delete_messages"):
+            return await bot.delete_messages(chat_id=chat_id, message_ids=message_ids)
+        # python-telegram-bot 20.7 (المثبت في requirements) لا يحتوي delete_messages
+        # الذي أُضيف في 20.8، فيُرسل الطلب بدالة _post التي تبني عليها دوال Bot
+        return await bot._post(
+            "deleteMessages", {"chat_id": chat_id, "message_ids": message_ids}
+        )
+    
+    @staticmethod
+    async def delete_messages_bulk(
+        context: ContextTypes.DEFAULT_TYPE,
+        chat_id: int,
+        message_ids: list,
+        reason: str = "cleanup"
+    ) -> bool:
+        """
+        حذف حتى 100 رسالة بطلب deleteMessages واحد
+        
+        تلقرام يتجاهل الرسائل غير الموجودة، ويرفض الدفعة كاملة إذا تعذر حذف
+        إحدى رسائلها. خطأ 429 تعيده جدولة الطلبات الصادرة بعد المهلة المطلوبة،
+        ولا يصل هنا إلا بعد استنفاد محاولاتها.
+        
+        العودة:
+            True إذا تم حذف الدفعة
+            False إذا رُفضت الدفعة
+        """
+        try:
+            deleted = await outbound.call(
+                PRIORITY_CLEANUP, chat_id,
+                MessageDeletionHandler._post_delete_messages, context.bot, chat_id, message_ids
+            )
+        except RetryAfter as e:
+            logger.warning(f"⚠️ تجاوز حد الطلبات أثناء حذف دفعة من القروب {chat_id}: {e}")
+            return False
+        except TelegramError as e:
+            logger.warning(f"⚠️ تعذر حذف دفعة من {len(message_ids)} رسالة: {e}")
+            return False
+        
+        if deleted:
+            logger.info(
+                f"✅ تم حذف {len(message_ids)} رسالة من القروب {chat_id} - السبب: {reason}"
+            )
+        return bool(deleted)
+    
     @staticmethod
     async def delete_messages_in_range(
         context: ContextTypes.DEFAULT_TYPE,
@@ -124,7 +196,11 @@ class MessageDeletionHandler:
         reason: str = "cleanup"
     ) -> dict:
         """
-        حذف مجموعة من الرسائل
+        حذف مجموعة من الرسائل على دفعات deleteMessages
+        
+        الدفعة المرفوضة تُحذف رسائلها واحدة واحدة لمعرفة الرسائل التي فشلت.
+        الدفعة المقبولة لا تفرق بين المحذوفة وغير الموجودة، فتُعد رسائلها في
+        unconfirmed، ولا يُعد في deleted وnot_found إلا ما أكده الحذف الفردي.
         
         العودة:
             قاموس بإحصائيات الحذف
@@ -132,35 +208,52 @@ class MessageDeletionHandler:
         stats = {
             "total": len(message_ids),
             "deleted": 0,
+            "unconfirmed": 0,
             "failed": 0,
             "not_found": 0,
             "errors": []
         }
         
+        batch_size = MESSAGE_CONFIG['bulk_delete_batch_size']
+        for start in range(0, len(message_ids), batch_size):
+            batch = message_ids[start:start + batch_size]
+            if await MessageDeletionHandler.delete_messages_bulk(context, chat_id, batch, reason):
+                stats["unconfirmed"] += len(batch)
+            else:
+                await MessageDeletionHandler._delete_one_by_one(
+                    context, chat_id, batch, reason, stats
+                )
+        
+        logger.info(f"إحصائيات الحذف: {stats}")
+        return stats
+    
+    @staticmethod
+    async def _delete_one_by_one(
+        context: ContextTypes.DEFAULT_TYPE,
+        chat_id: int,
+        message_ids: list,
+        reason: str,
+        stats: dict
+    ) -> None:
+        # الطلب مباشرة وليس عبر delete_message لأنها تخفي سبب الفشل
         for message_id in message_ids:
             try:
-                success = await MessageDeletionHandler.delete_message(
-                    context, chat_id, message_id, reason
+                await outbound.delete_message(
+                    context.bot, chat_id, message_id, priority=PRIORITY_CLEANUP
                 )
-                
-                if success:
-                    stats["deleted"] += 1
-                else:
-                    stats["failed"] += 1
+                stats["deleted"] += 1
             
             except BadRequest as e:
-                if "message to delete not found" in str(e):
+                if "message to delete not found" in str(e).lower():
                     stats["not_found"] += 1
                 else:
+                    logger.warning(f"⚠️ خطأ في حذف الرسالة {message_id}: {e}")
                     stats["failed"] += 1
                     stats["errors"].append(str(e))
             
             except Exception as e:
                 stats["failed"] += 1
                 stats["errors"].append(str(e))
-        
-        logger.info(f"إحصائيات الحذف: {stats}")
-        return stats
     
     @staticmethod
     async def delete_messages_by_date(
@@ -198,7 +291,8 @@ class MessageDeletionHandler:
         """إرسال إشعار بفشل الحذف"""
         try:
             if update.message:
-                await update.message.reply_text(
+                await outbound.reply_text(
+                    update.message,
                     f"⚠️ **تنبيه:**\n\n"
                     f"لم يتمكن البوت من حذف الرسائل.\n\n"
                     f"**السبب:** {reason}\n\n"
@@ -4,15 +4,31 @@ Message and Basic Commands Handler - Fixed Version
 """
 
 from telegram import Update
-from telegram.ext import ContextTypes
+from telegram.ext import ApplicationHandlerStop, ContextTypes
 from telegram.error import TelegramError
 from sqlalchemy.orm import Session
+from typing import Any, Awaitable, Optional, Set
+import time
+import asyncio
 import logging
 
-from app.services.detection import detection_engine
+from app.services.detection_pool import detection_pool
 from app.services.database_service import DatabaseService
 from app.services.username_filter import username_filter
 from app.services.obfuscation_detector import obfuscation_detector
+from app.services.near_duplicate_index import near_duplicate_index
+from app.services.async_database import async_db
+from app.services.write_behind import write_behind
+from app.services.analytics_service import analytics
+from app.services.latency_histogram import delete_latency
+from app.services.chat_dispatcher import chat_dispatcher
+from app.services.rate_limiter import command_rate_limiter, message_rate_limiter
+from app.services.outbound_scheduler import outbound
+from app.services.notification_digest import notification_digest
+from app.services.reputation import reputation_tracker
+from app.services.chat_settings_cache import chat_settings_cache
+from app.services.detection import OptimizedDetectionEngine
+from app.config import FEATURES
 from app.models.init_db import SessionLocal
 from app.utils.commands import CommandRegistry
 
@@ -22,9 +38,32 @@ logger = logging.getLogger(__name__)
 class MessageHandler:
     """معالج رسائل البوت"""
     
+    # مهام ما بعد الحذف التي لم تنته بعد
+    _background_tasks: Set[asyncio.Task] = set()
+    
+    @staticmethod
+    async def dispatch_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """إضافة الرسالة إلى طابور قروبها في chat_dispatcher"""
+        # زمن الحذف يُقاس من لحظة استلام التحديث، قبل الانتظار في الطابور
+        received_at = time.monotonic()
+        
+        if not update.message or not update.message.text:
+            return
+        
+        await chat_dispatcher.submit(
+            update.message.chat_id, MessageHandler.handle_message, update, context, received_at
+        )
+    
     @staticmethod
-    async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def handle_message(
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE,
+        received_at: Optional[float] = None
+    ):
         """معالج الرسائل الواردة"""
+        if received_at is None:
+            received_at = time.monotonic()
+        
         if not update.message or not update.message.text:
             return
         
@@ -34,26 +73,50 @@ class MessageHandler:
         user_name = message.from_user.username or message.from_user.first_name or "Unknown"
         message_text = message.text
         
-        db = SessionLocal()
+        # كل عمليات قاعدة البيانات هنا تُنفذ في منفذ async_db حتى لا تتوقف
+        # حلقة الأحداث، ومعها عمليات الحذف في بقية القروبات. بعد معرفة الحكم
+        # تُحذف الرسالة أولاً، ثم يُنقل التسجيل والإشعار إلى مهمة في الخلفية
         try:
-            # الحصول على إعدادات القروب
-            settings = DatabaseService.get_or_create_chat_settings(db, chat_id)
+            # الحصول على إعدادات القروب (من الذاكرة دون قاعدة البيانات غالباً)
+            settings = await async_db.get_chat_settings(chat_id)
             
             # التحقق من أن البوت مفعل
             if not settings.is_enabled:
                 return
             
             # التحقق من أن المستخدم في القائمة البيضاء
-            if DatabaseService.is_user_whitelisted(db, chat_id, user_id):
+            if await async_db.is_user_whitelisted(chat_id, user_id):
                 return
             
             # التحقق من أن المستخدم في القائمة السوداء
-            if DatabaseService.is_user_blacklisted(db, chat_id, user_id):
-                await MessageHandler._delete_message(context, chat_id, message.message_id)
-                DatabaseService.log_activity(
-                    db, chat_id, "auto_delete_blacklist",
-                    user_id, user_name,
-                    f"تم حذف رسالة من مستخدم في القائمة السوداء"
+            if await async_db.is_user_blacklisted(chat_id, user_id):
+                await MessageHandler._delete_message(
+                    context, chat_id, message.message_id, received_at
+                )
+                MessageHandler._run_in_background(
+                    context, update,
+                    write_behind.log_activity(
+                        chat_id, "auto_delete_blacklist",
+                        user_id, user_name,
+                        f"تم حذف رسالة من مستخدم في القائمة السوداء"
+                    )
+                )
+                return
+            
+            # حذف رسائل الإغراق من المستخدم في هذا القروب
+            if FEATURES['enable_rate_limiting'] and not message_rate_limiter.is_allowed(
+                (chat_id, user_id)
+            ):
+                await MessageHandler._delete_message(
+                    context, chat_id, message.message_id, received_at
+                )
+                MessageHandler._run_in_background(
+                    context, update,
+                    write_behind.log_activity(
+                        chat_id, "auto_delete_flood",
+                        user_id, user_name,
+                        f"تم حذف رسالة - تجاوز حد الرسائل في الدقيقة"
+                    )
                 )
                 return
             
@@ -64,60 +127,138 @@ class MessageHandler:
                 )
                 
                 if is_suspicious and confidence > 0.5:
-                    # حفظ اسم المستخدم المشبوه
-                    risk_score, risk_level = username_filter.get_username_risk_score(
-                        message.from_user.username
-                    )
-                    
-                    username_filter.save_suspicious_username(
-                        db, chat_id, user_id, message.from_user.username,
-                        risk_score, f"كلمات مزعجة: {', '.join(keywords)}"
-                    )
-                    
                     # تحديد المستخدم - حذف الرسالة
-                    await MessageHandler._delete_message(context, chat_id, message.message_id)
-                    DatabaseService.log_activity(
-                        db, chat_id, "auto_delete_suspicious_username",
-                        user_id, message.from_user.username,
-                        f"تم حذف الرسالة - اسم المستخدم مشبوه: {risk_level}"
+                    await MessageHandler._delete_message(
+                        context, chat_id, message.message_id, received_at
+                    )
+                    reputation_tracker.record(chat_id, user_id, user_name, True)
+                    MessageHandler._run_in_background(
+                        context, update,
+                        MessageHandler._record_suspicious_username(
+                            chat_id, user_id, message.from_user.username, keywords
+                        )
                     )
                     
                     logger.info(f"تم تحديد مستخدم مشبوه: {message.from_user.username}")
                     return
             
-            # كشف الإعلانات
-            is_spam, confidence, keywords = detection_engine.detect_spam(
-                message_text, user_id, chat_id, settings.detection_sensitivity
+            # كشف الإعلانات (المطابقة الضبابية للرسائل الطويلة في عملية عاملة)،
+            # والأعضاء الموثوقون يمرون بالمراحل الرخيصة فقط
+            trusted = (
+                FEATURES['enable_trusted_fast_path']
+                and reputation_tracker.is_trusted(chat_id, user_id)
+            )
+            started = time.perf_counter()
+            is_spam, confidence, keywords = await detection_pool.detect_spam(
+                message_text, user_id, chat_id, settings.detection_sensitivity, trusted
             )
+            reputation_tracker.record_detection(trusted, time.perf_counter() - started)
+            reputation_tracker.record(chat_id, user_id, user_name, is_spam)
             
             if is_spam:
                 # حذف الرسالة
-                await MessageHandler._delete_message(context, chat_id, message.message_id)
+                await MessageHandler._delete_message(
+                    context, chat_id, message.message_id, received_at
+                )
+                
+                # فهرسة الإعلان لكشف نسخه المعدلة قليلاً في القروب، والنسخة من
+                # إعلان مفهرس تجدد مدخله فقط
+                near_duplicate_index.add_message(
+                    message_text, keywords, chat_id=chat_id, confidence=confidence
+                )
                 
-                # تسجيل النشاط
-                try:
-                    DatabaseService.log_deleted_message(
-                        db, chat_id, message.message_id, user_id, user_name,
+                # التسجيل والتحليلات والإشعار بعد الحذف في الخلفية
+                MessageHandler._run_in_background(
+                    context, update,
+                    MessageHandler._record_spam(
+                        context, chat_id, message.message_id, user_id, user_name,
                         message_text, keywords, confidence
                     )
-                    logger.info(f"✅ تم تسجيل رسالة مزعجة: chat_id={chat_id}, msg_id={message.message_id}")
-                except Exception as db_error:
-                    logger.error(f"❌ خطأ في تسجيل الرسالة: {db_error}")
-                    import traceback
-                    traceback.print_exc()
-                
-                # إرسال إشعار للمسؤولين
-                await MessageHandler._notify_admins(
-                    context, chat_id, user_name, message_text, confidence, keywords
                 )
                 
                 logger.info(f"تم حذف رسالة إعلانية من {user_name} في القروب {chat_id}")
         
         except Exception as e:
             logger.error(f"خطأ في معالجة الرسالة: {e}")
+    
+    @staticmethod
+    async def limit_commands(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """إيقاف معالجة الأمر إذا تجاوز المستخدم حد الأوامر"""
+        if not FEATURES['enable_rate_limiting'] or not update.effective_user:
+            return
         
-        finally:
-            db.close()
+        user_id = update.effective_user.id
+        if not command_rate_limiter.is_allowed(user_id):
+            logger.warning(f"تجاوز حد الأوامر للمستخدم {user_id}")
+            raise ApplicationHandlerStop
+    
+    @staticmethod
+    def _run_in_background(
+        context: ContextTypes.DEFAULT_TYPE,
+        update: Update,
+        coroutine: Awaitable[Any]
+    ) -> None:
+        """تشغيل عمل ما بعد الحذف دون تأخير معالجة الرسالة"""
+        # أخطاء مهام التطبيق تصل إلى معالج الأخطاء
+        task = context.application.create_task(coroutine, update=update)
+        MessageHandler._background_tasks.add(task)
+        task.add_done_callback(MessageHandler._background_tasks.discard)
+    
+    @staticmethod
+    async def wait_for_background_tasks():
+        """انتظار مهام ما بعد الحذف، ومنها التي بدأت بعد إيقاف التطبيق"""
+        if MessageHandler._background_tasks:
+            await asyncio.gather(*MessageHandler._background_tasks, return_exceptions=True)
+    
+    @staticmethod
+    async def _record_suspicious_username(
+        chat_id: int,
+        user_id: int,
+        username: str,
+        keywords: list
+    ):
+        """حفظ اسم المستخدم المشبوه وتسجيل الحذف"""
+        risk_score, risk_level = username_filter.get_username_risk_score(username)
+        await write_behind.save_suspicious_username(
+            chat_id, user_id, username,
+            risk_score, f"كلمات مزعجة: {', '.join(keywords)}"
+        )
+        await write_behind.log_activity(
+            chat_id, "auto_delete_suspicious_username",
+            user_id, username,
+            f"تم حذف الرسالة - اسم المستخدم مشبوه: {risk_level}"
+        )
+    
+    @staticmethod
+    async def _record_spam(
+        context: ContextTypes.DEFAULT_TYPE,
+        chat_id: int,
+        message_id: int,
+        user_id: int,
+        user_name: str,
+        message_text: str,
+        keywords: list,
+        confidence: float
+    ):
+        """تسجيل الرسالة المحذوفة والتحليلات وإشعار المسؤولين"""
+        try:
+            await write_behind.log_deleted_message(
+                chat_id, message_id, user_id, user_name,
+                message_text, keywords, confidence
+            )
+            logger.info(f"✅ تم تسجيل رسالة مزعجة: chat_id={chat_id}, msg_id={message_id}")
+        except Exception as db_error:
+            logger.error(f"❌ خطأ في تسجيل الرسالة: {db_error}")
+            import traceback
+            traceback.print_exc()
+        
+        if FEATURES['enable_analytics']:
+            analytics.record_spam(chat_id, user_id, keywords)
+        
+        # إرسال إشعار للمسؤولين
+        await MessageHandler._notify_admins(
+            context, chat_id, user_id, user_name, confidence, keywords
+        )
     
     @staticmethod
     async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -141,8 +282,8 @@ class MessageHandler:
 💡 **نصيحة:**
 اكتب `/` لرؤية قائمة الأوامر المتاحة
 """
-        
-        await update.message.reply_text(welcome_text, parse_mode="Markdown")
+
+        await outbound.reply_text(update.message, welcome_text, parse_mode="Markdown")
     
     @staticmethod
     async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -151,7 +292,7 @@ class MessageHandler:
             return
         
         help_text = CommandRegistry.get_help_text()
-        await update.message.reply_text(help_text, parse_mode="Markdown")
+        await outbound.reply_text(update.message, help_text, parse_mode="Markdown")
     
     @staticmethod
     async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -165,6 +306,10 @@ class MessageHandler:
             
             # الحصول على إحصائيات القروب
             stats = DatabaseService.get_chat_statistics(db, chat_id)
+            latency = delete_latency.get_stats()
+            reputation = reputation_tracker.get_stats()
+            verdicts = OptimizedDetectionEngine.get_verdict_cache().get_stats()
+            settings = chat_settings_cache.get_stats()
             
             stats_text = f"""
 📊 **إحصائيات القروب:**
@@ -183,14 +328,30 @@ class MessageHandler:
 • الأكثر تكراراً: {stats.get('top_keyword', 'لا توجد')}
 • عدد الكلمات: {stats.get('keyword_count', 0)}
 
+⚡ **زمن الحذف (كل القروبات):**
+• الرسائل المقاسة: {latency['count']}
+• الوسيط: ≤ {latency['p50_ms'] or 0:g} ms
+• 95%: ≤ {latency['p95_ms'] or 0:g} ms
+• رسائل القروب في الطابور: {chat_dispatcher.queue_depth(chat_id)}
+
+🛡️ **الأعضاء الموثوقون (كل القروبات):**
+• رسائلهم: {reputation['trusted_messages']} من {reputation['trusted_messages'] + reputation['full_messages']}
+• متوسط الكشف: {reputation['avg_trusted_ms']:g} ms مقابل {reputation['avg_full_ms']:g} ms
+• وقت الكشف الموفر: {reputation['saved_seconds']:g} s ({reputation['saved_rate']})
+
+🗄️ **الذاكرة المؤقتة (كل القروبات):**
+• الأحكام: {verdicts['size']}/{verdicts['max_size']}، الإصابة {verdicts['hit_rate']}، المُخرجة {verdicts['evictions']}
+• الإعدادات: {settings['size']}/{settings['max_size']}، الإصابة {settings['hit_rate']}، المُخرجة {settings['evictions']}
+
 ⏰ **آخر تحديث:** الآن
 """
-            
-            await update.message.reply_text(stats_text, parse_mode="Markdown")
+
+            await outbound.reply_text(update.message, stats_text, parse_mode="Markdown")
         
         except Exception as e:
             logger.error(f"خطأ في الحصول على الإحصائيات: {e}")
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 f"❌ حدث خطأ في الحصول على الإحصائيات: {str(e)}"
             )
         
@@ -228,12 +389,13 @@ class MessageHandler:
 • `/disable` - تعطيل البوت
 • `/sensitivity <رقم>` - تعديل الحساسية
 """
-            
-            await update.message.reply_text(settings_text, parse_mode="Markdown")
+
+            await outbound.reply_text(update.message, settings_text, parse_mode="Markdown")
         
         except Exception as e:
             logger.error(f"خطأ في الحصول على الإعدادات: {e}")
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 f"❌ حدث خطأ: {str(e)}"
             )
         
@@ -241,37 +403,46 @@ class MessageHandler:
             db.close()
     
     @staticmethod
-    async def _delete_message(context: ContextTypes.DEFAULT_TYPE, chat_id: int, message_id: int):
-        """حذف رسالة من القروب"""
+    async def _delete_message(
+        context: ContextTypes.DEFAULT_TYPE,
+        chat_id: int,
+        message_id: int,
+        received_at: Optional[float] = None
+    ) -> bool:
+        """حذف رسالة من القروب، وتسجيل زمن الحذف إذا عُرف وقت الاستلام"""
         try:
-            await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
+            await outbound.delete_message(context.bot, chat_id, message_id)
         except TelegramError as e:
             logger.warning(f"فشل حذف الرسالة {message_id}: {e}")
+            return False
+        
+        if received_at is not None:
+            delete_latency.observe(time.monotonic() - received_at)
+        return True
     
     @staticmethod
     async def _notify_admins(
         context: ContextTypes.DEFAULT_TYPE,
         chat_id: int,
+        user_id: int,
         user_name: str,
-        message_text: str,
         confidence: float,
         keywords: list
     ):
-        """إرسال إشعار للمسؤولين"""
+        """إضافة الإعلان المحذوف إلى ملخص إشعارات القروب"""
+        # الملخص يُنشر في القروب نفسه ويذكر أسماء المرسلين، فلا يُرسل إلا بتفعيل صريح
+        if not FEATURES['enable_group_spam_digest']:
+            return
+        
         try:
-            notification = f"""
-🚨 **تنبيه: رسالة إعلانية مكتشفة**
-
-👤 **المستخدم:** {user_name}
-📝 **النص:** {message_text[:100]}...
-🎯 **الثقة:** {confidence * 100:.1f}%
-🔑 **الكلمات:** {', '.join(keywords[:3])}
-
-⏰ **الوقت:** الآن
-"""
+            settings = await async_db.get_chat_settings(chat_id)
+            if not settings.notify_admins:
+                return
             
-            # إرسال الإشعار إلى القروب (اختياري)
-            # await context.bot.send_message(chat_id=chat_id, text=notification)
+            # رسالة واحدة لكل قروب كل نافذة بدلاً من رسالة لكل إعلان
+            notification_digest.add(
+                context.bot, chat_id, user_id, user_name, keywords, confidence
+            )
         
         except Exception as e:
             logger.warning(f"فشل إرسال الإشعار: {e}")
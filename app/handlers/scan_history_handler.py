@@ -8,6 +8,7 @@ from telegram.ext import ContextTypes
 from telegram.error import TelegramError, BadRequest
 from app.models.init_db import SessionLocal, DeletedMessage, ChatSettings
 from app.services.database_service import DatabaseService
+from app.services.outbound_scheduler import outbound
 from app.services.detection import detection_engine
 from app.handlers.message_deletion_handler import message_deletion_handler
 from datetime import datetime, timedelta
@@ -45,7 +46,8 @@ class ScanHistoryHandler:
         # التحقق من صلاحيات المستخدم
         user_perms = await message_deletion_handler.check_user_permissions(context, chat_id, user_id)
         if not user_perms["is_administrator"]:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ عذراً، يجب أن تكون مسؤول في القروب لاستخدام هذا الأمر."
             )
             return
@@ -85,11 +87,11 @@ class ScanHistoryHandler:
                 f"استخدم الأوامر أعلاه لحذف الرسائل المسجلة."
             )
             
-            await update.message.reply_text(response)
+            await outbound.reply_text(update.message, response)
         
         except Exception as e:
             logger.error(f"❌ خطأ في الحصول على الإحصائيات: {e}")
-            await update.message.reply_text(f"❌ حدث خطأ: {str(e)}")
+            await outbound.reply_text(update.message, f"❌ حدث خطأ: {str(e)}")
         
         finally:
             db.close()
@@ -111,7 +113,8 @@ class ScanHistoryHandler:
         # التحقق من صلاحيات المستخدم
         user_perms = await message_deletion_handler.check_user_permissions(context, chat_id, user_id)
         if not user_perms["is_administrator"]:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ عذراً، يجب أن تكون مسؤول في القروب لاستخدام هذا الأمر."
             )
             return
@@ -131,7 +134,7 @@ class ScanHistoryHandler:
             f"استخدم `/stop_scan` لإيقاف المسح"
         )
         
-        await update.message.reply_text(response)
+        await outbound.reply_text(update.message, response)
         logger.info(f"🔍 تم تفعيل المسح اليدوي للقروب {chat_id}")
     
     @staticmethod
@@ -148,13 +151,14 @@ class ScanHistoryHandler:
         # التحقق من صلاحيات المستخدم
         user_perms = await message_deletion_handler.check_user_permissions(context, chat_id, user_id)
         if not user_perms["is_administrator"]:
-            await update.message.reply_text(
+            await outbound.reply_text(
+                update.message,
                 "❌ عذراً، يجب أن تكون مسؤول في القروب لاستخدام هذا الأمر."
             )
             return
         
         if not hasattr(context, 'user_data') or not context.user_data.get('manual_scan_enabled'):
-            await update.message.reply_text("❌ لا يوجد مسح نشط حالياً")
+            await outbound.reply_text(update.message, "❌ لا يوجد مسح نشط حالياً")
             return
         
         # إيقاف المسح
@@ -171,5 +175,5 @@ class ScanHistoryHandler:
             f"استخدم `/cleanup_old` لحذف الرسائل المزعجة المكتشفة"
         )
         
-        await update.message.reply_text(response)
+        await outbound.reply_text(update.message, response)
         logger.info(f"✅ تم إيقاف المسح للقروب {chat_id} - فحص={count}, مزعج={spam}")
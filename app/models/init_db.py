@@ -4,12 +4,16 @@ Database Initialization Module
 """
 
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Float, Text
+from sqlalchemy import (
+    create_engine, Column, Integer, String, Boolean, DateTime, Float, Text, UniqueConstraint
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 import logging
 
+from app.config import DATABASE_CONFIG
+
 logger = logging.getLogger(__name__)
 
 # إنشاء Base للنماذج
@@ -20,8 +24,16 @@ DB_PATH = os.path.join(os.path.dirname(__file__), '../../data')
 os.makedirs(DB_PATH, exist_ok=True)
 DATABASE_URL = f"sqlite:///{os.path.join(DB_PATH, 'bot.db')}"
 
-# إنشاء محرك قاعدة البيانات
-engine = create_engine(DATABASE_URL, echo=False)
+# إنشاء محرك قاعدة البيانات. الاتصالات تُستخدم من خيوط منفذ قاعدة البيانات،
+# ومهلة الانتظار تجعل الكتابات المتزامنة تنتظر القفل بدلاً من الفشل فوراً
+engine = create_engine(
+    DATABASE_URL,
+    echo=False,
+    connect_args={
+        'check_same_thread': False,
+        'timeout': DATABASE_CONFIG['connection_timeout'],
+    },
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -116,6 +128,24 @@ class SuspiciousUsername(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+class UserStatistics(Base):
+    """سمعة المستخدم في القروب"""
+    __tablename__ = "user_statistics"
+    __table_args__ = (UniqueConstraint('chat_id', 'user_id'),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    chat_id = Column(Integer, index=True)
+    user_id = Column(Integer, index=True)
+    user_name = Column(String(255))
+    clean_count = Column(Integer, default=0)
+    spam_count = Column(Integer, default=0)
+    reputation = Column(Float, default=0.0)  # الدرجة في reputation_at قبل التناقص
+    reputation_at = Column(DateTime, default=datetime.utcnow)
+    last_spam_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 def init_db():
     """إنشاء جميع الجداول"""
     try:
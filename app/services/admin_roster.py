@@ -0,0 +1,156 @@
+"""
+ذاكرة مسؤولي القروبات بدلاً من طلب get_chat_member لكل أمر
+Cached Per-Chat Administrator Roster
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from telegram import ChatMember, ChatMemberUpdated
+
+from app.config import CACHE_CONFIG
+from app.services.cache_service import CacheService
+from app.services.outbound_scheduler import PRIORITY_BAN, outbound
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = (ChatMember.ADMINISTRATOR, ChatMember.OWNER)
+
+# معرف المستخدم -> عضويته (ChatMemberAdministrator أو ChatMemberOwner)
+Roster = Dict[int, ChatMember]
+
+
+class AdminRoster:
+    """
+    قائمة مسؤولي كل قروب من طلب get_chat_administrators، وعضوية البوت نفسه
+    من طلب get_chat_member معه لأن قائمة المسؤولين لا تشمل البوتات
+    
+    فحص الصلاحيات بعد التحميل الأول لا يرسل أي طلب. تحديثات chat_member
+    و my_chat_member تعدل القائمة عند ترقية مسؤول أو إزالته، والعمر المحدود
+    يلتقط ما فات منها. القائمة المنتهية تُستخدم فوراً ويُعاد تحميلها في
+    الخلفية، فلا تنتظر أوامر المسؤولين طلباً متأخراً بسبب حدود تلقرام.
+    """
+    
+    def __init__(
+        self,
+        ttl: float = CACHE_CONFIG['admin_roster_ttl'],
+        max_chats: int = CACHE_CONFIG['admin_roster_max_size']
+    ):
+        """
+        Initialize roster cache
+        
+        Args:
+            ttl: Seconds before a chat's roster is refreshed
+            max_chats: Maximum number of chats kept in memory
+        """
+        self.ttl = ttl
+        self.max_chats = max_chats
+        self.refreshes = 0
+        self.member_updates = 0
+        # القروب -> (وقت إعادة التحميل، القائمة)، بلا عمر في الذاكرة لأن
+        # القائمة المنتهية تبقى مستخدمة حتى يكتمل تحميلها من جديد
+        self._entries = CacheService(ttl=None, max_size=max_chats)
+        # تحميل واحد لكل قروب تشترك فيه كل الأوامر التي تنتظره
+        self._loading: Dict[int, asyncio.Task] = {}
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @property
+    def hits(self) -> int:
+        return self._entries.hits
+    
+    @property
+    def misses(self) -> int:
+        return self._entries.misses
+    
+    async def get(self, bot, chat_id: int) -> Roster:
+        """مسؤولو القروب، وتحميلهم عند أول طلب"""
+        entry = self._entries.get(chat_id)
+        if entry is None:
+            return await asyncio.shield(self._refresh(bot, chat_id))
+        
+        refresh_at, roster = entry
+        if time.monotonic() > refresh_at:
+            self._refresh(bot, chat_id)
+        return roster
+    
+    async def get_member(self, bot, chat_id: int, user_id: int) -> Optional[ChatMember]:
+        """عضوية المستخدم إذا كان مسؤولاً في القروب، وإلا None"""
+        return (await self.get(bot, chat_id)).get(user_id)
+    
+    def _refresh(self, bot, chat_id: int) -> asyncio.Task:
+        task = self._loading.get(chat_id)
+        if task is None:
+            task = self._loading[chat_id] = asyncio.create_task(self._load(bot, chat_id))
+            task.add_done_callback(lambda done: self._loaded(chat_id, done))
+        return task
+    
+    def _loaded(self, chat_id: int, task: asyncio.Task) -> None:
+        self._loading.pop(chat_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"⚠️ تعذر تحميل مسؤولي القروب {chat_id}: {task.exception()}")
+    
+    async def _load(self, bot, chat_id: int) -> Roster:
+        # get_chat_administrators لا يعيد البوتات، ومنها البوت نفسه
+        administrators, bot_member = await asyncio.gather(
+            outbound.call(PRIORITY_BAN, chat_id, bot.get_chat_administrators, chat_id),
+            outbound.call(PRIORITY_BAN, chat_id, bot.get_chat_member, chat_id, bot.id),
+        )
+        roster = {member.user.id: member for member in administrators}
+        if bot_member.status in ADMIN_STATUSES:
+            roster[bot.id] = bot_member
+        self._store(chat_id, roster)
+        self.refreshes += 1
+        return roster
+    
+    def _store(self, chat_id: int, roster: Roster) -> None:
+        self._entries.set(chat_id, (time.monotonic() + self.ttl, roster))
+    
+    def apply_member_update(self, member_update: ChatMemberUpdated, bot_id: int) -> None:
+        """تعديل قائمة القروب من تحديث chat_member أو my_chat_member"""
+        chat_id = member_update.chat.id
+        member = member_update.new_chat_member
+        if member.user.id == bot_id and member.status in (ChatMember.LEFT, ChatMember.BANNED):
+            # خرج البوت من القروب
+            self.invalidate(chat_id)
+            return
+        
+        entry = self._entries.get(chat_id)
+        if entry is None:
+            # القائمة تُحمّل كاملة عند أول أمر
+            return
+        self.member_updates += 1
+        if member.status in ADMIN_STATUSES:
+            entry[1][member.user.id] = member
+        else:
+            entry[1].pop(member.user.id, None)
+    
+    def invalidate(self, chat_id: int) -> None:
+        """إزالة قائمة القروب لتُحمّل من جديد عند أول أمر"""
+        self._entries.delete(chat_id)
+    
+    def clear(self) -> None:
+        """Clear all cached rosters"""
+        self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get roster cache statistics"""
+        total = self.hits + self.misses
+        return {
+            'chats': len(self._entries),
+            'max_chats': self.max_chats,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self._entries.evictions,
+            'refreshes': self.refreshes,
+            'member_updates': self.member_updates,
+            'hit_rate': f"{(self.hits / total * 100) if total else 0:.2f}%",
+        }
+
+
+# إنشاء نسخة واحدة من الذاكرة
+admin_roster = AdminRoster()
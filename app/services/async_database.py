@@ -0,0 +1,113 @@
+"""
+طبقة قاعدة بيانات غير متزامنة لمعالجات البوت
+Async Database Layer for Bot Handlers
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from app.config import DATABASE_CONFIG
+from app.models.init_db import SessionLocal
+from app.services.chat_settings_cache import CachedChatSettings, chat_settings_cache
+from app.services.database_service import DatabaseService
+from app.services.membership_index import membership_index
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabaseService:
+    """
+    نفس عمليات DatabaseService كدوال async تُنفذ في منفذ خيوط محدود
+    
+    كل عملية تفتح جلستها في خيط المنفذ وتغلقها هناك، فلا تتوقف حلقة الأحداث
+    أثناء الاستعلام أو الحفظ. عدد الخيوط محدود لأن SQLite يقبل كاتباً واحداً
+    في كل لحظة، وزيادة الخيوط تزيد الانتظار على القفل فقط.
+    
+    الاستخدام:
+        await async_db.log_activity(chat_id, "action", user_id, user_name, details)
+    """
+    
+    def __init__(self, max_workers: int = DATABASE_CONFIG['executor_workers']):
+        """
+        Initialize async database layer
+        
+        Args:
+            max_workers: Maximum threads running database calls
+        """
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='db')
+        return self._executor
+    
+    @staticmethod
+    def _call_with_session(operation: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        # الكائنات المعادة تُستخدم بعد إغلاق الجلسة، فلا تُلغى قيمها بعد الحفظ
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            return operation(db, *args, **kwargs)
+        finally:
+            db.close()
+    
+    async def run(self, operation: Callable[..., Any], *args, **kwargs) -> Any:
+        """تنفيذ دالة تأخذ الجلسة كأول معامل في منفذ قاعدة البيانات"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(self._call_with_session, operation, args, kwargs)
+        )
+    
+    async def run_blocking(self, function: Callable[..., Any], *args, **kwargs) -> Any:
+        """تنفيذ دالة متزامنة تفتح جلستها بنفسها في منفذ قاعدة البيانات"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(function, *args, **kwargs))
+    
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        """عمليات DatabaseService بدون معامل الجلسة: await async_db.<operation>(...)"""
+        if name.startswith('_'):
+            raise AttributeError(name)
+        operation = getattr(DatabaseService, name)
+        
+        async def call(*args, **kwargs):
+            return await self.run(operation, *args, **kwargs)
+        
+        call.__name__ = name
+        call.__doc__ = operation.__doc__
+        self.__dict__[name] = call
+        return call
+    
+    async def get_chat_settings(self, chat_id: int) -> CachedChatSettings:
+        """إعدادات القروب من الذاكرة، وتحميلها في المنفذ عند أول رسالة"""
+        settings = chat_settings_cache.peek(chat_id)
+        if settings is None:
+            settings = chat_settings_cache.update(
+                await self.run_blocking(chat_settings_cache.loader, chat_id)
+            )
+        return settings
+    
+    async def is_user_whitelisted(self, chat_id: int, user_id: int) -> bool:
+        """التحقق من القائمة البيضاء دون المنفذ إذا كان فهرس العضوية محملاً"""
+        if membership_index.loaded:
+            return membership_index.is_whitelisted(chat_id, user_id)
+        return await self.run(DatabaseService.is_user_whitelisted, chat_id, user_id)
+    
+    async def is_user_blacklisted(self, chat_id: int, user_id: int) -> bool:
+        """التحقق من القائمة السوداء دون المنفذ إذا كان فهرس العضوية محملاً"""
+        if membership_index.loaded:
+            return membership_index.is_blacklisted(chat_id, user_id)
+        return await self.run(DatabaseService.is_user_blacklisted, chat_id, user_id)
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """إيقاف المنفذ بعد انتهاء العمليات الجارية"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+# إنشاء نسخة واحدة من الطبقة
+async_db = AsyncDatabaseService()
@@ -5,70 +5,202 @@ Caching Service for Performance Optimization
 
 import logging
 import time
-from typing import Dict, Any, Optional
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Set
 from functools import wraps
 
+from app.config import CACHE_CONFIG
+
 logger = logging.getLogger(__name__)
 
 
+class _Entry:
+    """قيمة محفوظة ووقت انتهائها وخانتها في عجلة المؤقتات"""
+    
+    __slots__ = ('value', 'expires_at', 'tick')
+    
+    def __init__(self, value: Any, expires_at: float, tick: Optional[int]):
+        self.value = value
+        self.expires_at = expires_at
+        self.tick = tick
+
+
 class CacheService:
-    """خدمة التخزين المؤقت"""
+    """
+    ذاكرة LRU محدودة الحجم مع عمر للقيم
     
-    def __init__(self, ttl: int = 3600):
+    الترتيب في OrderedDict يجعل الإخراج عند الامتلاء O(1) للأقدم استخداماً.
+    القيم المنتهية تُحذف عند قراءتها، أو من عجلة مؤقتات: كل خانة تجمع مفاتيح
+    القيم التي تنتهي في نفس resolution ثانية، وكل set يحذف الخانات التي مر
+    وقتها، فتكلفة الحذف موزعة على الكتابات دون المرور على كل القيم.
+    
+    ttl=None يعني أن القيم لا تنتهي ويبقى حد الحجم وحده.
+    """
+    
+    def __init__(
+        self,
+        ttl: Optional[float] = CACHE_CONFIG['ttl'],
+        max_size: int = CACHE_CONFIG['max_size'],
+        resolution: float = 1.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
         """
         Initialize cache service
         
         Args:
-            ttl: Time to live in seconds (default: 1 hour)
+            ttl: Time to live in seconds (None: entries never expire)
+            max_size: Maximum entries before the least recently used is evicted
+            resolution: Seconds covered by one timer-wheel slot
+            clock: Monotonic time source
         """
-        self.cache: Dict[str, Dict[str, Any]] = {}
         self.ttl = ttl
+        self.max_size = max_size
+        self.resolution = resolution
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        # خانة الوقت -> مفاتيح القيم التي تنتهي فيها
+        self._wheel: Dict[int, Set[Hashable]] = {}
+        # أول خانة لم تُحذف قيمها بعد
+        self._cursor: Optional[int] = None
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and (entry.tick is None or self.clock() <= entry.expires_at)
+    
+    def values(self) -> Iterator[Any]:
+        """القيم المحفوظة بترتيب الاستخدام، ومنها المنتهية التي لم تُحذف بعد"""
+        return (entry.value for entry in self._entries.values())
     
-    def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
-        if key not in self.cache:
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get value from cache, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
             return None
         
-        entry = self.cache[key]
-        if time.time() - entry['timestamp'] > self.ttl:
-            del self.cache[key]
+        if entry.tick is not None and self.clock() > entry.expires_at:
+            self._remove(key, entry)
+            self.expirations += 1
+            self.misses += 1
             return None
         
-        return entry['value']
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
     
-    def set(self, key: str, value: Any) -> None:
-        """Set value in cache"""
-        self.cache[key] = {
-            'value': value,
-            'timestamp': time.time()
-        }
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Set value in cache (ttl overrides the cache ttl for this entry)"""
+        ttl = self.ttl if ttl is None else ttl
+        tick = None
+        expires_at = float('inf')
+        if ttl is not None:
+            now = self.clock()
+            self._advance(now)
+            expires_at = now + ttl
+            # عمر سالب لا يعيد القيمة إلى خانة مرت
+            tick = max(int(expires_at // self.resolution), self._cursor)
+        
+        entries = self._entries
+        entry = entries.get(key)
+        if entry is None:
+            entry = entries[key] = _Entry(value, expires_at, tick)
+        else:
+            self._unschedule(key, entry)
+            entry.value = value
+            entry.expires_at = expires_at
+            entry.tick = tick
+            entries.move_to_end(key)
+        
+        if tick is not None:
+            keys = self._wheel.get(tick)
+            if keys is None:
+                keys = self._wheel[tick] = set()
+            keys.add(key)
+        
+        while len(entries) > self.max_size:
+            evicted_key, evicted = entries.popitem(last=False)
+            self._unschedule(evicted_key, evicted)
+            self.evictions += 1
     
-    def delete(self, key: str) -> None:
+    def delete(self, key: Hashable) -> None:
         """Delete value from cache"""
-        if key in self.cache:
-            del self.cache[key]
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._remove(key, entry)
     
     def clear(self) -> None:
         """Clear all cache"""
-        self.cache.clear()
+        self._entries.clear()
+        self._wheel.clear()
+        self._cursor = None
     
     def cleanup_expired(self) -> int:
-        """Remove expired entries"""
-        current_time = time.time()
-        expired_keys = [
-            key for key, entry in self.cache.items()
-            if current_time - entry['timestamp'] > self.ttl
-        ]
+        """Remove expired entries whose timer-wheel slot has passed"""
+        return self._advance(self.clock())
+    
+    def _remove(self, key: Hashable, entry: _Entry) -> None:
+        del self._entries[key]
+        self._unschedule(key, entry)
+    
+    def _unschedule(self, key: Hashable, entry: _Entry) -> None:
+        if entry.tick is None:
+            return
+        keys = self._wheel.get(entry.tick)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._wheel[entry.tick]
+    
+    def _advance(self, now: float) -> int:
+        """حذف قيم الخانات التي انتهى وقتها كاملاً قبل now"""
+        current = int(now // self.resolution)
+        cursor = self._cursor
+        self._cursor = current
+        if cursor is None or current <= cursor or not self._wheel:
+            return 0
         
-        for key in expired_keys:
-            del self.cache[key]
+        # بعد توقف طويل تُقرأ الخانات الموجودة بدلاً من كل الخانات الفارغة
+        if current - cursor > len(self._wheel):
+            ticks = sorted(tick for tick in self._wheel if tick < current)
+        else:
+            ticks = range(cursor, current)
         
-        return len(expired_keys)
+        removed = 0
+        entries = self._entries
+        for tick in ticks:
+            keys = self._wheel.pop(tick, None)
+            if keys:
+                for key in keys:
+                    del entries[key]
+                removed += len(keys)
+        self.expirations += removed
+        return removed
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': f"{(self.hits / total * 100) if total else 0:.2f}%",
+        }
 
 
-def cached(ttl: int = 3600):
+def cached(ttl: int = CACHE_CONFIG['ttl'], max_size: int = CACHE_CONFIG['max_size']):
     """Decorator for caching function results"""
-    cache = CacheService(ttl=ttl)
+    cache = CacheService(ttl=ttl, max_size=max_size)
     
     def decorator(func):
         @wraps(func)
@@ -89,10 +221,11 @@ def cached(ttl: int = 3600):
             
             return result
         
+        wrapper.cache = cache
         return wrapper
     
     return decorator
 
 
 # Global cache instance
-global_cache = CacheService(ttl=3600)
+global_cache = CacheService()
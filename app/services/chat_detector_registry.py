@@ -0,0 +1,232 @@
+"""
+سجل كواشف القروبات المترجمة (الكلمات المفتاحية المخصصة لكل قروب)
+Per-Chat Compiled Detector Registry
+"""
+
+import asyncio
+import itertools
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config import DETECTION_CONFIG
+from app.models.init_db import SessionLocal
+from app.services.async_database import async_db
+from app.services.cache_service import CacheService
+from app.services.database_service import DatabaseService
+from app.services.fuzzy_index import FuzzyKeywordIndex, FuzzyMatchMemo
+from app.services.keyword_automaton import KeywordAutomaton
+from app.services.text_normalizer import TextNormalizer
+
+logger = logging.getLogger(__name__)
+
+
+class ChatDetector:
+    """
+    كاشف مترجم لكلمات قروب واحد
+    
+    يحتوي فقط على كلمات القروب من جدول keywords، ويُطبق فوق الكاشف العام
+    المشترك بين كل القروبات، فلا تتكرر الكلمات العامة في ذاكرة كل قروب.
+    """
+    
+    # عداد مشترك للإصدارات حتى لا يتكرر إصدار قروب أُعيد بناؤه بعد إخراجه
+    _versions = itertools.count(1)
+    
+    def __init__(self, chat_id: int, keywords: Iterable[Tuple[str, float]] = ()):
+        """
+        Initialize chat detector
+        
+        Args:
+            chat_id: Chat ID
+            keywords: (keyword, weight) pairs as stored in the keywords table
+        """
+        self.chat_id = chat_id
+        self.version = next(ChatDetector._versions)
+        self.weights: Dict[str, float] = {}
+        self.automaton = KeywordAutomaton()
+        self.fuzzy_index = FuzzyKeywordIndex(threshold=DETECTION_CONFIG['fuzzy_match_threshold'])
+        self.fuzzy_memo = FuzzyMatchMemo(self.fuzzy_index, DETECTION_CONFIG['chat_fuzzy_memo_size'])
+        
+        for keyword, weight in keywords:
+            self.add_keyword(keyword, weight)
+    
+    def __len__(self) -> int:
+        return len(self.weights)
+    
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self.weights
+    
+    @staticmethod
+    def normalize_keyword(keyword: str) -> str:
+        """تطبيع الكلمة بنفس طريقة تطبيع الرسائل"""
+        return TextNormalizer.normalize(keyword)[0]
+    
+    def add_keyword(self, keyword: str, weight: float) -> None:
+        """إضافة كلمة دون إعادة بناء بقية الكلمات"""
+        keyword = self.normalize_keyword(keyword)
+        if not keyword:
+            return
+        
+        self.weights[keyword] = weight
+        self.automaton.add(keyword)
+        self.fuzzy_index.add(keyword)
+        self.version = next(ChatDetector._versions)
+    
+    def remove_keyword(self, keyword: str) -> None:
+        """إزالة كلمة"""
+        keyword = self.normalize_keyword(keyword)
+        if self.weights.pop(keyword, None) is None:
+            return
+        
+        self.automaton.remove(keyword)
+        self.fuzzy_index.remove(keyword)
+        self.version = next(ChatDetector._versions)
+    
+    @property
+    def cache_key(self) -> Optional[Tuple[int, int]]:
+        """مفتاح يميز مجموعة كلمات القروب في ذاكرة الأحكام"""
+        return (self.chat_id, self.version) if self.weights else None
+
+
+class ChatDetectorRegistry:
+    """
+    سجل LRU لكواشف القروبات يُبنى كل كاشف فيه عند أول استخدام
+    
+    معالجات البوت تستدعي load قبل الكشف فتُقرأ الكلمات في منفذ قاعدة
+    البيانات دون إيقاف حلقة الأحداث. get يحمّل بشكل متزامن للاستخدام خارج
+    الحلقة فقط (الاختبارات وأدوات القياس).
+    """
+    
+    def __init__(
+        self,
+        max_chats: int = DETECTION_CONFIG['chat_detector_cache_size'],
+        loader: Optional[Callable[[int], List[Tuple[str, bool]]]] = None
+    ):
+        """
+        Initialize registry
+        
+        Args:
+            max_chats: Maximum number of chat detectors kept in memory
+            loader: Returns (keyword, is_custom) rows for a chat (default: database)
+        """
+        self.max_chats = max_chats
+        self.loader = loader or ChatDetectorRegistry._load_from_db
+        self.builds = 0
+        # بلا عمر: تعديلات الكلمات تُطبق على الكاشف المحمل مباشرة
+        self._detectors = CacheService(ttl=None, max_size=max_chats)
+        # تحميل واحد لكل قروب تشترك فيه الرسائل التي تنتظره
+        self._loading: Dict[int, asyncio.Task] = {}
+        # قروبات تغيرت كلماتها أثناء تحميلها، فلا يُحفظ كاشفها القديم
+        self._stale: Set[int] = set()
+    
+    def __len__(self) -> int:
+        return len(self._detectors)
+    
+    @staticmethod
+    def _load_from_db(chat_id: int) -> List[Tuple[str, bool]]:
+        db = SessionLocal()
+        try:
+            return DatabaseService.get_keyword_entries(db, chat_id)
+        finally:
+            db.close()
+    
+    @staticmethod
+    def keyword_weight(is_custom: bool) -> float:
+        """وزن الكلمة حسب نوعها في جدول keywords"""
+        if is_custom:
+            return DETECTION_CONFIG['custom_keyword_weight']
+        return DETECTION_CONFIG['blacklist_keyword_weight']
+    
+    def get(self, chat_id: int) -> Optional[ChatDetector]:
+        """
+        الحصول على كاشف القروب، وبناؤه من قاعدة البيانات عند أول استخدام
+        
+        Returns:
+            The chat detector, or None if its keywords could not be loaded
+        """
+        detector = self._detectors.get(chat_id)
+        if detector is not None:
+            return detector
+        
+        try:
+            rows = self.loader(chat_id)
+        except Exception as e:
+            # لا يُحفظ شيء حتى تُعاد المحاولة في الرسالة التالية
+            logger.error(f"خطأ في تحميل كلمات القروب {chat_id}: {e}")
+            return None
+        return self._build(chat_id, rows)
+    
+    async def load(self, chat_id: int) -> Optional[ChatDetector]:
+        """نفس get مع قراءة الكلمات في منفذ قاعدة البيانات"""
+        detector = self._detectors.get(chat_id)
+        if detector is not None:
+            return detector
+        
+        task = self._loading.get(chat_id)
+        if task is None:
+            task = self._loading[chat_id] = asyncio.create_task(self._load_async(chat_id))
+            task.add_done_callback(lambda done: self._loading.pop(chat_id, None))
+        return await asyncio.shield(task)
+    
+    async def _load_async(self, chat_id: int) -> Optional[ChatDetector]:
+        try:
+            rows = await async_db.run_blocking(self.loader, chat_id)
+        except Exception as e:
+            logger.error(f"خطأ في تحميل كلمات القروب {chat_id}: {e}")
+            self._stale.discard(chat_id)
+            return None
+        
+        stale = chat_id in self._stale
+        self._stale.discard(chat_id)
+        return self._build(chat_id, rows, store=not stale)
+    
+    def _build(self, chat_id: int, rows: List[Tuple[str, bool]], store: bool = True) -> ChatDetector:
+        detector = ChatDetector(
+            chat_id,
+            ((keyword, self.keyword_weight(is_custom)) for keyword, is_custom in rows)
+        )
+        self.builds += 1
+        if store:
+            self._detectors.set(chat_id, detector)
+        return detector
+    
+    def _mark_stale(self, chat_id: int) -> None:
+        if chat_id in self._loading:
+            self._stale.add(chat_id)
+    
+    def add_keyword(self, chat_id: int, keyword: str, is_custom: bool = True) -> None:
+        """تحديث كاشف القروب بعد /addkeyword إذا كان محملاً"""
+        self._mark_stale(chat_id)
+        detector = self._detectors.get(chat_id)
+        if detector is not None:
+            detector.add_keyword(keyword, self.keyword_weight(is_custom))
+    
+    def remove_keyword(self, chat_id: int, keyword: str) -> None:
+        """تحديث كاشف القروب بعد /removekeyword إذا كان محملاً"""
+        self._mark_stale(chat_id)
+        detector = self._detectors.get(chat_id)
+        if detector is not None:
+            detector.remove_keyword(keyword)
+    
+    def invalidate(self, chat_id: int) -> None:
+        """إزالة كاشف القروب ليُبنى من جديد عند أول استخدام"""
+        self._mark_stale(chat_id)
+        self._detectors.delete(chat_id)
+    
+    def clear(self) -> None:
+        """Clear all chat detectors"""
+        self._stale.update(self._loading)
+        self._detectors.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get registry statistics"""
+        return {
+            'chats': len(self._detectors),
+            'max_chats': self.max_chats,
+            'builds': self.builds,
+            'evictions': self._detectors.evictions,
+            'keywords': sum(len(detector) for detector in self._detectors.values()),
+        }
+
+
+# إنشاء نسخة واحدة من السجل
+chat_detector_registry = ChatDetectorRegistry()
@@ -0,0 +1,197 @@
+"""
+موزع رسائل القروبات على عمال متوازين مع الحفاظ على الترتيب
+Per-Chat Ordered Dispatcher with Cross-Chat Parallelism
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from app.config import DISPATCHER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# (الدالة، معاملاتها)
+Job = Tuple[Callable[..., Awaitable[Any]], tuple]
+
+
+class ChatDispatcher:
+    """
+    طابور لكل قروب وعدد محدود من العمال يخدمون القروبات بالتناوب
+    
+    رسائل القروب الواحد تُعالج واحدة بعد الأخرى بترتيب وصولها، لأن القروب
+    لا يُسلّم لأكثر من عامل في نفس الوقت. القروبات المختلفة تُعالج بالتوازي،
+    فتأخر قروب (قفل في قاعدة البيانات أو خطأ 429) لا يؤخر غيره.
+    
+    الجدولة Deficit Round Robin: كل قروب جاهز يأخذ في دوره quantum * weight
+    رسالة ثم يعود إلى آخر الصف، فالقروب الكبير لا يحجز العمال عن البقية.
+    عند امتلاء طابور القروب أو الحد الكلي ينتظر submit حتى يفرغ مكان.
+    """
+    
+    def __init__(
+        self,
+        workers: int = DISPATCHER_CONFIG['workers'],
+        quantum: int = DISPATCHER_CONFIG['quantum'],
+        max_queue_per_chat: int = DISPATCHER_CONFIG['max_queue_per_chat'],
+        max_pending: int = DISPATCHER_CONFIG['max_pending']
+    ):
+        """
+        Initialize dispatcher
+        
+        Args:
+            workers: Chats processed concurrently
+            quantum: Messages a chat of weight 1 processes per turn
+            max_queue_per_chat: Queued messages per chat before submit() waits
+            max_pending: Queued messages across all chats before submit() waits
+        """
+        self.workers = workers
+        self.quantum = quantum
+        self.max_queue_per_chat = max_queue_per_chat
+        self.max_pending = max_pending
+        self.processed = 0
+        self.failed = 0
+        self.backpressure_waits = 0
+        self._queues: Dict[int, Deque[Job]] = {}
+        self._weights: Dict[int, float] = {}
+        self._deficits: Dict[int, float] = {}
+        # القروبات التي لديها رسائل ولا يعالجها عامل الآن، بترتيب دورها
+        self._ready: Deque[int] = deque()
+        # القروبات الموجودة في _ready أو التي يعالجها عامل
+        self._scheduled: Set[int] = set()
+        self._pending = 0
+        self._closing = False
+        self._condition: Optional[asyncio.Condition] = None
+        self._tasks: List[asyncio.Task] = []
+    
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+    
+    @property
+    def full(self) -> bool:
+        """الحد الكلي للرسائل المنتظرة ممتلئ"""
+        return self._pending >= self.max_pending
+    
+    def set_weight(self, chat_id: int, weight: float) -> None:
+        """تعديل نصيب القروب في كل دور (الافتراضي 1)"""
+        if weight == 1:
+            self._weights.pop(chat_id, None)
+        else:
+            self._weights[chat_id] = weight
+    
+    def queue_depth(self, chat_id: int) -> int:
+        """عدد رسائل القروب التي تنتظر المعالجة"""
+        queue = self._queues.get(chat_id)
+        return len(queue) if queue is not None else 0
+    
+    async def start(self) -> None:
+        """بدء العمال في حلقة الأحداث الحالية"""
+        if self._tasks:
+            return
+        self._closing = False
+        self._condition = asyncio.Condition()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"chat-dispatcher-{index}")
+            for index in range(self.workers)
+        ]
+    
+    async def stop(self) -> None:
+        """معالجة كل الرسائل المنتظرة ثم إيقاف العمال"""
+        if not self._tasks:
+            return
+        async with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        await asyncio.gather(*self._tasks)
+        self._tasks = []
+        self._condition = None
+    
+    def _has_room(self, chat_id: int) -> bool:
+        return (
+            self._pending < self.max_pending
+            and self.queue_depth(chat_id) < self.max_queue_per_chat
+        )
+    
+    async def submit(self, chat_id: int, callback: Callable[..., Awaitable[Any]], *args) -> None:
+        """إضافة رسالة إلى طابور القروب، والانتظار إذا كان ممتلئاً"""
+        if not self._tasks or self._closing:
+            # الموزع لا يعمل: معالجة فورية
+            await self._run(callback, args)
+            return
+        
+        async with self._condition:
+            if not self._has_room(chat_id):
+                self.backpressure_waits += 1
+                await self._condition.wait_for(lambda: self._has_room(chat_id))
+            
+            queue = self._queues.get(chat_id)
+            if queue is None:
+                queue = self._queues[chat_id] = deque()
+            queue.append((callback, args))
+            self._pending += 1
+            if chat_id not in self._scheduled:
+                self._scheduled.add(chat_id)
+                self._ready.append(chat_id)
+                self._condition.notify_all()
+    
+    async def _worker(self) -> None:
+        condition = self._condition
+        while True:
+            async with condition:
+                await condition.wait_for(lambda: self._ready or self._closing)
+                if not self._ready:
+                    return
+                chat_id = self._ready.popleft()
+            
+            weight = self._weights.get(chat_id, 1)
+            deficit = self._deficits.pop(chat_id, 0) + self.quantum * weight
+            queue = self._queues[chat_id]
+            while queue and deficit >= 1:
+                callback, args = queue.popleft()
+                deficit -= 1
+                async with condition:
+                    self._pending -= 1
+                    condition.notify_all()
+                await self._run(callback, args)
+            
+            async with condition:
+                if queue:
+                    # انتهى دور القروب وبقيت رسائل: يعود إلى آخر الصف
+                    self._deficits[chat_id] = deficit
+                    self._ready.append(chat_id)
+                else:
+                    del self._queues[chat_id]
+                    self._scheduled.discard(chat_id)
+                condition.notify_all()
+    
+    async def _run(self, callback: Callable[..., Awaitable[Any]], args: tuple) -> None:
+        try:
+            await callback(*args)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"❌ خطأ في معالجة رسالة من الطابور: {e}")
+            return
+        self.processed += 1
+    
+    def get_stats(self, top: int = 10) -> Dict[str, Any]:
+        """Get dispatcher statistics with the deepest chat queues"""
+        depths = sorted(
+            ((chat_id, len(queue)) for chat_id, queue in self._queues.items()),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        return {
+            'running': self.running,
+            'workers': self.workers,
+            'pending': self._pending,
+            'chats_waiting': len(self._queues),
+            'processed': self.processed,
+            'failed': self.failed,
+            'backpressure_waits': self.backpressure_waits,
+            'deepest_queues': dict(depths[:top]),
+        }
+
+
+# إنشاء نسخة واحدة من الموزع
+chat_dispatcher = ChatDispatcher()
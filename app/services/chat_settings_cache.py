@@ -0,0 +1,120 @@
+"""
+ذاكرة إعدادات القروبات داخل العملية
+In-Process Chat Settings Cache
+"""
+
+import logging
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from app.config import CACHE_CONFIG
+from app.models.init_db import SessionLocal
+from app.services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+
+class CachedChatSettings(NamedTuple):
+    """نسخة ثابتة من حقول إعدادات القروب المستخدمة في معالجة الرسائل"""
+    chat_id: int
+    is_enabled: bool
+    detection_sensitivity: float
+    auto_delete: bool
+    notify_admins: bool
+    max_warnings: int
+    
+    @classmethod
+    def from_row(cls, settings: Any) -> "CachedChatSettings":
+        """نسخ الحقول من صف chat_settings"""
+        return cls(
+            chat_id=settings.chat_id,
+            is_enabled=bool(settings.is_enabled),
+            detection_sensitivity=settings.detection_sensitivity,
+            auto_delete=bool(settings.auto_delete),
+            notify_admins=bool(settings.notify_admins),
+            max_warnings=settings.max_warnings,
+        )
+
+
+class ChatSettingsCache:
+    """
+    ذاكرة LRU لإعدادات القروبات تُحمّل عند أول رسالة من كل قروب
+    
+    أوامر التعديل في DatabaseService تحدّث النسخة المحفوظة بعد الحفظ في قاعدة
+    البيانات، والعمر المحدود يلتقط التعديلات التي تتم من عملية أخرى.
+    """
+    
+    def __init__(
+        self,
+        max_chats: int = CACHE_CONFIG['chat_settings_max_size'],
+        ttl: float = CACHE_CONFIG['chat_settings_ttl'],
+        loader: Optional[Callable[[int], Any]] = None
+    ):
+        """
+        Initialize settings cache
+        
+        Args:
+            max_chats: Maximum number of chats kept in memory
+            ttl: Seconds before a chat's settings are reloaded
+            loader: Returns the chat_settings row for a chat (default: database)
+        """
+        self.max_chats = max_chats
+        self.ttl = ttl
+        self.loader = loader or ChatSettingsCache._load_from_db
+        self._entries = CacheService(ttl=ttl, max_size=max_chats)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @property
+    def hits(self) -> int:
+        return self._entries.hits
+    
+    @property
+    def misses(self) -> int:
+        return self._entries.misses
+    
+    @staticmethod
+    def _load_from_db(chat_id: int) -> CachedChatSettings:
+        # استيراد متأخر لأن DatabaseService يستورد هذه الوحدة لتحديث الذاكرة
+        from app.services.database_service import DatabaseService
+        
+        db = SessionLocal()
+        try:
+            settings = DatabaseService.get_or_create_chat_settings(db, chat_id)
+            return CachedChatSettings.from_row(settings)
+        finally:
+            db.close()
+    
+    def peek(self, chat_id: int) -> Optional[CachedChatSettings]:
+        """إعدادات القروب المحفوظة، أو None إذا لم تُحمّل أو انتهى عمرها"""
+        return self._entries.get(chat_id)
+    
+    def get(self, chat_id: int) -> CachedChatSettings:
+        """الحصول على إعدادات القروب، وتحميلها من قاعدة البيانات عند الحاجة"""
+        settings = self.peek(chat_id)
+        if settings is None:
+            settings = self.update(self.loader(chat_id))
+        return settings
+    
+    def update(self, settings: Any) -> CachedChatSettings:
+        """تحديث النسخة المحفوظة من صف chat_settings بعد تحميله أو حفظه"""
+        if not isinstance(settings, CachedChatSettings):
+            settings = CachedChatSettings.from_row(settings)
+        self._entries.set(settings.chat_id, settings)
+        return settings
+    
+    def invalidate(self, chat_id: int) -> None:
+        """إزالة إعدادات القروب لتُحمّل من جديد عند أول رسالة"""
+        self._entries.delete(chat_id)
+    
+    def clear(self) -> None:
+        """Clear all cached settings"""
+        self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        return self._entries.get_stats()
+
+
+# إنشاء نسخة واحدة من الذاكرة
+chat_settings_cache = ChatSettingsCache()
@@ -5,8 +5,11 @@ Database Service - Complete Version
 
 from sqlalchemy.orm import Session
 from app.models.init_db import (
-    ChatSettings, DeletedMessage, WhitelistUser, BlacklistUser, Keyword, ActivityLog
+    ChatSettings, DeletedMessage, WhitelistUser, BlacklistUser, Keyword, ActivityLog,
+    UserStatistics
 )
+from app.services.chat_settings_cache import chat_settings_cache
+from app.services.membership_index import BLACKLIST, WHITELIST, membership_index
 from datetime import datetime, timedelta
 import json
 import logging
@@ -43,6 +46,7 @@ class DatabaseService:
         settings = DatabaseService.get_or_create_chat_settings(db, chat_id)
         settings.is_enabled = enabled
         db.commit()
+        chat_settings_cache.update(settings)
         return settings
     
     @staticmethod
@@ -51,6 +55,7 @@ class DatabaseService:
         settings = DatabaseService.get_or_create_chat_settings(db, chat_id)
         settings.detection_sensitivity = max(0.1, min(1.0, sensitivity))
         db.commit()
+        chat_settings_cache.update(settings)
         return settings
     
     # ===== إدارة الرسائل المحذوفة =====
@@ -90,6 +95,25 @@ class DatabaseService:
         ).all()
         return messages
     
+    @staticmethod
+    def get_recent_deleted_messages(db: Session, seconds: int, limit: int):
+        """الحصول على آخر الرسائل المحذوفة في كل القروبات، من الأقدم إلى الأحدث"""
+        since = datetime.utcnow() - timedelta(seconds=seconds)
+        messages = db.query(DeletedMessage).filter(
+            DeletedMessage.deleted_at >= since
+        ).order_by(DeletedMessage.deleted_at.desc()).limit(limit).all()
+        return list(reversed(messages))
+    
+    # ===== سمعة الأعضاء =====
+    
+    @staticmethod
+    def get_recent_user_statistics(db: Session, limit: int):
+        """الحصول على آخر سجلات سمعة الأعضاء تعديلاً، من الأقدم إلى الأحدث"""
+        rows = db.query(UserStatistics).order_by(
+            UserStatistics.updated_at.desc()
+        ).limit(limit).all()
+        return list(reversed(rows))
+    
     # ===== إدارة القوائم البيضاء والسوداء =====
     
     @staticmethod
@@ -102,6 +126,7 @@ class DatabaseService:
         ).first()
         
         if existing:
+            membership_index.add(WHITELIST, chat_id, user_id)
             return existing
         
         whitelist = WhitelistUser(
@@ -111,6 +136,7 @@ class DatabaseService:
         )
         db.add(whitelist)
         db.commit()
+        membership_index.add(WHITELIST, chat_id, user_id)
         return whitelist
     
     @staticmethod
@@ -121,10 +147,14 @@ class DatabaseService:
             WhitelistUser.user_id == user_id
         ).delete()
         db.commit()
+        membership_index.remove(WHITELIST, chat_id, user_id)
     
     @staticmethod
     def is_user_whitelisted(db: Session, chat_id: int, user_id: int) -> bool:
         """التحقق من وجود مستخدم في القائمة البيضاء"""
+        if membership_index.loaded:
+            return membership_index.is_whitelisted(chat_id, user_id)
+        
         result = db.query(WhitelistUser).filter(
             WhitelistUser.chat_id == chat_id,
             WhitelistUser.user_id == user_id
@@ -140,6 +170,7 @@ class DatabaseService:
         ).first()
         
         if existing:
+            membership_index.add(BLACKLIST, chat_id, user_id)
             return existing
         
         blacklist = BlacklistUser(
@@ -149,6 +180,7 @@ class DatabaseService:
         )
         db.add(blacklist)
         db.commit()
+        membership_index.add(BLACKLIST, chat_id, user_id)
         return blacklist
     
     @staticmethod
@@ -159,16 +191,26 @@ class DatabaseService:
             BlacklistUser.user_id == user_id
         ).delete()
         db.commit()
+        membership_index.remove(BLACKLIST, chat_id, user_id)
     
     @staticmethod
     def is_user_blacklisted(db: Session, chat_id: int, user_id: int) -> bool:
         """التحقق من وجود مستخدم في القائمة السوداء"""
+        if membership_index.loaded:
+            return membership_index.is_blacklisted(chat_id, user_id)
+        
         result = db.query(BlacklistUser).filter(
             BlacklistUser.chat_id == chat_id,
             BlacklistUser.user_id == user_id
         ).first()
         return result is not None
     
+    @staticmethod
+    def stream_list_members(db: Session, list_name: str, batch_size: int = 10000):
+        """قراءة أزواج (chat_id, user_id) لقائمة على دفعات دون تحميل الجدول كاملاً"""
+        model = WhitelistUser if list_name == WHITELIST else BlacklistUser
+        return db.query(model.chat_id, model.user_id).yield_per(batch_size)
+    
     # ===== إدارة الكلمات المفتاحية =====
     
     @staticmethod
@@ -206,6 +248,14 @@ class DatabaseService:
         keywords = db.query(Keyword).filter(Keyword.chat_id == chat_id).all()
         return [kw.keyword for kw in keywords]
     
+    @staticmethod
+    def get_keyword_entries(db: Session, chat_id: int) -> list:
+        """الحصول على الكلمات المفتاحية مع نوعها (keyword, is_custom)"""
+        keywords = db.query(Keyword.keyword, Keyword.is_custom).filter(
+            Keyword.chat_id == chat_id
+        ).all()
+        return [(keyword, bool(is_custom)) for keyword, is_custom in keywords]
+    
     # ===== سجل النشاطات =====
     
     @staticmethod
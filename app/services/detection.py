@@ -5,11 +5,47 @@ Optimized and Unified Detection Engine
 
 import re
 import logging
-from typing import Tuple, List
+from typing import Any, Dict, FrozenSet, Hashable, Optional, Sequence, Tuple, List, Union
 from difflib import SequenceMatcher
 
+import numpy as np
+
+from app.config import CACHE_CONFIG, DETECTION_CONFIG, FEATURES
+from app.services.chat_detector_registry import ChatDetector, chat_detector_registry
+from app.services.fuzzy_index import FuzzyKeywordIndex, FuzzyMatchMemo
+from app.services.keyword_automaton import KeywordAutomaton
+from app.services.near_duplicate_index import near_duplicate_index
+from app.services.obfuscation_detector import ObfuscationDetector
+from app.services.text_normalizer import TextNormalizer
+from app.services.verdict_cache import VerdictCache
+
 logger = logging.getLogger(__name__)
 
+# مدخل في درجة الرسالة: (الكلمة المكتشفة أو None، مفتاح العمود، الوزن، المعامل)
+ScoreEntry = Tuple[Optional[str], Hashable, float, float]
+
+# نتائج المطابقة الضبابية لكلمة: (الكلمات العامة، كلمات القروب) مع نسبة التشابه
+FuzzyMatches = Tuple[Tuple[Tuple[str, float], ...], Tuple[Tuple[str, float], ...]]
+
+# أعمدة الدرجات غير المرتبطة بكلمة مفتاحية
+OBFUSCATION_COLUMN = '#obfuscation'
+PHONE_NUMBERS_COLUMN = '#phone_numbers'
+
+
+# قيمة chat_detector الافتراضية: تحميل كاشف القروب من السجل بشكل متزامن، وهذا
+# مناسب خارج حلقة الأحداث فقط. معالجات البوت تمرر الكاشف من chat_detector_registry.load
+LOAD_CHAT_DETECTOR = object()
+
+
+class _PendingDetection:
+    """رسالة مطبّعة لم تحسمها المراحل الأولى، مع نتائج مرحلة الكلمات الدقيقة"""
+    
+    __slots__ = (
+        'text', 'chat_id', 'normalized_text', 'obfuscation_signals', 'threshold', 'chat_keywords',
+        'template', 'use_verdict_cache', 'verdict_key', 'obfuscation_types',
+        'phone_numbers', 'has_phone_numbers', 'words', 'exact_hits', 'chat_exact_hits', 'entries',
+    )
+
 
 class OptimizedDetectionEngine:
     """محرك كشف محسّن مع أداء عالي"""
@@ -42,37 +78,99 @@ class OptimizedDetectionEngine:
     }
     
     # الأحرف البديلة والمشابهة
-    CHAR_REPLACEMENTS = {
-        'ا': ['ا', 'آ', 'أ', 'ى'],
-        'ه': ['ه', 'ة', 'ۀ'],
-        'ي': ['ي', 'ى', 'ئ'],
-        'س': ['س', 'ص', 'ث', 'ڰ'],
-        'ع': ['ع', 'غ'],
-        'ح': ['ح', 'خ'],
-        'ط': ['ط', 'ض'],
-        'ق': ['ق', 'غ'],
-        'ن': ['ن', 'م'],
-        'ل': ['ل', 'ا'],
-        'r': ['r', 'ر'],
-        'o': ['o', 'ه', 'ۆ'],
+    CHAR_REPLACEMENTS = TextNormalizer.CHAR_REPLACEMENTS
+    
+    # أصغر وزن بين الكلمات المزعجة الأساسية
+    MIN_KEYWORD_WEIGHT = min(SPAM_KEYWORDS.values())
+    
+    # الكلمات العامة بلا مسافات، فالمطابقة الدقيقة لها تساوي البحث عن كل كلمة
+    SINGLE_WORD_KEYWORDS = all(' ' not in keyword for keyword in SPAM_KEYWORDS)
+    
+    # وزن درجة التمويه ووزن كل رقم هاتف في مجموع الدرجات
+    OBFUSCATION_WEIGHT = 0.5
+    PHONE_NUMBER_WEIGHT = 0.3
+    
+    # أعمدة مصفوفة الدرجات في الكشف المجمّع وأوزانها: الكلمات الأساسية ثم
+    # التمويه وأرقام الهاتف، وتُضاف أعمدة كلمات القروبات بعدها لكل دفعة
+    SCORE_COLUMNS = {
+        column: index
+        for index, column in enumerate([*SPAM_KEYWORDS, OBFUSCATION_COLUMN, PHONE_NUMBERS_COLUMN])
     }
+    SCORE_WEIGHTS = [*SPAM_KEYWORDS.values(), OBFUSCATION_WEIGHT, PHONE_NUMBER_WEIGHT]
+    
+    # نمط الكلمات التي تحتوي على أحرف
+    WORD_PATTERN = re.compile(r'[\u0600-\u06FFa-z]')
+    
+    # أي حرف أو رقم في أي لغة
+    CONTENT_PATTERN = re.compile(r'[^\W_]')
+    
+    # مراحل الكشف بترتيب تكلفتها، وعدد المرات التي حسمت فيها كل مرحلة الحكم
+    DETECTION_STAGES = (
+        'empty', 'verdict_cache', 'near_duplicate', 'trusted', 'exact', 'fuzzy', 'error'
+    )
+    _stage_decisions: Dict[str, int] = {stage: 0 for stage in DETECTION_STAGES}
+    
+    # أتمتة الكلمات المفتاحية (تُبنى مرة واحدة عند أول استخدام)
+    _keyword_automaton = None
+    
+    @classmethod
+    def get_keyword_automaton(cls) -> KeywordAutomaton:
+        """الحصول على أتمتة الكلمات المفتاحية المترجمة"""
+        if cls._keyword_automaton is None:
+            cls._keyword_automaton = KeywordAutomaton(cls.SPAM_KEYWORDS)
+        return cls._keyword_automaton
+    
+    # فهرس المطابقة الضبابية (يُبنى مرة واحدة عند أول استخدام)
+    _fuzzy_index = None
+    
+    @classmethod
+    def get_fuzzy_index(cls) -> FuzzyKeywordIndex:
+        """الحصول على فهرس المطابقة الضبابية"""
+        if cls._fuzzy_index is None:
+            cls._fuzzy_index = FuzzyKeywordIndex(
+                cls.SPAM_KEYWORDS, DETECTION_CONFIG['fuzzy_match_threshold']
+            )
+        return cls._fuzzy_index
+    
+    # ذاكرة نتائج المطابقة الضبابية لكل كلمة (مشتركة بين كل القروبات)
+    _fuzzy_memo = None
+    
+    @classmethod
+    def get_fuzzy_memo(cls) -> FuzzyMatchMemo:
+        """الحصول على ذاكرة المطابقة الضبابية"""
+        if cls._fuzzy_memo is None:
+            cls._fuzzy_memo = FuzzyMatchMemo(
+                cls.get_fuzzy_index(), DETECTION_CONFIG['fuzzy_memo_size']
+            )
+        return cls._fuzzy_memo
+    
+    # ذاكرة الأحكام حسب بصمة قالب الرسالة
+    _verdict_cache = None
+    
+    @classmethod
+    def get_verdict_cache(cls) -> VerdictCache:
+        """الحصول على ذاكرة أحكام الكشف"""
+        if cls._verdict_cache is None:
+            cls._verdict_cache = VerdictCache(
+                CACHE_CONFIG['verdict_max_size'], CACHE_CONFIG['verdict_ttl']
+            )
+        return cls._verdict_cache
+    
+    @classmethod
+    def build_tables(cls) -> None:
+        """
+        بناء الجداول المترجمة الثابتة (الأتمتة وفهرس المطابقة الضبابية) الآن
+        
+        تُستدعى قبل إنشاء العمليات العاملة فتشترك فيها كلها بدلاً من بنائها في
+        كل عملية. الذاكرات المتغيرة تبقى لكل عملية وتُبنى عند أول استخدام.
+        """
+        cls.get_keyword_automaton()
+        cls.get_fuzzy_index()
     
     @staticmethod
     def normalize_text(text: str) -> str:
         """تطبيع النص - مع الحفاظ على المسافات"""
-        # إزالة الحركات العربية
-        text = re.sub(r'[\u064B-\u065F]', '', text)
-        
-        # إزالة النقاط والشرطات بين الأحرف
-        text = re.sub(r'([ا-ي])[\.-_]+([ا-ي])', r'\1\2', text)
-        
-        # تحويل إلى أحرف صغيرة
-        text = text.lower()
-        
-        # تطبيع المسافات المتعددة
-        text = re.sub(r'\s+', ' ', text)
-        
-        return text.strip()
+        return TextNormalizer.normalize(text)[0]
     
     @staticmethod
     def extract_keywords(text: str) -> List[str]:
@@ -80,9 +178,19 @@ class OptimizedDetectionEngine:
         # تقسيم النص إلى كلمات بناءً على المسافات
         words = text.split()
         # تصفية الكلمات الفارغة والأرقام فقط
-        words = [w for w in words if w and re.search(r'[\u0600-\u06FFa-z]', w)]
+        words = [w for w in words if w and OptimizedDetectionEngine.WORD_PATTERN.search(w)]
         return words
     
+    @staticmethod
+    def iter_words(normalized_text: str):
+        """استخراج الكلمات مع موضع بدايتها في النص المطبّع"""
+        offset = 0
+        for word in normalized_text.split(' '):
+            start = offset
+            offset += len(word) + 1
+            if word and OptimizedDetectionEngine.WORD_PATTERN.search(word):
+                yield start, word
+    
     @staticmethod
     def fuzzy_match(word: str, keyword: str, threshold: float = 0.8) -> bool:
         """مطابقة ضبابية للكلمات"""
@@ -92,37 +200,7 @@ class OptimizedDetectionEngine:
     @staticmethod
     def detect_obfuscation(text: str) -> Tuple[float, List[str]]:
         """كشف التمويه في النص"""
-        obfuscation_score = 0.0
-        obfuscation_types = []
-        
-        # كشف النقاط بين الأحرف
-        if re.search(r'[ا-ي]\.[ا-ي]', text):
-            obfuscation_score += 0.2
-            obfuscation_types.append('dots')
-        
-        # كشف المسافات بين الأحرف
-        if re.search(r'[ا-ي]\s{2,}[ا-ي]', text):
-            obfuscation_score += 0.2
-            obfuscation_types.append('spaces')
-        
-        # كشف الشرطات بين الأحرف
-        if re.search(r'[ا-ي]-[ا-ي]', text):
-            obfuscation_score += 0.15
-            obfuscation_types.append('dashes')
-        
-        # كشف الأحرف الخاصة
-        if re.search(r'[ا-ي][_\-\.][ا-ي]', text):
-            obfuscation_score += 0.15
-            obfuscation_types.append('special_chars')
-        
-        # كشف الخليط من اللغات
-        has_arabic = bool(re.search(r'[\u0600-\u06FF]', text))
-        has_latin = bool(re.search(r'[a-z]', text))
-        if has_arabic and has_latin:
-            obfuscation_score += 0.1
-            obfuscation_types.append('mixed_languages')
-        
-        return min(obfuscation_score, 1.0), obfuscation_types
+        return ObfuscationDetector.detect_obfuscation(text)
     
     @staticmethod
     def detect_phone_numbers(text: str) -> List[str]:
@@ -137,79 +215,684 @@ class OptimizedDetectionEngine:
         
         return list(set(saudi_numbers + general_numbers))
     
+    @staticmethod
+    def _decide(
+        stage: str,
+        is_spam: bool,
+        confidence: float,
+        detected_keywords: List[str]
+    ) -> Tuple[bool, float, List[str]]:
+        """تسجيل المرحلة التي حسمت الحكم"""
+        OptimizedDetectionEngine._stage_decisions[stage] += 1
+        return is_spam, confidence, detected_keywords
+    
+    @staticmethod
+    def get_stage_stats() -> Dict[str, Any]:
+        """إحصائيات المراحل التي حسمت الأحكام"""
+        decisions = dict(OptimizedDetectionEngine._stage_decisions)
+        total = sum(decisions.values())
+        return {
+            'total': total,
+            'decisions': decisions,
+            'rates': {
+                stage: f"{(count / total * 100) if total else 0:.2f}%"
+                for stage, count in decisions.items()
+            },
+        }
+    
+    @staticmethod
+    def _confidence(total_score: float, keyword_count: int, has_phone_numbers: bool) -> float:
+        """حساب درجة الثقة من مجموع الدرجات"""
+        if keyword_count or has_phone_numbers:
+            return min(total_score / max(keyword_count, 1), 1.0)
+        return 0.0
+    
+    @staticmethod
+    def _is_empty(text: str) -> bool:
+        """المرحلة 1: رسالة بلا أحرف أو أرقام (فارغة أو رموز تعبيرية فقط)"""
+        return (
+            FEATURES['enable_empty_message_stage']
+            and not OptimizedDetectionEngine.CONTENT_PATTERN.search(text)
+        )
+    
+    @staticmethod
+    def _chat_detector(chat_id: int, chat_detector: Any) -> Optional[ChatDetector]:
+        if chat_detector is LOAD_CHAT_DETECTOR:
+            return chat_detector_registry.get(chat_id)
+        return chat_detector
+    
+    @staticmethod
+    def _prepare(
+        text: str,
+        chat_id: int,
+        normalized_text: str,
+        obfuscation_signals: FrozenSet[str],
+        sensitivity: float,
+        chat_detector: Optional[ChatDetector]
+    ) -> '_PendingDetection':
+        """تجهيز رسالة مطبّعة لبقية المراحل (chat_detector: None إذا تعذر تحميله)"""
+        detection = _PendingDetection()
+        detection.text = text
+        detection.chat_id = chat_id
+        detection.normalized_text = normalized_text
+        detection.obfuscation_signals = obfuscation_signals
+        detection.threshold = 1.0 - sensitivity
+        
+        detection.chat_keywords = chat_detector if chat_detector else None
+        
+        detection.template = VerdictCache.mask(normalized_text)
+        detection.phone_numbers = OptimizedDetectionEngine.detect_phone_numbers(text)
+        detection.use_verdict_cache = FEATURES['enable_verdict_cache'] and chat_detector is not None
+        # القالب يكرر <phone> لكل ظهور، والدرجة تحسب الأرقام المختلفة فقط
+        detection.verdict_key = (
+            VerdictCache.hash_template(detection.template),
+            len(detection.phone_numbers),
+            obfuscation_signals,
+            sensitivity,
+            OptimizedDetectionEngine.get_fuzzy_index().version,
+            detection.chat_keywords.cache_key if detection.chat_keywords else None,
+        )
+        return detection
+    
+    @staticmethod
+    def _early_verdict(detection: '_PendingDetection') -> Optional[Tuple[bool, float, List[str]]]:
+        """المرحلتان 2 و3: حكم محفوظ للقالب أو نسخة من إعلان محذوف"""
+        # المرحلة 2: النسخ المكررة من نفس الإعلان تأخذ الحكم المحفوظ
+        if detection.use_verdict_cache:
+            cached_verdict = OptimizedDetectionEngine.get_verdict_cache().get(detection.verdict_key)
+            if cached_verdict is not None:
+                is_spam, confidence, detected_keywords = cached_verdict
+                return OptimizedDetectionEngine._decide(
+                    'verdict_cache', is_spam, confidence, list(detected_keywords)
+                )
+        
+        # المرحلة 3: نسخة معدلة قليلاً من إعلان محذوف مؤخراً في نفس القروب
+        if FEATURES['enable_near_duplicate_detection']:
+            near_duplicate = near_duplicate_index.query(detection.template, detection.chat_id)
+            # الرسالة الأصلية تأخذ حكمها الأصلي، والثقة الأقل من العتبة الحالية
+            # للقروب لا تكفي للحكم، فتُكمل بقية المراحل
+            if near_duplicate is not None and near_duplicate[2] >= detection.threshold:
+                similarity, matched_keywords, confidence = near_duplicate
+                logger.debug(
+                    f"Near-duplicate of deleted spam: text='{detection.text[:50]}...', "
+                    f"similarity={similarity:.2f}, confidence={confidence:.2f}"
+                )
+                # لا يُحفظ في ذاكرة الأحكام لأن مفتاحها مشترك بين القروبات
+                return OptimizedDetectionEngine._decide(
+                    'near_duplicate', True, confidence, list(matched_keywords)
+                )
+        
+        return None
+    
+    @staticmethod
+    def _finish(
+        detection: '_PendingDetection',
+        stage: str,
+        is_spam: bool,
+        confidence: float,
+        detected_keywords: List[str]
+    ) -> Tuple[bool, float, List[str]]:
+        """حفظ الحكم في ذاكرة الأحكام وتسجيل المرحلة"""
+        if detection.use_verdict_cache:
+            OptimizedDetectionEngine.get_verdict_cache().set(
+                detection.verdict_key, (is_spam, confidence, tuple(detected_keywords))
+            )
+        return OptimizedDetectionEngine._decide(stage, is_spam, confidence, detected_keywords)
+    
+    @staticmethod
+    def _exact_entries(
+        detection: '_PendingDetection',
+        word_flags: Optional[Dict[str, bool]] = None
+    ) -> List[ScoreEntry]:
+        """
+        المرحلة 4: الكلمات الدقيقة والتمويه وأرقام الهاتف
+        
+        في الكشف المجمّع يُمرر word_flags (كلمة -> هل تحتوي أحرفاً) مشتركاً بين
+        رسائل الدفعة، وتُطابق الكلمات العامة بالبحث عن كل كلمة في القاموس بدلاً
+        من الأتمتة، وهذا يعطي نفس النتيجة لأن الكلمات العامة كلها مفردة.
+        
+        العودة:
+            مدخلات الدرجات (الكلمة أو None، العمود، الوزن، المعامل) بترتيب جمعها
+        """
+        chat_keywords = detection.chat_keywords
+        normalized_text = detection.normalized_text
+        spam_keywords = OptimizedDetectionEngine.SPAM_KEYWORDS
+        
+        if FEATURES['enable_obfuscation_detection']:
+            obfuscation_score, detection.obfuscation_types = ObfuscationDetector.score(
+                detection.obfuscation_signals
+            )
+        else:
+            obfuscation_score, detection.obfuscation_types = 0.0, []
+        
+        phone_numbers = detection.phone_numbers
+        detection.has_phone_numbers = bool(phone_numbers)
+        
+        if word_flags is None:
+            words = list(OptimizedDetectionEngine.iter_words(normalized_text))
+        else:
+            words = OptimizedDetectionEngine._split_words(normalized_text, word_flags)
+        detection.words = words
+        
+        if word_flags is not None and OptimizedDetectionEngine.SINGLE_WORD_KEYWORDS:
+            exact_hits = detection.exact_hits = {
+                start: (word,) for start, word in words if word in spam_keywords
+            }
+        else:
+            exact_hits = detection.exact_hits = (
+                OptimizedDetectionEngine.get_keyword_automaton().find_words(normalized_text)
+            )
+        chat_exact_hits = detection.chat_exact_hits = (
+            chat_keywords.automaton.find_words(normalized_text) if chat_keywords else {}
+        )
+        
+        entries = []
+        for start, _ in words:
+            for keyword in exact_hits.get(start, ()):
+                # وزن القروب للكلمة يحل محل وزنها العام
+                if chat_keywords and keyword in chat_keywords:
+                    continue
+                entries.append((keyword, keyword, spam_keywords[keyword], 1.0))
+            # كلمات القروب: المطابقة الدقيقة تشمل العبارات المكونة من أكثر من كلمة
+            for keyword in chat_exact_hits.get(start, ()):
+                entries.append((
+                    keyword, (chat_keywords.chat_id, keyword), chat_keywords.weights[keyword], 1.0
+                ))
+        
+        # إضافة درجة التمويه
+        if obfuscation_score > 0:
+            entries.append((
+                None, OBFUSCATION_COLUMN, OptimizedDetectionEngine.OBFUSCATION_WEIGHT, obfuscation_score
+            ))
+        
+        # إضافة درجة أرقام الهاتف
+        if phone_numbers:
+            entries.append((
+                None, PHONE_NUMBERS_COLUMN, OptimizedDetectionEngine.PHONE_NUMBER_WEIGHT, len(phone_numbers)
+            ))
+        
+        return entries
+    
+    @staticmethod
+    def _split_words(normalized_text: str, word_flags: Dict[str, bool]) -> List[Tuple[int, str]]:
+        """نفس نتيجة iter_words مع حفظ فحص كل كلمة لبقية الدفعة"""
+        words = []
+        offset = 0
+        for word in normalized_text.split(' '):
+            start = offset
+            offset += len(word) + 1
+            has_letters = word_flags.get(word)
+            if has_letters is None:
+                has_letters = word_flags[word] = bool(
+                    word and OptimizedDetectionEngine.WORD_PATTERN.search(word)
+                )
+            if has_letters:
+                words.append((start, word))
+        return words
+    
+    @staticmethod
+    def _min_fuzzy_weight(chat_keywords: Optional[Any]) -> float:
+        """أصغر درجة يمكن أن تضيفها كلمة ضبابية"""
+        min_fuzzy_weight = OptimizedDetectionEngine.MIN_KEYWORD_WEIGHT * 0.9
+        if chat_keywords:
+            min_fuzzy_weight = min(min_fuzzy_weight, min(chat_keywords.weights.values()) * 0.9)
+        return min_fuzzy_weight
+    
+    @staticmethod
+    def _fuzzy_entries(
+        detection: '_PendingDetection',
+        fuzzy_matches: Optional[Dict[str, FuzzyMatches]] = None
+    ) -> List[ScoreEntry]:
+        """
+        المرحلة 5: المطابقة الضبابية للكلمات التي لم تطابق كلمة دقيقة
+        
+        fuzzy_matches: نتائج البحث لكل كلمة محسوبة مسبقاً (في عملية أخرى)،
+        وبدونها يُبحث في ذاكرة المطابقة الضبابية
+        """
+        chat_keywords = detection.chat_keywords
+        spam_keywords = OptimizedDetectionEngine.SPAM_KEYWORDS
+        fuzzy_memo = OptimizedDetectionEngine.get_fuzzy_memo()
+        entries = []
+        
+        for start, word in detection.words:
+            if fuzzy_matches is not None:
+                global_matches, chat_matches = fuzzy_matches[word]
+            else:
+                global_matches = fuzzy_memo.search(word)
+                chat_matches = None
+            exact_keywords = detection.exact_hits.get(start, ())
+            for keyword, ratio in global_matches:
+                if keyword in exact_keywords or (chat_keywords and keyword in chat_keywords):
+                    continue
+                entries.append((f"{keyword}*", keyword, spam_keywords[keyword], 0.9))
+            
+            if not chat_keywords:
+                continue
+            
+            if chat_matches is None:
+                chat_matches = chat_keywords.fuzzy_memo.search(word)
+            chat_exact_keywords = detection.chat_exact_hits.get(start, ())
+            for keyword, ratio in chat_matches:
+                if keyword not in chat_exact_keywords:
+                    entries.append((
+                        f"{keyword}*", (chat_keywords.chat_id, keyword),
+                        chat_keywords.weights[keyword], 0.9
+                    ))
+        
+        return entries
+    
+    @staticmethod
+    def _accumulate(
+        entries: List[ScoreEntry],
+        total_score: float,
+        detected_keywords: List[str]
+    ) -> float:
+        """جمع الدرجات بالترتيب وإضافة الكلمات المكتشفة"""
+        for keyword, _, weight, factor in entries:
+            if keyword is not None:
+                detected_keywords.append(keyword)
+            total_score += weight * factor
+        return total_score
+    
     @staticmethod
     def detect_spam(
         text: str,
         user_id: int,
         chat_id: int,
-        sensitivity: float = 0.7
+        sensitivity: float = 0.7,
+        chat_detector: Any = LOAD_CHAT_DETECTOR
     ) -> Tuple[bool, float, List[str]]:
         """
         كشف الرسائل المزعجة
         
+        المراحل مرتبة من الأرخص إلى الأغلى، وكل مرحلة يمكنها حسم الحكم:
+        رسالة بلا محتوى، بصمة معروفة، نسخة من إعلان محذوف، الكلمات الدقيقة،
+        ثم المطابقة الضبابية.
+        
         العودة:
             (is_spam, confidence_score, detected_keywords)
         """
         try:
-            # تطبيع النص
-            normalized_text = OptimizedDetectionEngine.normalize_text(text)
+            # المرحلة 1: رسالة بلا أحرف أو أرقام (فارغة أو رموز تعبيرية فقط)
+            if OptimizedDetectionEngine._is_empty(text):
+                return OptimizedDetectionEngine._decide('empty', False, 0.0, [])
             
-            # استخراج الكلمات
-            words = OptimizedDetectionEngine.extract_keywords(normalized_text)
-            
-            # كشف التمويه
-            obfuscation_score, obfuscation_types = OptimizedDetectionEngine.detect_obfuscation(text)
-            
-            # كشف أرقام الهاتف
-            phone_numbers = OptimizedDetectionEngine.detect_phone_numbers(text)
-            
-            # البحث عن الكلمات المزعجة
-            detected_keywords = []
-            total_score = 0.0
-            
-            for word in words:
-                for keyword, keyword_score in OptimizedDetectionEngine.SPAM_KEYWORDS.items():
-                    # مطابقة دقيقة
-                    if word == keyword:
-                        detected_keywords.append(keyword)
-                        total_score += keyword_score
-                    # مطابقة ضبابية
-                    elif OptimizedDetectionEngine.fuzzy_match(word, keyword, 0.75):
-                        detected_keywords.append(f"{keyword}*")
-                        total_score += keyword_score * 0.9
+            # تطبيع النص وجمع إشارات التمويه في نفس المرور
+            normalized_text, obfuscation_signals = TextNormalizer.normalize(text)
+            detection = OptimizedDetectionEngine._prepare(
+                text, chat_id, normalized_text, obfuscation_signals, sensitivity,
+                OptimizedDetectionEngine._chat_detector(chat_id, chat_detector)
+            )
             
-            # إضافة درجة التمويه
-            if obfuscation_score > 0:
-                total_score += obfuscation_score * 0.5
+            # المرحلتان 2 و3: ذاكرة الأحكام والإعلانات المحذوفة
+            verdict = OptimizedDetectionEngine._early_verdict(detection)
+            if verdict is not None:
+                return verdict
             
-            # إضافة درجة أرقام الهاتف
-            if phone_numbers:
-                total_score += len(phone_numbers) * 0.3
+            return OptimizedDetectionEngine._score_pending(detection)
+        
+        except Exception as e:
+            logger.error(f"خطأ في الكشف: {e}")
+            return OptimizedDetectionEngine._decide('error', False, 0.0, [])
+    
+    @staticmethod
+    def trusted_verdict(
+        text: str,
+        chat_id: int,
+        sensitivity: float = 0.7,
+        chat_detector: Any = LOAD_CHAT_DETECTOR
+    ) -> Optional[Tuple[bool, float, List[str]]]:
+        """
+        المراحل الرخيصة فقط لرسالة من عضو موثوق
+        
+        رسالة فيها رابط أو رقم هاتف أو تمويه تحتاج الكشف الكامل (None). غيرها
+        يأخذ حكم ذاكرة الأحكام أو الإعلانات المحذوفة إن وُجد، وإلا تُعتبر سليمة
+        دون مرحلتي الكلمات الدقيقة والمطابقة الضبابية.
+        """
+        try:
+            if OptimizedDetectionEngine._is_empty(text):
+                return OptimizedDetectionEngine._decide('empty', False, 0.0, [])
             
-            # حساب درجة الثقة النهائية
-            if detected_keywords or phone_numbers:
-                confidence = min(total_score / max(len(detected_keywords), 1), 1.0)
-            else:
-                confidence = 0.0
+            normalized_text, obfuscation_signals = TextNormalizer.normalize(text)
+            if obfuscation_signals:
+                return None
+            detection = OptimizedDetectionEngine._prepare(
+                text, chat_id, normalized_text, obfuscation_signals, sensitivity,
+                OptimizedDetectionEngine._chat_detector(chat_id, chat_detector)
+            )
+            # القالب يستبدل الروابط وأرقام الهاتف بعلامات ثابتة
+            placeholders = VerdictCache.PLACEHOLDERS
+            template = detection.template
+            if placeholders['url'] in template or placeholders['phone'] in template:
+                return None
             
-            # تطبيق حساسية الكشف
-            threshold = 1.0 - sensitivity
-            is_spam = confidence >= threshold
+            verdict = OptimizedDetectionEngine._early_verdict(detection)
+            if verdict is not None:
+                return verdict
+            return OptimizedDetectionEngine._decide('trusted', False, 0.0, [])
+        
+        except Exception as e:
+            logger.error(f"خطأ في الكشف: {e}")
+            return None
+    
+    @staticmethod
+    def begin_detection(
+        text: str,
+        chat_id: int,
+        sensitivity: float = 0.7,
+        chat_detector: Any = LOAD_CHAT_DETECTOR
+    ) -> Tuple[Optional[Tuple[bool, float, List[str]]], Optional['_PendingDetection']]:
+        """
+        المراحل 1 إلى 4 من detect_spam، وإيقاف الكشف قبل المطابقة الضبابية
+        
+        العودة:
+            (الحكم، None) إذا حُسم، أو (None، الرسالة) إذا احتاجت المطابقة
+            الضبابية، وتُكمل بـ finish_detection
+        """
+        try:
+            if OptimizedDetectionEngine._is_empty(text):
+                return OptimizedDetectionEngine._decide('empty', False, 0.0, []), None
             
-            logger.debug(
-                f"Detection: text='{text[:50]}...', "
-                f"confidence={confidence:.2f}, "
-                f"threshold={threshold:.2f}, "
-                f"is_spam={is_spam}, "
-                f"keywords={detected_keywords}, "
-                f"obfuscation={obfuscation_types}"
+            normalized_text, obfuscation_signals = TextNormalizer.normalize(text)
+            detection = OptimizedDetectionEngine._prepare(
+                text, chat_id, normalized_text, obfuscation_signals, sensitivity,
+                OptimizedDetectionEngine._chat_detector(chat_id, chat_detector)
             )
+            verdict = OptimizedDetectionEngine._early_verdict(detection)
+            if verdict is not None:
+                return verdict, None
             
-            return is_spam, confidence, detected_keywords
+            detection.entries = OptimizedDetectionEngine._exact_entries(detection)
+            detected_keywords = []
+            total_score = OptimizedDetectionEngine._accumulate(
+                detection.entries, 0.0, detected_keywords
+            )
+            confidence = OptimizedDetectionEngine._confidence(
+                total_score, len(detected_keywords), detection.has_phone_numbers
+            )
+            if OptimizedDetectionEngine._settled(detection, confidence):
+                return OptimizedDetectionEngine._score_pending(detection, detection.entries), None
+            return None, detection
         
         except Exception as e:
             logger.error(f"خطأ في الكشف: {e}")
-            return False, 0.0, []
+            return OptimizedDetectionEngine._decide('error', False, 0.0, []), None
+    
+    @staticmethod
+    def finish_detection(
+        detection: '_PendingDetection',
+        fuzzy_matches: Optional[Dict[str, FuzzyMatches]] = None
+    ) -> Tuple[bool, float, List[str]]:
+        """
+        إكمال رسالة من begin_detection بنتائج المطابقة الضبابية لكل كلمة
+        
+        بدون fuzzy_matches يُعاد حكم الكلمات الدقيقة وحدها، ولا يُحفظ في ذاكرة
+        الأحكام لأنه أضعف من الحكم الكامل.
+        """
+        try:
+            if fuzzy_matches is None:
+                detection.use_verdict_cache = False
+                return OptimizedDetectionEngine._score_pending(
+                    detection, detection.entries, skip_fuzzy=True
+                )
+            return OptimizedDetectionEngine._score_pending(
+                detection, detection.entries, fuzzy_matches
+            )
+        except Exception as e:
+            logger.error(f"خطأ في الكشف: {e}")
+            return OptimizedDetectionEngine._decide('error', False, 0.0, [])
+    
+    @staticmethod
+    def _settled(detection: '_PendingDetection', confidence: float) -> bool:
+        """الحكم لا يتغير بالمطابقة الضبابية"""
+        # الثقة بعد المطابقة الضبابية متوسط بين الثقة الحالية وأوزان الكلمات
+        # الضبابية، فلا تنزل عن أصغرهما، ولا تتغير إن لم توجد كلمات
+        min_fuzzy_weight = OptimizedDetectionEngine._min_fuzzy_weight(detection.chat_keywords)
+        return (
+            not detection.words
+            or not FEATURES['enable_fuzzy_matching']
+            or (
+                FEATURES['enable_early_exit']
+                and min(confidence, min_fuzzy_weight) >= detection.threshold
+            )
+        )
+    
+    @staticmethod
+    def _score_pending(
+        detection: '_PendingDetection',
+        exact_entries: Optional[List[ScoreEntry]] = None,
+        fuzzy_matches: Optional[Dict[str, FuzzyMatches]] = None,
+        skip_fuzzy: bool = False
+    ) -> Tuple[bool, float, List[str]]:
+        """المرحلتان 4 و5 لرسالة واحدة"""
+        threshold = detection.threshold
+        
+        # المرحلة 4: الكلمات الدقيقة والتمويه وأرقام الهاتف
+        if exact_entries is None:
+            exact_entries = OptimizedDetectionEngine._exact_entries(detection)
+        detected_keywords = []
+        total_score = OptimizedDetectionEngine._accumulate(exact_entries, 0.0, detected_keywords)
+        confidence = OptimizedDetectionEngine._confidence(
+            total_score, len(detected_keywords), detection.has_phone_numbers
+        )
+        
+        stage = 'exact'
+        settled = skip_fuzzy or OptimizedDetectionEngine._settled(detection, confidence)
+        
+        # المرحلة 5: المطابقة الضبابية
+        if not settled:
+            stage = 'fuzzy'
+            total_score = OptimizedDetectionEngine._accumulate(
+                OptimizedDetectionEngine._fuzzy_entries(detection, fuzzy_matches),
+                total_score, detected_keywords
+            )
+            confidence = OptimizedDetectionEngine._confidence(
+                total_score, len(detected_keywords), detection.has_phone_numbers
+            )
+        
+        # تطبيق حساسية الكشف
+        is_spam = confidence >= threshold
+        
+        logger.debug(
+            f"Detection: text='{detection.text[:50]}...', "
+            f"stage={stage}, "
+            f"confidence={confidence:.2f}, "
+            f"threshold={threshold:.2f}, "
+            f"is_spam={is_spam}, "
+            f"keywords={detected_keywords}, "
+            f"obfuscation={detection.obfuscation_types}"
+        )
+        
+        return OptimizedDetectionEngine._finish(detection, stage, is_spam, confidence, detected_keywords)
+    
+    @staticmethod
+    def detect_many(
+        texts: Sequence[str],
+        sensitivities: Union[float, Sequence[float]] = 0.7,
+        chat_ids: Union[int, Sequence[int]] = 0
+    ) -> List[Tuple[bool, float, List[str]]]:
+        """
+        كشف عدة رسائل دفعة واحدة بنفس نتيجة detect_spam لكل رسالة
+        
+        التطبيع يعمل على الدفعة كاملة، والكلمات المكتشفة تُجمع في مصفوفة متفرقة
+        (رسالة × عمود) بصيغة COO، ثم تُحسب الثقة لكل الرسائل بعمليات NumPy على
+        متجه الأوزان المأخوذ من SPAM_KEYWORDS. np.bincount يجمع مدخلات كل صف
+        بترتيبها، فتطابق المجاميع الجمع المتتابع في detect_spam تماماً.
+        
+        Args:
+            texts: Message texts
+            sensitivities: One sensitivity for all messages or one per message
+            chat_ids: One chat ID for all messages or one per message
+        
+        العودة:
+            قائمة (is_spam, confidence_score, detected_keywords) بترتيب النصوص
+        """
+        count = len(texts)
+        if isinstance(sensitivities, (int, float)):
+            sensitivities = [sensitivities] * count
+        if isinstance(chat_ids, int):
+            chat_ids = [chat_ids] * count
+        
+        engine = OptimizedDetectionEngine
+        results: List[Optional[Tuple[bool, float, List[str]]]] = [None] * count
+        
+        # المرحلة 1 ثم التطبيع المجمّع لبقية الرسائل
+        rows = []
+        for row, text in enumerate(texts):
+            if engine._is_empty(text):
+                results[row] = engine._decide('empty', False, 0.0, [])
+            else:
+                rows.append(row)
+        
+        try:
+            normalized = TextNormalizer.normalize_many([texts[row] for row in rows])
+        except Exception as e:
+            logger.error(f"خطأ في الكشف: {e}")
+            normalized = [None] * len(rows)
+        
+        # المرحلتان 2 و3. النسخة المكررة داخل الدفعة تنتظر حكم أول نسخة كما
+        # كانت ستجده في ذاكرة الأحكام لو فُحصت الرسائل واحدة واحدة
+        pending: List[Tuple[int, _PendingDetection]] = []
+        followers: List[Tuple[int, _PendingDetection]] = []
+        pending_keys = set()
+        word_flags: Dict[str, bool] = {}
+        for row, normalized_row in zip(rows, normalized):
+            try:
+                if normalized_row is None:
+                    raise ValueError("تعذر تطبيع الدفعة")
+                detection = engine._prepare(
+                    texts[row], chat_ids[row], normalized_row[0], normalized_row[1], sensitivities[row],
+                    chat_detector_registry.get(chat_ids[row])
+                )
+                if detection.use_verdict_cache and detection.verdict_key in pending_keys:
+                    followers.append((row, detection))
+                    continue
+                
+                verdict = engine._early_verdict(detection)
+                if verdict is not None:
+                    results[row] = verdict
+                    continue
+                
+                # المرحلة 4 لكل رسالة معلقة
+                detection.entries = engine._exact_entries(detection, word_flags)
+                pending.append((row, detection))
+                if detection.use_verdict_cache:
+                    pending_keys.add(detection.verdict_key)
+            except Exception as e:
+                logger.error(f"خطأ في الكشف: {e}")
+                results[row] = engine._decide('error', False, 0.0, [])
+        
+        # الدفعات الصغيرة لا تستفيد من NumPy بسبب تكلفة بناء المصفوفات
+        if len(pending) >= DETECTION_CONFIG['batch_vectorize_min_size']:
+            engine._score_batch(pending, results)
+        else:
+            for row, detection in pending:
+                try:
+                    results[row] = engine._score_pending(detection, detection.entries)
+                except Exception as e:
+                    logger.error(f"خطأ في الكشف: {e}")
+                    results[row] = engine._decide('error', False, 0.0, [])
+        
+        for row, detection in followers:
+            try:
+                results[row] = (
+                    engine._early_verdict(detection) or engine._score_pending(detection)
+                )
+            except Exception as e:
+                logger.error(f"خطأ في الكشف: {e}")
+                results[row] = engine._decide('error', False, 0.0, [])
+        
+        logger.debug(f"Batch detection: {count} messages, {len(pending)} scored")
+        return results
+    
+    @staticmethod
+    def _score_batch(
+        pending: List[Tuple[int, '_PendingDetection']],
+        results: List[Optional[Tuple[bool, float, List[str]]]]
+    ) -> None:
+        """المرحلتان 4 و5 لكل الرسائل المعلقة بعمليات NumPy"""
+        engine = OptimizedDetectionEngine
+        size = len(pending)
+        
+        has_phone_numbers = np.array([d.has_phone_numbers for _, d in pending], dtype=bool)
+        thresholds = np.array([d.threshold for _, d in pending], dtype=np.float64)
+        has_words = np.array([bool(d.words) for _, d in pending], dtype=bool)
+        min_fuzzy_weights = np.array(
+            [engine._min_fuzzy_weight(d.chat_keywords) for _, d in pending], dtype=np.float64
+        )
+        
+        # أعمدة الكلمات العامة أولاً بترتيب SPAM_KEYWORDS، ثم أعمدة القروبات
+        columns = dict(engine.SCORE_COLUMNS)
+        weights = list(engine.SCORE_WEIGHTS)
+        entry_rows: List[int] = []
+        entry_columns: List[int] = []
+        entry_factors: List[float] = []
+        entry_is_keyword: List[bool] = []
+        
+        def add_entries(index: int, entries: List[ScoreEntry]) -> None:
+            for keyword, column_key, weight, factor in entries:
+                column = columns.get(column_key)
+                if column is None:
+                    column = columns[column_key] = len(weights)
+                    weights.append(weight)
+                entry_rows.append(index)
+                entry_columns.append(column)
+                entry_factors.append(factor)
+                entry_is_keyword.append(keyword is not None)
+        
+        def scores() -> np.ndarray:
+            hit_rows = np.array(entry_rows, dtype=np.intp)
+            values = np.array(weights)[np.array(entry_columns, dtype=np.intp)]
+            values *= np.array(entry_factors, dtype=np.float64)
+            totals = np.bincount(hit_rows, weights=values, minlength=size)
+            keyword_counts = np.bincount(
+                hit_rows[np.array(entry_is_keyword, dtype=bool)], minlength=size
+            )
+            confidence = np.where(
+                (keyword_counts > 0) | has_phone_numbers,
+                np.minimum(totals / np.maximum(keyword_counts, 1), 1.0),
+                0.0,
+            )
+            return confidence
+        
+        for index, (_, detection) in enumerate(pending):
+            add_entries(index, detection.entries)
+        
+        # المرحلة 4: الثقة من الكلمات الدقيقة والتمويه وأرقام الهاتف
+        confidence = scores()
+        if not FEATURES['enable_fuzzy_matching']:
+            settled = np.ones(size, dtype=bool)
+        elif FEATURES['enable_early_exit']:
+            settled = ~has_words | (np.minimum(confidence, min_fuzzy_weights) >= thresholds)
+        else:
+            settled = ~has_words
+        
+        # المرحلة 5: المطابقة الضبابية للرسائل التي لم تُحسم فقط
+        fuzzy_rows = np.flatnonzero(~settled)
+        for index in fuzzy_rows:
+            row, detection = pending[index]
+            try:
+                fuzzy_entries = engine._fuzzy_entries(detection)
+            except Exception as e:
+                logger.error(f"خطأ في الكشف: {e}")
+                results[row] = engine._decide('error', False, 0.0, [])
+                continue
+            add_entries(index, fuzzy_entries)
+            detection.entries = detection.entries + fuzzy_entries
+        if len(fuzzy_rows):
+            confidence = scores()
+        
+        is_spam = confidence >= thresholds
+        for index, (row, detection) in enumerate(pending):
+            if results[row] is not None:
+                continue
+            detected_keywords = [
+                keyword for keyword, _, _, _ in detection.entries if keyword is not None
+            ]
+            stage = 'exact' if settled[index] else 'fuzzy'
+            results[row] = engine._finish(
+                detection, stage, bool(is_spam[index]), float(confidence[index]), detected_keywords
+            )
 
 
 # إنشاء نسخة واحدة من المحرك
@@ -0,0 +1,247 @@
+"""
+تنفيذ المطابقة الضبابية للرسائل الطويلة في عمليات منفصلة
+Process-Pool Offload for CPU-Heavy Detection Stages
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from app.config import DETECTION_CONFIG, FEATURES
+from app.services.cache_service import CacheService
+from app.services.chat_detector_registry import ChatDetector, chat_detector_registry
+from app.services.detection import FuzzyMatches, OptimizedDetectionEngine
+
+logger = logging.getLogger(__name__)
+
+
+class FuzzyTask(NamedTuple):
+    """مدخلات المطابقة الضبابية المرسلة إلى العملية"""
+    words: Tuple[str, ...]  # كلمات الرسالة المطبّعة بلا تكرار
+    chat_key: Optional[Tuple[int, int]]  # (القروب، إصدار كلماته)، أو None بلا كلمات
+    # (الكلمة، الوزن) لكلمات القروب، وتُرسل فقط بعد أن تبلغ العملية أنها لا تملكها
+    chat_keywords: Tuple[Tuple[str, float], ...] = ()
+
+
+# كواشف القروبات داخل العملية العاملة حسب chat_key
+_chat_detectors = CacheService(ttl=None, max_size=DETECTION_CONFIG['chat_detector_cache_size'])
+
+
+def _init_worker() -> None:
+    """تحميل الجداول المترجمة مرة واحدة عند بدء العملية"""
+    # Ctrl+C يوقف العملية الرئيسية فقط، وهي توقف المنفذ
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    OptimizedDetectionEngine.build_tables()
+
+
+def _worker_pid() -> int:
+    return os.getpid()
+
+
+def _chat_detector(task: FuzzyTask) -> Optional[ChatDetector]:
+    detector = _chat_detectors.get(task.chat_key)
+    if detector is None and task.chat_keywords:
+        detector = ChatDetector(task.chat_key[0], task.chat_keywords)
+        _chat_detectors.set(task.chat_key, detector)
+    return detector
+
+
+def fuzzy_search(task: FuzzyTask) -> Optional[Tuple[FuzzyMatches, ...]]:
+    """
+    نتائج المطابقة الضبابية لكل كلمة في task.words بنفس ترتيبها
+    
+    Returns:
+        None if the worker has no detector for task.chat_key and the task
+        carries no keywords, so the caller resends it with chat_keywords
+    """
+    fuzzy_memo = OptimizedDetectionEngine.get_fuzzy_memo()
+    chat_memo = None
+    if task.chat_key is not None:
+        detector = _chat_detector(task)
+        if detector is None:
+            return None
+        chat_memo = detector.fuzzy_memo
+    return tuple(
+        (fuzzy_memo.search(word), chat_memo.search(word) if chat_memo is not None else ())
+        for word in task.words
+    )
+
+
+class DetectionPool:
+    """
+    منفذ عمليات للمطابقة الضبابية في الرسائل الطويلة
+    
+    الرسائل الأقصر من min_length تُكشف في حلقة الأحداث كما هي. الرسالة الطويلة
+    تمر بالمراحل الرخيصة في الحلقة (ذاكرة الأحكام والنسخ المكررة والكلمات
+    الدقيقة)، وإذا احتاجت المطابقة الضبابية تُرسل كلماتها فقط إلى عملية عاملة
+    حُملت فيها الجداول مسبقاً. إذا لم تصل النتيجة خلال timeout يُعتمد حكم
+    الكلمات الدقيقة، فلا تتأخر عمليات الحذف في بقية القروبات.
+    
+    المهمة التي انتهت مهلتها تبقى تعمل في العملية حتى تكتمل، لذلك إذا كانت
+    كل العمليات مشغولة تُحسم الرسالة بالكلمات الدقيقة دون إرسالها، ولا يتراكم
+    طابور تنتهي مهلة كل رسائله.
+    """
+    
+    def __init__(
+        self,
+        workers: int = DETECTION_CONFIG['process_pool_workers'],
+        min_length: int = DETECTION_CONFIG['process_pool_min_length'],
+        timeout: float = DETECTION_CONFIG['process_pool_timeout']
+    ):
+        """
+        Initialize detection pool
+        
+        Args:
+            workers: Worker processes
+            min_length: Shorter messages are detected in the event loop
+            timeout: Seconds to wait for fuzzy matching before the fallback verdict
+        """
+        self.workers = workers
+        self.min_length = min_length
+        self.timeout = timeout
+        self.offloaded = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.skipped = 0
+        self.keyword_resends = 0
+        # المهام المرسلة التي لم تنتهِ في العمليات، ومنها التي انتهت مهلتها
+        self._in_flight: Set[Future] = set()
+        self._executor: Optional[ProcessPoolExecutor] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+    
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+    
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn: عملية جديدة لا ترث خيوط وأقفال العملية الرئيسية
+        return ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+        )
+    
+    async def start(self) -> None:
+        """بدء العمليات وانتظار تحميلها إذا كان التنفيذ في العمليات مفعلاً"""
+        if self._executor is not None or not FEATURES['enable_detection_process_pool']:
+            return
+        if self.workers <= 0:
+            return
+        self._executor = self._create_executor()
+        # العمليات تُنشأ عند الحاجة، فتُشغل الآن حتى لا تنتظرها أول رسالة طويلة
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _worker_pid) for _ in range(self.workers)
+        ))
+        logger.info(f"✅ تم تشغيل {len(set(pids))} عملية للمطابقة الضبابية")
+    
+    def shutdown(self) -> None:
+        """إيقاف العمليات دون انتظار المهام الجارية"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._in_flight.clear()
+    
+    async def detect_spam(
+        self,
+        text: str,
+        user_id: int,
+        chat_id: int,
+        sensitivity: float = 0.7,
+        trusted: bool = False
+    ) -> Tuple[bool, float, List[str]]:
+        """
+        نفس detect_spam مع المطابقة الضبابية للرسائل الطويلة في عملية عاملة
+        
+        رسالة العضو الموثوق (trusted) تمر بالمراحل الرخيصة فقط، إلا إذا
+        احتوت رابطاً أو رقم هاتف أو تمويهاً فتُكشف كاملة.
+        """
+        engine = OptimizedDetectionEngine
+        # كلمات القروب تُقرأ في منفذ قاعدة البيانات، والمراحل المتزامنة تأخذ
+        # الكاشف الناتج ولا تحمّل شيئاً في حلقة الأحداث
+        chat_detector = await chat_detector_registry.load(chat_id)
+        if trusted:
+            verdict = engine.trusted_verdict(text, chat_id, sensitivity, chat_detector)
+            if verdict is not None:
+                return verdict
+        
+        if self._executor is None or len(text) < self.min_length:
+            return engine.detect_spam(text, user_id, chat_id, sensitivity, chat_detector)
+        
+        verdict, detection = engine.begin_detection(text, chat_id, sensitivity, chat_detector)
+        if verdict is not None:
+            return verdict
+        
+        if self.in_flight >= self.workers:
+            self.skipped += 1
+            return engine.finish_detection(detection)
+        
+        chat_keywords = detection.chat_keywords
+        task = FuzzyTask(
+            tuple(dict.fromkeys(word for _, word in detection.words)),
+            chat_keywords.cache_key if chat_keywords else None,
+        )
+        self.offloaded += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        try:
+            matches = await asyncio.wait_for(self._submit(task), self.timeout)
+            if matches is None:
+                # العملية لا تملك كلمات هذا الإصدار من القروب
+                self.keyword_resends += 1
+                task = task._replace(chat_keywords=tuple(chat_keywords.weights.items()))
+                matches = await asyncio.wait_for(
+                    self._submit(task), max(deadline - loop.time(), 0)
+                )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning(
+                f"⚠️ انتهت مهلة المطابقة الضبابية لرسالة من {len(text)} حرف في القروب {chat_id}"
+            )
+            return engine.finish_detection(detection)
+        except BrokenProcessPool as e:
+            # توقفت إحدى العمليات: منفذ جديد للرسائل التالية
+            self.failures += 1
+            logger.error(f"❌ توقف منفذ عمليات الكشف: {e}")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._create_executor()
+            self._in_flight.clear()
+            return engine.finish_detection(detection)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"❌ خطأ في المطابقة الضبابية في العملية العاملة: {e}")
+            return engine.finish_detection(detection)
+        
+        return engine.finish_detection(detection, dict(zip(task.words, matches)))
+    
+    def _submit(self, task: FuzzyTask) -> asyncio.Future:
+        future = self._executor.submit(fuzzy_search, task)
+        self._in_flight.add(future)
+        # يُستدعى عند انتهاء المهمة في العملية فعلاً، لا عند انتهاء مهلتها
+        future.add_done_callback(self._in_flight.discard)
+        return asyncio.wrap_future(future)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get detection pool statistics"""
+        return {
+            'running': self.running,
+            'workers': self.workers,
+            'offloaded': self.offloaded,
+            'in_flight': self.in_flight,
+            'skipped': self.skipped,
+            'keyword_resends': self.keyword_resends,
+            'timeouts': self.timeouts,
+            'failures': self.failures,
+        }
+
+
+# إنشاء نسخة واحدة من المنفذ
+detection_pool = DetectionPool()
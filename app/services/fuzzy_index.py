@@ -0,0 +1,199 @@
+"""
+فهرس المطابقة الضبابية للكلمات المفتاحية
+Fuzzy Keyword Index
+"""
+
+import logging
+import math
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.config import DETECTION_CONFIG
+from app.services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+
+class FuzzyKeywordIndex:
+    """
+    فهرس يجد الكلمات المفتاحية القريبة من كلمة دون مقارنتها بكل الكلمات
+    
+    نسبة SequenceMatcher هي 2*M/(a+b) حيث M لا تتجاوز أقصر الطولين ولا عدد
+    الأحرف المشتركة بين الكلمتين. الفهرس يحفظ لكل (حرف، تكرار، طول) قائمة
+    الكلمات المفتاحية، فيُحسب عدد الأحرف المشتركة مع كل الكلمات دفعة واحدة،
+    ولا تصل إلى SequenceMatcher إلا الكلمات التي يمكن أن تتجاوز الحد.
+    """
+    
+    def __init__(
+        self,
+        keywords: Iterable[str] = (),
+        threshold: float = DETECTION_CONFIG['fuzzy_match_threshold']
+    ):
+        """
+        Initialize fuzzy index
+        
+        Args:
+            keywords: Keywords to index
+            threshold: Minimum SequenceMatcher ratio for a match
+        """
+        self.threshold = threshold
+        self.version = 0
+        self._next_id = 0
+        self._ids: Dict[str, int] = {}
+        self._keywords: Dict[int, str] = {}
+        # (حرف، رقم التكرار) -> طول الكلمة -> معرفات الكلمات
+        self._postings: Dict[Tuple[str, int], Dict[int, Dict[int, None]]] = {}
+        
+        for keyword in keywords:
+            self.add(keyword)
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self._ids
+    
+    def add(self, keyword: str) -> None:
+        """Add keyword to index"""
+        if not keyword or keyword in self._ids:
+            return
+        
+        keyword_id = self._next_id
+        self._next_id += 1
+        self._ids[keyword] = keyword_id
+        self._keywords[keyword_id] = keyword
+        
+        keyword_length = len(keyword)
+        for char, count in Counter(keyword).items():
+            for occurrence in range(1, count + 1):
+                by_length = self._postings.setdefault((char, occurrence), {})
+                by_length.setdefault(keyword_length, {})[keyword_id] = None
+        
+        self.version += 1
+    
+    def remove(self, keyword: str) -> None:
+        """Remove keyword from index"""
+        keyword_id = self._ids.pop(keyword, None)
+        if keyword_id is None:
+            return
+        
+        del self._keywords[keyword_id]
+        keyword_length = len(keyword)
+        for char, count in Counter(keyword).items():
+            for occurrence in range(1, count + 1):
+                by_length = self._postings[(char, occurrence)]
+                del by_length[keyword_length][keyword_id]
+                if not by_length[keyword_length]:
+                    del by_length[keyword_length]
+                if not by_length:
+                    del self._postings[(char, occurrence)]
+        
+        self.version += 1
+    
+    def search(self, word: str) -> List[Tuple[str, float]]:
+        """
+        Find indexed keywords similar to word
+        
+        Returns:
+            List of (keyword, ratio) with ratio >= threshold, in insertion order
+        """
+        threshold = self.threshold
+        word_length = len(word)
+        if not word_length or not self._ids:
+            return []
+        
+        # 2*min(a, b)/(a+b) >= threshold يحدد مدى الأطوال الممكنة
+        min_length = math.ceil(word_length * threshold / (2 - threshold) - 1e-9)
+        max_length = math.floor(word_length * (2 - threshold) / threshold + 1e-9)
+        min_overlap = math.ceil(threshold * (word_length + min_length) / 2 - 1e-9)
+        
+        # عدّ الأحرف المشتركة مع كل كلمة مفتاحية (الحلقة الداخلية في C)
+        overlaps: Counter = Counter()
+        for char, count in Counter(word).items():
+            for occurrence in range(1, count + 1):
+                by_length = self._postings.get((char, occurrence))
+                if not by_length:
+                    break
+                for keyword_length, keyword_ids in by_length.items():
+                    if min_length <= keyword_length <= max_length:
+                        overlaps.update(iter(keyword_ids))
+        
+        candidates = sorted(
+            keyword_id for keyword_id, overlap in overlaps.items()
+            if overlap >= min_overlap
+        )
+        
+        matches = []
+        for keyword_id in candidates:
+            keyword = self._keywords[keyword_id]
+            total_length = word_length + len(keyword)
+            if 2.0 * overlaps[keyword_id] / total_length < threshold - 1e-9:
+                continue
+            
+            ratio = SequenceMatcher(None, word, keyword).ratio()
+            if ratio >= threshold:
+                matches.append((keyword, ratio))
+        
+        return matches
+
+
+class FuzzyMatchMemo:
+    """
+    ذاكرة LRU لنتائج المطابقة الضبابية لكل كلمة
+    
+    مفردات المحادثات تتكرر كثيراً، فتُحفظ نتيجة كل كلمة مطبّعة وتُمسح
+    الذاكرة كلها عند تغيّر إصدار مجموعة الكلمات المفتاحية.
+    """
+    
+    def __init__(
+        self,
+        index: FuzzyKeywordIndex,
+        max_size: int = DETECTION_CONFIG['fuzzy_memo_size']
+    ):
+        """
+        Initialize memo
+        
+        Args:
+            index: Fuzzy index to memoize
+            max_size: Maximum number of words kept
+        """
+        self.index = index
+        self.max_size = max_size
+        self._version = index.version
+        # الكلمة -> نتائجها، بلا عمر لأن تغيّر الإصدار يمسح الذاكرة كلها
+        self._cache = CacheService(ttl=None, max_size=max_size)
+    
+    def __len__(self) -> int:
+        return len(self._cache)
+    
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+    
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+    
+    def search(self, word: str) -> Tuple[Tuple[str, float], ...]:
+        """Get fuzzy matches for word, computing them on a miss"""
+        if self._version != self.index.version:
+            self.clear()
+            self._version = self.index.version
+        
+        matches = self._cache.get(word)
+        if matches is None:
+            matches = tuple(self.index.search(word))
+            self._cache.set(word, matches)
+        return matches
+    
+    def clear(self) -> None:
+        """Clear memoized words"""
+        self._cache.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get memo statistics"""
+        stats = self._cache.get_stats()
+        del stats['ttl'], stats['expirations']
+        stats['version'] = self._version
+        return stats
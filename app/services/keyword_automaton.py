@@ -0,0 +1,138 @@
+"""
+أتمتة مطابقة الكلمات المفتاحية (Aho-Corasick)
+Aho-Corasick Keyword Automaton
+"""
+
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordAutomaton:
+    """أتمتة متعددة الأنماط تجد كل الكلمات المفتاحية في مرور واحد على النص"""
+
+    def __init__(self, keywords: Iterable[str] = ()):
+        """
+        Initialize automaton
+
+        Args:
+            keywords: Keywords (single words or phrases) to match
+        """
+        self._keywords: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._goto: List[Dict[str, int]] = []
+        self._fail: List[int] = []
+        self._output: List[Tuple[int, ...]] = []
+        self._dirty = True
+
+        for keyword in keywords:
+            self.add(keyword)
+        self.build()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self._ids
+
+    def add(self, keyword: str) -> None:
+        """Add keyword (compiled lazily on next search)"""
+        if not keyword or keyword in self._ids:
+            return
+        self._ids[keyword] = len(self._keywords)
+        self._keywords.append(keyword)
+        self._dirty = True
+
+    def remove(self, keyword: str) -> None:
+        """Remove keyword (compiled lazily on next search)"""
+        if keyword not in self._ids:
+            return
+        del self._ids[keyword]
+        self._keywords = list(self._ids)
+        self._ids = {kw: i for i, kw in enumerate(self._keywords)}
+        self._dirty = True
+
+    def build(self) -> None:
+        """بناء الشجرة وروابط الفشل"""
+        goto: List[Dict[str, int]] = [{}]
+        output: List[List[int]] = [[]]
+
+        for keyword_id, keyword in enumerate(self._keywords):
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append([])
+                state = next_state
+            output[state].append(keyword_id)
+
+        # حساب روابط الفشل بالعرض أولاً
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                output[next_state].extend(output[fail[next_state]])
+
+        self._goto = goto
+        self._fail = fail
+        self._output = [tuple(ids) for ids in output]
+        self._dirty = False
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        """
+        Find every keyword occurrence in one pass
+
+        Returns:
+            List of (start_offset, keyword) ordered by end offset
+        """
+        if self._dirty:
+            self.build()
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        keywords = self._keywords
+
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                for keyword_id in output[state]:
+                    keyword = keywords[keyword_id]
+                    matches.append((position - len(keyword) + 1, keyword))
+
+        return matches
+
+    def find_words(self, text: str) -> Dict[int, List[str]]:
+        """
+        Find whole-word keyword occurrences in space-normalized text
+
+        Returns:
+            Mapping of token start offset to the keywords starting there
+        """
+        hits: Dict[int, List[str]] = {}
+        text_length = len(text)
+
+        for start, keyword in self.find_all(text):
+            end = start + len(keyword)
+            if start > 0 and text[start - 1] != ' ':
+                continue
+            if end < text_length and text[end] != ' ':
+                continue
+            hits.setdefault(start, []).append(keyword)
+
+        return hits
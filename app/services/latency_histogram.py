@@ -0,0 +1,91 @@
+"""
+مدرج تكراري لزمن حذف الرسائل المزعجة
+Time-to-Delete Latency Histogram
+"""
+
+import bisect
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+from app.config import MESSAGE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    """
+    مدرج تكراري بحدود ثابتة بالميلي ثانية
+    
+    كل قياس يزيد عداد أول خانة حدها أكبر من أو يساوي الزمن، والقياسات الأكبر
+    من آخر حد تُعد في خانة +Inf. التسجيل O(log عدد الخانات) ولا يحفظ القياسات
+    نفسها، فالذاكرة ثابتة مهما طال تشغيل البوت.
+    """
+    
+    def __init__(self, buckets_ms: Iterable[float] = MESSAGE_CONFIG['delete_latency_buckets_ms']):
+        """
+        Initialize histogram
+        
+        Args:
+            buckets_ms: Increasing bucket upper bounds in milliseconds
+        """
+        self.bounds = sorted(buckets_ms)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    def observe(self, seconds: float) -> None:
+        """تسجيل قياس بالثواني"""
+        milliseconds = seconds * 1000
+        self.counts[bisect.bisect_left(self.bounds, milliseconds)] += 1
+        self.count += 1
+        self.total_ms += milliseconds
+        if milliseconds > self.max_ms:
+            self.max_ms = milliseconds
+    
+    def percentile(self, fraction: float) -> Optional[float]:
+        """
+        الحد الأعلى للخانة التي تقع فيها النسبة المطلوبة
+        
+        Returns:
+            Bucket upper bound in milliseconds (max observed for +Inf), or None if empty
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return self.max_ms
+    
+    def reset(self) -> None:
+        """Reset all measurements"""
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get histogram with cumulative bucket counts"""
+        buckets = {}
+        cumulative = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            cumulative += bucket_count
+            buckets[f"le_{bound:g}ms"] = cumulative
+        buckets['le_inf'] = self.count
+        
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 2) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 2),
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': buckets,
+        }
+
+
+# إنشاء نسخة واحدة لزمن الحذف من استلام التحديث
+delete_latency = LatencyHistogram()
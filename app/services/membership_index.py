@@ -0,0 +1,103 @@
+"""
+فهرس عضوية القائمتين البيضاء والسوداء في الذاكرة
+In-Memory Whitelist/Blacklist Membership Index
+"""
+
+import logging
+from typing import Any, Dict, Iterable, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+WHITELIST = 'whitelist'
+BLACKLIST = 'blacklist'
+
+
+class MembershipIndex:
+    """
+    فهرس (chat_id, user_id) للقائمتين يُحمّل مرة واحدة عند التشغيل
+    
+    كل قائمة قاموس من معرف القروب إلى مجموعة معرفات المستخدمين. هذا أصغر
+    من مجموعة أزواج (chat_id, user_id) لأن معرف القروب لا يتكرر لكل مستخدم:
+    مليون عضو يشغلون نحو 70-90 ميغابايت (عدد صحيح 32 بايت وخانة في المجموعة
+    لكل عضو) مقابل نحو 160 ميغابايت لمجموعة الأزواج.
+    
+    قبل التحميل تبقى loaded خاطئة، ويعود DatabaseService إلى الاستعلام المباشر.
+    """
+    
+    def __init__(self):
+        self.loaded = False
+        self._members: Dict[str, Dict[int, Set[int]]] = {WHITELIST: {}, BLACKLIST: {}}
+    
+    def __len__(self) -> int:
+        return sum(
+            len(users) for chats in self._members.values() for users in chats.values()
+        )
+    
+    @staticmethod
+    def _build(rows: Iterable[Tuple[int, int]]) -> Dict[int, Set[int]]:
+        chats: Dict[int, Set[int]] = {}
+        for chat_id, user_id in rows:
+            users = chats.get(chat_id)
+            if users is None:
+                users = chats[chat_id] = set()
+            users.add(user_id)
+        return chats
+    
+    def load(
+        self,
+        whitelist_rows: Iterable[Tuple[int, int]],
+        blacklist_rows: Iterable[Tuple[int, int]]
+    ) -> int:
+        """
+        تحميل القائمتين من صفوف (chat_id, user_id)
+        
+        Returns:
+            Number of loaded memberships
+        """
+        members = {WHITELIST: self._build(whitelist_rows), BLACKLIST: self._build(blacklist_rows)}
+        self._members = members
+        self.loaded = True
+        return len(self)
+    
+    def add(self, list_name: str, chat_id: int, user_id: int) -> None:
+        """إضافة عضو بعد حفظه في قاعدة البيانات"""
+        self._members[list_name].setdefault(chat_id, set()).add(user_id)
+    
+    def remove(self, list_name: str, chat_id: int, user_id: int) -> None:
+        """إزالة عضو بعد حذفه من قاعدة البيانات"""
+        chats = self._members[list_name]
+        users = chats.get(chat_id)
+        if users is None:
+            return
+        users.discard(user_id)
+        if not users:
+            del chats[chat_id]
+    
+    def contains(self, list_name: str, chat_id: int, user_id: int) -> bool:
+        """التحقق من وجود المستخدم في القائمة"""
+        users = self._members[list_name].get(chat_id)
+        return users is not None and user_id in users
+    
+    def is_whitelisted(self, chat_id: int, user_id: int) -> bool:
+        return self.contains(WHITELIST, chat_id, user_id)
+    
+    def is_blacklisted(self, chat_id: int, user_id: int) -> bool:
+        return self.contains(BLACKLIST, chat_id, user_id)
+    
+    def clear(self) -> None:
+        """Clear the index and fall back to database lookups"""
+        self._members = {WHITELIST: {}, BLACKLIST: {}}
+        self.loaded = False
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index statistics"""
+        return {
+            'loaded': self.loaded,
+            'chats': len(set(self._members[WHITELIST]) | set(self._members[BLACKLIST])),
+            'whitelist': sum(len(users) for users in self._members[WHITELIST].values()),
+            'blacklist': sum(len(users) for users in self._members[BLACKLIST].values()),
+        }
+
+
+# إنشاء نسخة واحدة من الفهرس
+membership_index = MembershipIndex()
@@ -0,0 +1,304 @@
+"""
+فهرس الرسائل شبه المكررة للإعلانات المحذوفة مؤخراً (MinHash/LSH)
+Near-Duplicate Index of Recently Deleted Spam (MinHash/LSH)
+"""
+
+import json
+import time
+import logging
+import operator
+import zlib
+from array import array
+from datetime import timezone
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.config import NEAR_DUPLICATE_CONFIG
+from app.services.text_normalizer import TextNormalizer
+from app.services.verdict_cache import VerdictCache
+
+logger = logging.getLogger(__name__)
+
+# (وقت الحذف، التوقيع، الكلمات المكتشفة، ثقة الحكم، القروب)
+Entry = Tuple[float, array, Tuple[str, ...], float, int]
+
+
+class NearDuplicateIndex:
+    """
+    فهرس LSH لتوقيعات MinHash على مقاطع أحرف القالب المخفي
+    
+    التوقيع يُحسب بتبديل واحد (One-Permutation Hashing): كل مقطع يُجزأ مرة
+    واحدة ويُوزع على خانة، وتُحفظ أصغر قيمة في كل خانة. الخانات تُقسم إلى
+    نطاقات، والرسائل التي تتطابق في نطاق واحد على الأقل تُقارن بتوقيعها كاملاً.
+    
+    كل قروب له مدخلاته، لأن الحكم الأصلي حُسب بكلمات القروب وحساسيته، ويُحفظ
+    مع الرسالة ثقة ذلك الحكم لتُقارن بعتبة القروب عند البحث. النسخة القريبة
+    من رسالة مفهرسة تجدد وقتها فقط ولا تستبدل توقيعها، فلا يبتعد المدخل عن
+    الإعلان الأصلي عبر سلسلة من النسخ المعدلة.
+    """
+    
+    def __init__(
+        self,
+        threshold: float = NEAR_DUPLICATE_CONFIG['similarity_threshold'],
+        max_entries: int = NEAR_DUPLICATE_CONFIG['max_entries'],
+        ttl: float = NEAR_DUPLICATE_CONFIG['ttl'],
+        num_bins: int = NEAR_DUPLICATE_CONFIG['num_bins'],
+        band_size: int = NEAR_DUPLICATE_CONFIG['band_size'],
+        shingle_size: int = NEAR_DUPLICATE_CONFIG['shingle_size'],
+        min_length: int = NEAR_DUPLICATE_CONFIG['min_length'],
+        max_length: int = NEAR_DUPLICATE_CONFIG['max_length'],
+        max_bucket_size: int = NEAR_DUPLICATE_CONFIG['max_bucket_size'],
+        max_candidates: int = NEAR_DUPLICATE_CONFIG['max_candidates'],
+        min_band_hits: int = NEAR_DUPLICATE_CONFIG['min_band_hits'],
+    ):
+        """
+        Initialize index
+        
+        Args:
+            threshold: Minimum estimated Jaccard similarity for a match
+            max_entries: Maximum number of messages kept
+            ttl: Seconds a deleted message stays in the index
+            num_bins: MinHash signature length (power of two)
+            band_size: Signature slots per LSH band
+            shingle_size: Characters per shingle
+            min_length: Shorter templates are neither indexed nor queried
+            max_length: Only the first max_length template characters are used
+            max_bucket_size: Newest messages kept per LSH bucket
+            max_candidates: Candidates verified per query, most band hits first
+            min_band_hits: Candidates sharing fewer bands are not verified
+        """
+        if num_bins & (num_bins - 1) or num_bins % band_size:
+            raise ValueError("num_bins يجب أن يكون من قوى العدد 2 وقابلاً للقسمة على band_size")
+        
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.num_bins = num_bins
+        self.band_size = band_size
+        self.shingle_size = shingle_size
+        self.min_length = min_length
+        self.max_length = max_length
+        self.max_bucket_size = max_bucket_size
+        self.max_candidates = max_candidates
+        self.min_band_hits = min_band_hits
+        self._bin_bits = num_bins.bit_length() - 1
+        
+        self._next_id = 0
+        # معرف الرسالة -> (وقت الحذف، التوقيع، الكلمات المكتشفة، ثقة الحكم، القروب)،
+        # بترتيب الإضافة
+        self._entries: "OrderedDict[int, Entry]" = OrderedDict()
+        # (القروب، رقم النطاق، قيم النطاق) -> معرفات الرسائل
+        self._buckets: Dict[Tuple[int, int, bytes], Dict[int, None]] = {}
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @staticmethod
+    def make_template(text: str) -> str:
+        """تطبيع النص وإخفاء الروابط والأرقام"""
+        return VerdictCache.mask(TextNormalizer.normalize(text)[0])
+    
+    def signature(self, template: str) -> Optional[array]:
+        """حساب توقيع MinHash للقالب، أو None إذا كان قصيراً جداً"""
+        template = template[:self.max_length]
+        if len(template) < self.min_length:
+            return None
+        
+        num_bins = self.num_bins
+        bin_mask = num_bins - 1
+        bin_bits = self._bin_bits
+        shingle_size = self.shingle_size
+        empty = 0xFFFFFFFF
+        
+        slots = [empty] * num_bins
+        shingles = {template[i:i + shingle_size] for i in range(len(template) - shingle_size + 1)}
+        for shingle in shingles:
+            # crc32 بدلاً من hash() لأن الأخير يختلف بين العمليات مع كل تشغيل
+            value = zlib.crc32(shingle.encode())
+            slot = value & bin_mask
+            value >>= bin_bits
+            if value < slots[slot]:
+                slots[slot] = value
+        
+        # ملء الخانات الفارغة من أقرب خانة ممتلئة على اليمين مع إزاحة بالمسافة
+        for slot in range(num_bins):
+            if slots[slot] != empty:
+                continue
+            for distance in range(1, num_bins):
+                donor = slots[(slot + distance) & bin_mask]
+                if donor != empty and donor < (1 << (32 - bin_bits)):
+                    slots[slot] = donor | (distance << (32 - bin_bits))
+                    break
+        
+        return array('I', slots)
+    
+    def _band_keys(self, signature: array, chat_id: int) -> List[Tuple[int, int, bytes]]:
+        raw = signature.tobytes()
+        width = self.band_size * signature.itemsize
+        return [
+            (chat_id, band, raw[band * width:(band + 1) * width])
+            for band in range(self.num_bins // self.band_size)
+        ]
+    
+    def _expire(self, now: float) -> None:
+        """حذف الرسائل القديمة والزائدة عن الحد من بداية الترتيب"""
+        entries = self._entries
+        while entries:
+            entry_id, entry = next(iter(entries.items()))
+            added_at = entry[0]
+            if len(entries) <= self.max_entries and now - added_at <= self.ttl:
+                break
+            self._remove(entry_id)
+    
+    def _remove(self, entry_id: int) -> None:
+        _, signature, _, _, chat_id = self._entries.pop(entry_id)
+        for band_key in self._band_keys(signature, chat_id):
+            bucket = self._buckets.get(band_key)
+            if bucket is None:
+                continue
+            bucket.pop(entry_id, None)
+            if not bucket:
+                del self._buckets[band_key]
+    
+    def add_message(
+        self,
+        text: str,
+        keywords: Sequence[str] = (),
+        deleted_at: Optional[float] = None,
+        chat_id: int = 0,
+        confidence: float = 1.0
+    ) -> bool:
+        """
+        إضافة رسالة محذوفة إلى الفهرس
+        
+        Args:
+            text: Original message text
+            keywords: Keywords detected in the message
+            deleted_at: Deletion time as a Unix timestamp (default: now)
+            chat_id: Chat the message was deleted from
+            confidence: Confidence of the verdict that deleted it
+        
+        Returns:
+            True if the message was indexed or refreshed an indexed copy
+        """
+        now = time.time()
+        deleted_at = now if deleted_at is None else deleted_at
+        if now - deleted_at > self.ttl:
+            return False
+        
+        signature = self.signature(self.make_template(text))
+        if signature is None:
+            return False
+        
+        # نسخة قريبة من رسالة موجودة تجدد وقتها وتبقي توقيعها وحكمها الأصليين
+        duplicate = self._best_match(signature, chat_id)
+        if duplicate is not None:
+            entry_id = duplicate[0]
+            entry = self._entries[entry_id]
+            self._entries[entry_id] = (max(entry[0], deleted_at),) + entry[1:]
+            self._entries.move_to_end(entry_id)
+            self._expire(now)
+            return True
+        
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (deleted_at, signature, tuple(keywords), confidence, chat_id)
+        for band_key in self._band_keys(signature, chat_id):
+            bucket = self._buckets.setdefault(band_key, {})
+            bucket[entry_id] = None
+            if len(bucket) > self.max_bucket_size:
+                del bucket[next(iter(bucket))]
+        
+        self._expire(now)
+        return True
+    
+    def load_deleted_messages(self, deleted_messages: Iterable[Any]) -> int:
+        """
+        تحميل أولي من صفوف جدول deleted_messages (من الأقدم إلى الأحدث)
+        
+        Returns:
+            Number of indexed messages
+        """
+        loaded = 0
+        for deleted_message in deleted_messages:
+            try:
+                keywords = json.loads(deleted_message.detected_keywords or '[]')
+            except ValueError:
+                keywords = []
+            
+            deleted_at = deleted_message.deleted_at.replace(tzinfo=timezone.utc).timestamp()
+            if self.add_message(
+                deleted_message.message_text or '', keywords, deleted_at,
+                deleted_message.chat_id, deleted_message.confidence_score or 1.0
+            ):
+                loaded += 1
+        
+        return loaded
+    
+    def _best_match(self, signature: array, chat_id: int) -> Optional[Tuple[int, float]]:
+        """أقرب رسالة مفهرسة من القروب للتوقيع إذا تجاوز تشابهها الحد"""
+        band_hits: Counter = Counter()
+        for band_key in self._band_keys(signature, chat_id):
+            bucket = self._buckets.get(band_key)
+            if bucket:
+                band_hits.update(bucket.keys())
+        
+        best: Optional[Tuple[int, float]] = None
+        num_bins = self.num_bins
+        for entry_id, hits in band_hits.most_common(self.max_candidates):
+            # تطابق نطاق واحد فقط يحدث بالصدفة غالباً؛ الرسائل التي تتجاوز الحد
+            # تتطابق عادة في خمسة نطاقات أو أكثر من ستة عشر
+            if hits < self.min_band_hits:
+                break
+            other = self._entries[entry_id][1]
+            similarity = sum(map(operator.eq, signature, other)) / num_bins
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (entry_id, similarity)
+        
+        return best
+    
+    def query(
+        self,
+        template: str,
+        chat_id: int = 0
+    ) -> Optional[Tuple[float, Tuple[str, ...], float]]:
+        """
+        البحث عن رسالة محذوفة من القروب قريبة من القالب
+        
+        Returns:
+            (estimated_similarity, keywords_of_match, confidence_of_match) or None
+        """
+        if not self._entries:
+            return None
+        
+        signature = self.signature(template)
+        if signature is None:
+            return None
+        
+        self._expire(time.time())
+        
+        match = self._best_match(signature, chat_id)
+        if match is None:
+            return None
+        
+        entry_id, similarity = match
+        entry = self._entries[entry_id]
+        return similarity, entry[2], entry[3]
+    
+    def clear(self) -> None:
+        """Clear the index"""
+        self._entries.clear()
+        self._buckets.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get index statistics"""
+        return {
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'buckets': len(self._buckets),
+        }
+
+
+# إنشاء نسخة واحدة من الفهرس
+near_duplicate_index = NearDuplicateIndex()
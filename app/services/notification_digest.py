@@ -0,0 +1,201 @@
+"""
+ملخص دوري لإشعارات الإعلانات المحذوفة في كل قروب
+Per-Chat Digest of Spam Notifications
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from app.config import NOTIFICATION_CONFIG
+from app.services.outbound_scheduler import PRIORITY_NOTIFY, outbound
+
+logger = logging.getLogger(__name__)
+
+
+class ChatEvents:
+    """الإعلانات المحذوفة في قروب منذ بداية نافذته"""
+    
+    __slots__ = ('bot', 'deadline', 'count', 'max_confidence', 'keywords', 'offenders', 'names')
+    
+    def __init__(self, bot, deadline: float):
+        self.bot = bot
+        self.deadline = deadline
+        self.count = 0
+        self.max_confidence = 0.0
+        self.keywords: Counter = Counter()
+        self.offenders: Counter = Counter()
+        self.names: Dict[int, str] = {}
+
+
+class NotificationDigest:
+    """
+    تجميع إشعارات الإعلانات المحذوفة في رسالة واحدة لكل قروب كل window ثانية
+    
+    أول إعلان في القروب يبدأ نافذته، وما يُحذف بعده يُضاف إلى نفس الملخص
+    (العدد وأكثر الكلمات وأكثر المرسلين). الملخصات تُرسل من مهمة واحدة عبر
+    outbound بأولوية الإشعارات، فتخضع لحد الرسائل في القروب ولا تسبق الحذف.
+    """
+    
+    def __init__(
+        self,
+        window: float = NOTIFICATION_CONFIG['digest_window'],
+        top_keywords: int = NOTIFICATION_CONFIG['top_keywords'],
+        top_offenders: int = NOTIFICATION_CONFIG['top_offenders'],
+        max_chats: int = NOTIFICATION_CONFIG['max_chats']
+    ):
+        """
+        Initialize digest
+        
+        Args:
+            window: Seconds between a chat's first event and its digest
+            top_keywords: Keywords listed in a digest
+            top_offenders: Users listed in a digest
+            max_chats: Chats with a pending digest before new chats are dropped
+        """
+        self.window = window
+        self.top_keywords = top_keywords
+        self.top_offenders = top_offenders
+        self.max_chats = max_chats
+        self.events = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        # بترتيب بداية النافذة، فأول قروب هو أول من يحين ملخصه
+        self._pending: Dict[int, ChatEvents] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+    
+    async def start(self) -> None:
+        """بدء مهمة إرسال الملخصات في حلقة الأحداث الحالية"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """إيقاف المهمة وإرسال الملخصات المتبقية"""
+        if self._task is None:
+            return
+        # بدون إلغاء: الملخص الذي بدأ إرساله لا يضيع
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        self._wakeup = None
+        await self.flush()
+    
+    def add(
+        self,
+        bot,
+        chat_id: int,
+        user_id: int,
+        user_name: str,
+        keywords: List[str],
+        confidence: float
+    ) -> None:
+        """إضافة إعلان محذوف إلى ملخص القروب"""
+        events = self._pending.get(chat_id)
+        if events is None:
+            if len(self._pending) >= self.max_chats:
+                self.dropped += 1
+                return
+            deadline = asyncio.get_running_loop().time() + self.window
+            events = self._pending[chat_id] = ChatEvents(bot, deadline)
+            if self._wakeup is not None:
+                self._wakeup.set()
+        
+        self.events += 1
+        events.count += 1
+        events.max_confidence = max(events.max_confidence, confidence)
+        events.keywords.update(keywords)
+        events.offenders[user_id] += 1
+        events.names[user_id] = user_name
+    
+    def format_digest(self, events: ChatEvents) -> str:
+        """نص الملخص"""
+        minutes = max(1, round(self.window / 60))
+        lines = [
+            f"🚨 ملخص الإعلانات المحذوفة (آخر {minutes} دقيقة)",
+            "",
+            f"🗑️ عدد الرسائل: {events.count}",
+            f"🎯 أعلى ثقة: {events.max_confidence * 100:.1f}%",
+        ]
+        if events.keywords:
+            keywords = '، '.join(
+                f"{keyword} ({count})"
+                for keyword, count in events.keywords.most_common(self.top_keywords)
+            )
+            lines.append(f"🔑 أكثر الكلمات: {keywords}")
+        offenders = '، '.join(
+            f"{events.names[user_id]} ({count})"
+            for user_id, count in events.offenders.most_common(self.top_offenders)
+        )
+        lines.append(f"👤 أكثر المرسلين: {offenders}")
+        return '\n'.join(lines)
+    
+    async def flush(self, now: Optional[float] = None) -> int:
+        """إرسال ملخصات القروبات التي انتهت نافذتها (أو كلها بدون now)"""
+        due = []
+        for chat_id, events in self._pending.items():
+            if now is not None and events.deadline > now:
+                break
+            due.append((chat_id, events))
+        for chat_id, _ in due:
+            del self._pending[chat_id]
+        
+        if due:
+            await asyncio.gather(*(self._send(chat_id, events) for chat_id, events in due))
+        return len(due)
+    
+    async def _send(self, chat_id: int, events: ChatEvents) -> None:
+        try:
+            await outbound.send_message(
+                events.bot, chat_id, self.format_digest(events), priority=PRIORITY_NOTIFY
+            )
+            self.sent += 1
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"⚠️ فشل إرسال ملخص الإشعارات إلى القروب {chat_id}: {e}")
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        wakeup = self._wakeup
+        while True:
+            wakeup.clear()
+            if self._stopping:
+                return
+            
+            # الانتظار حتى نهاية أقدم نافذة، أو حتى أول إعلان إذا لم توجد
+            delay = None
+            if self._pending:
+                delay = next(iter(self._pending.values())).deadline - loop.time()
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            await self.flush(loop.time())
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get digest statistics"""
+        return {
+            'running': self.running,
+            'window': self.window,
+            'pending_chats': len(self._pending),
+            'events': self.events,
+            'dropped': self.dropped,
+            'sent': self.sent,
+            'failed': self.failed,
+        }
+
+
+# إنشاء نسخة واحدة من الملخص
+notification_digest = NotificationDigest()
@@ -5,54 +5,117 @@ Obfuscation Detector Service
 
 import re
 import logging
-from typing import Tuple, List
+from typing import Tuple, List, Iterable
+
+from app.config import OBFUSCATION_CONFIG
 
 logger = logging.getLogger(__name__)
 
+# فئات الأحرف المستخدمة في الفحص
+ARABIC_LETTER = 'L'
+ARABIC_OTHER = 'A'
+LATIN = 'a'
+SPACE = ' '
+OTHER = 'o'
+
+
+def _build_class_table() -> List[str]:
+    """
+    بناء جدول يحوّل كل حرف إلى فئته
+    
+    الحرف العربي [ا-ي] ← L، بقية النطاق العربي ← A، الحرف اللاتيني الصغير ← a،
+    المسافات ← ' '، والنقطة والشرطة والشرطة السفلية تبقى كما هي.
+    """
+    table = [OTHER] * 0x10000
+    for codepoint in range(0x0600, 0x0700):
+        table[codepoint] = ARABIC_OTHER
+    for codepoint in range(ord('ا'), ord('ي') + 1):
+        table[codepoint] = ARABIC_LETTER
+    for codepoint in range(ord('a'), ord('z') + 1):
+        table[codepoint] = LATIN
+    for codepoint in range(0x10000):
+        if chr(codepoint).isspace():
+            table[codepoint] = SPACE
+    for char in '.-_':
+        table[ord(char)] = char
+    return table
+
 
 class ObfuscationDetector:
     """كاشف التمويه والرسائل المخفية"""
     
+    CLASS_TABLE = _build_class_table()
+    
+    # أوزان أنواع التمويه بترتيب ظهورها في النتيجة
+    WEIGHTS = {
+        'dots': OBFUSCATION_CONFIG['dots_score'],
+        'spaces': OBFUSCATION_CONFIG['spaces_score'],
+        'dashes': OBFUSCATION_CONFIG['dashes_score'],
+        'special_chars': OBFUSCATION_CONFIG['special_chars_score'],
+        'mixed_languages': OBFUSCATION_CONFIG['mixed_language_score'],
+    }
+    
+    # مسافتان أو أكثر بين حرفين عربيين (على نص الفئات)
+    SPACES_RUN_PATTERN = re.compile(r'L  +L')
+    
     @staticmethod
-    def detect_obfuscation(text: str) -> Tuple[float, List[str]]:
-        """كشف التمويه في النص"""
-        obfuscation_score = 0.0
+    def scan(text: str) -> List[str]:
+        """
+        جمع أنواع التمويه في النص بمرور واحد
+        
+        يُحوَّل النص إلى سلسلة فئات بـ str.translate، ثم تُقرأ كل الإشارات
+        من هذه السلسلة ببحث نصي سريع بدلاً من خمسة تعابير منتظمة على النص الأصلي.
+        """
+        classes = text.translate(ObfuscationDetector.CLASS_TABLE)
         obfuscation_types = []
         
+        has_dots = 'L.L' in classes
+        has_dashes = 'L-L' in classes
+        
         # كشف النقاط بين الأحرف
-        if re.search(r'[ا-ي]\.[ا-ي]', text):
-            obfuscation_score += 0.2
+        if has_dots:
             obfuscation_types.append('dots')
         
         # كشف المسافات بين الأحرف
-        if re.search(r'[ا-ي]\s{2,}[ا-ي]', text):
-            obfuscation_score += 0.2
+        if 'L  ' in classes and ObfuscationDetector.SPACES_RUN_PATTERN.search(classes):
             obfuscation_types.append('spaces')
         
         # كشف الشرطات بين الأحرف
-        if re.search(r'[ا-ي]-[ا-ي]', text):
-            obfuscation_score += 0.15
+        if has_dashes:
             obfuscation_types.append('dashes')
         
         # كشف الأحرف الخاصة
-        if re.search(r'[ا-ي][_\-\.][ا-ي]', text):
-            obfuscation_score += 0.15
+        if has_dots or has_dashes or 'L_L' in classes:
             obfuscation_types.append('special_chars')
         
         # كشف الخليط من اللغات
-        has_arabic = bool(re.search(r'[\u0600-\u06FF]', text))
-        has_latin = bool(re.search(r'[a-z]', text))
-        if has_arabic and has_latin:
-            obfuscation_score += 0.1
+        if LATIN in classes and (ARABIC_LETTER in classes or ARABIC_OTHER in classes):
             obfuscation_types.append('mixed_languages')
         
-        return min(obfuscation_score, 1.0), obfuscation_types
+        return obfuscation_types
+    
+    @staticmethod
+    def score(obfuscation_types: Iterable[str]) -> Tuple[float, List[str]]:
+        """حساب درجة التمويه من الأنواع المكتشفة"""
+        found = set(obfuscation_types)
+        obfuscation_score = 0.0
+        ordered_types = []
+        for obfuscation_type, weight in ObfuscationDetector.WEIGHTS.items():
+            if obfuscation_type in found:
+                obfuscation_score += weight
+                ordered_types.append(obfuscation_type)
+        return min(obfuscation_score, 1.0), ordered_types
+    
+    @staticmethod
+    def detect_obfuscation(text: str) -> Tuple[float, List[str]]:
+        """كشف التمويه في النص"""
+        return ObfuscationDetector.score(ObfuscationDetector.scan(text))
     
     @staticmethod
     def is_heavily_obfuscated(text: str) -> bool:
         """التحقق من أن النص مخفي بشكل كبير"""
         score, types = ObfuscationDetector.detect_obfuscation(text)
-        return score >= 0.5
+        return score >= OBFUSCATION_CONFIG['heavy_obfuscation_threshold']
 
 
 # إنشاء نسخة واحدة من الكاشف
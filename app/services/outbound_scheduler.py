@@ -0,0 +1,327 @@
+"""
+جدولة طلبات البوت الصادرة إلى تلقرام حسب الأولوية
+Outbound Telegram Request Scheduler with Priority Lanes
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from functools import partial
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from telegram.error import RetryAfter
+
+from app.config import OUTBOUND_CONFIG
+from app.services.rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# مسارات الأولوية: الأصغر يُرسل أولاً
+PRIORITY_DELETE = 0  # حذف الإعلانات فور اكتشافها
+PRIORITY_BAN = 1  # حظر أو تقييد المستخدمين
+PRIORITY_REPLY = 2  # ردود الأوامر
+PRIORITY_NOTIFY = 3  # الإشعارات وتحديث رسائل الحالة
+PRIORITY_CLEANUP = 4  # حذف الرسائل القديمة في أوامر التنظيف
+LANES = 5
+
+# المسارات التي ترسل أو تعدل رسائل، فتخضع لحد كل قروب
+CHAT_LIMITED_LANES = (PRIORITY_REPLY, PRIORITY_NOTIFY)
+
+GLOBAL_KEY = 'global'
+
+
+class OutboundJob:
+    """طلب واحد ينتظر الإرسال"""
+    __slots__ = ('priority', 'chat_id', 'call', 'key', 'future', 'attempts')
+    
+    def __init__(
+        self,
+        priority: int,
+        chat_id: int,
+        call: Callable[[], Awaitable[Any]],
+        key: Optional[Hashable],
+        future: asyncio.Future
+    ):
+        self.priority = priority
+        self.chat_id = chat_id
+        self.call = call
+        self.key = key
+        self.future = future
+        self.attempts = 0
+
+
+class OutboundScheduler:
+    """
+    طابور لكل مسار أولوية يرسله عدد محدود من العمال
+    
+    كل عامل يأخذ أول طلب جاهز من أعلى مسار: حذف الإعلانات قبل الحظر قبل الردود
+    قبل الإشعارات، وحذف أوامر التنظيف أخيراً، فلا تؤخر دفعات التنظيف حذف
+    إعلان جديد. داخل المسار تتناوب القروبات على الإرسال.
+    
+    الطلب جاهز إذا سمح به دلو الرموز العام، ودلو القروب لمسارات الرسائل، ولم
+    يكن القروب موقوفاً بعد خطأ 429. عند 429 يوقف القروب retry_after ثانية ويعود
+    الطلب إلى أول طابور قروبه. تعديلات نفس رسالة الحالة التي لم تُرسل بعد تُدمج
+    في تعديل واحد بآخر نص.
+    """
+    
+    def __init__(
+        self,
+        workers: int = OUTBOUND_CONFIG['workers'],
+        global_rate: int = OUTBOUND_CONFIG['global_requests_per_second'],
+        chat_rate: int = OUTBOUND_CONFIG['chat_messages_per_minute'],
+        max_retries: int = OUTBOUND_CONFIG['max_retries']
+    ):
+        """
+        Initialize scheduler
+        
+        Args:
+            workers: Requests in flight at the same time
+            global_rate: Requests per second across all chats
+            chat_rate: Sent or edited messages per minute in one chat
+            max_retries: 429 retries before the error reaches the caller
+        """
+        self.workers = workers
+        self.max_retries = max_retries
+        self.global_limiter = RateLimiter(global_rate, 1, max_keys=1)
+        self.global_rate = global_rate
+        self.chat_limiter = RateLimiter(chat_rate, 60)
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        # مسار -> (القروب -> طلباته بالترتيب)، والقروبات بترتيب دورها
+        self._lanes: List["OrderedDict[int, Deque[OutboundJob]]"] = [
+            OrderedDict() for _ in range(LANES)
+        ]
+        self._coalescing: Dict[Hashable, OutboundJob] = {}
+        self._blocked_until: Dict[int, float] = {}
+        self._queued = 0
+        self._closing = False
+        self._condition: Optional[asyncio.Condition] = None
+        self._tasks: List[asyncio.Task] = []
+    
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+    
+    def set_global_rate(self, rate: float) -> None:
+        """
+        تغيير حد الطلبات العام في الثانية (مثلاً حصة عملية من عدة عمليات)
+        
+        الحد الأقل من طلب في الثانية يصبح طلباً كل 1 / rate ثانية.
+        """
+        window = max(1.0, 1 / rate)
+        self.global_limiter = RateLimiter(rate * window, window, max_keys=1)
+        self.global_rate = rate
+    
+    async def start(self) -> None:
+        """بدء العمال في حلقة الأحداث الحالية"""
+        if self._tasks:
+            return
+        self._closing = False
+        self._condition = asyncio.Condition()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"outbound-{index}")
+            for index in range(self.workers)
+        ]
+    
+    async def stop(self) -> None:
+        """إرسال كل الطلبات المنتظرة ثم إيقاف العمال"""
+        if not self._tasks:
+            return
+        async with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        await asyncio.gather(*self._tasks)
+        self._tasks = []
+        self._condition = None
+    
+    async def submit(
+        self,
+        priority: int,
+        chat_id: int,
+        call: Callable[[], Awaitable[Any]],
+        key: Optional[Hashable] = None
+    ) -> Any:
+        """
+        جدولة طلب وانتظار نتيجته
+        
+        Args:
+            priority: One of the PRIORITY_* lanes
+            chat_id: Chat the request belongs to
+            call: Returns the request coroutine when called
+            key: Queued requests with the same key are merged into the newest one
+        """
+        if not self._tasks or self._closing:
+            # الجدولة لا تعمل: إرسال فوري
+            return await call()
+        
+        async with self._condition:
+            job = self._coalescing.get(key) if key is not None else None
+            if job is not None:
+                job.call = call
+                self.coalesced += 1
+            else:
+                job = OutboundJob(
+                    priority, chat_id, call, key, asyncio.get_running_loop().create_future()
+                )
+                if key is not None:
+                    self._coalescing[key] = job
+                self._enqueue(job)
+                self._condition.notify()
+        
+        # إلغاء أحد المنتظرين لا يلغي الطلب المشترك
+        return await asyncio.shield(job.future)
+    
+    def _enqueue(self, job: OutboundJob, first: bool = False) -> None:
+        lane = self._lanes[job.priority]
+        jobs = lane.get(job.chat_id)
+        if jobs is None:
+            jobs = lane[job.chat_id] = deque()
+            if first:
+                lane.move_to_end(job.chat_id, last=False)
+        if first:
+            jobs.appendleft(job)
+        else:
+            jobs.append(job)
+        self._queued += 1
+    
+    def _take(self) -> Tuple[Optional[OutboundJob], Optional[float]]:
+        """أول طلب جاهز، أو None مع الثواني حتى يصبح أحدها جاهزاً"""
+        if not self._queued:
+            return None, None
+        delay = self.global_limiter.wait_time(GLOBAL_KEY)
+        if delay > 0:
+            return None, delay
+        
+        now = time.monotonic()
+        delay = None
+        for priority, lane in enumerate(self._lanes):
+            for chat_id in lane:
+                blocked_until = self._blocked_until.get(chat_id)
+                if blocked_until is not None:
+                    if blocked_until > now:
+                        delay = min(delay or blocked_until - now, blocked_until - now)
+                        continue
+                    del self._blocked_until[chat_id]
+                if priority in CHAT_LIMITED_LANES:
+                    wait = self.chat_limiter.wait_time(chat_id)
+                    if wait > 0:
+                        delay = min(delay or wait, wait)
+                        continue
+                    self.chat_limiter.is_allowed(chat_id)
+                
+                jobs = lane[chat_id]
+                job = jobs.popleft()
+                if jobs:
+                    lane.move_to_end(chat_id)
+                else:
+                    del lane[chat_id]
+                if job.key is not None:
+                    self._coalescing.pop(job.key, None)
+                self._queued -= 1
+                self.global_limiter.is_allowed(GLOBAL_KEY)
+                return job, None
+        return None, delay
+    
+    async def _worker(self) -> None:
+        condition = self._condition
+        while True:
+            async with condition:
+                job, delay = self._take()
+                while job is None and not (self._closing and not self._queued):
+                    try:
+                        await asyncio.wait_for(condition.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    job, delay = self._take()
+            if job is None:
+                return
+            await self._execute(job)
+    
+    async def _execute(self, job: OutboundJob) -> None:
+        try:
+            result = await job.call()
+        except RetryAfter as e:
+            job.attempts += 1
+            if job.attempts <= self.max_retries:
+                self.retries += 1
+                logger.warning(
+                    f"⚠️ تجاوز حد تلقرام في القروب {job.chat_id}، إعادة بعد {e.retry_after} ثانية"
+                )
+                async with self._condition:
+                    self._blocked_until[job.chat_id] = time.monotonic() + e.retry_after
+                    self._enqueue(job, first=True)
+                    self._condition.notify_all()
+                return
+            job.future.set_exception(e)
+        except Exception as e:
+            job.future.set_exception(e)
+        else:
+            self.sent += 1
+            job.future.set_result(result)
+    
+    async def call(
+        self,
+        priority: int,
+        chat_id: int,
+        function: Callable[..., Awaitable[Any]],
+        /,
+        *args,
+        **kwargs
+    ) -> Any:
+        """جدولة أي دالة من دوال البوت"""
+        return await self.submit(priority, chat_id, partial(function, *args, **kwargs))
+    
+    async def delete_message(
+        self,
+        bot,
+        chat_id: int,
+        message_id: int,
+        priority: int = PRIORITY_DELETE
+    ) -> Any:
+        """حذف رسالة"""
+        return await self.call(
+            priority, chat_id, bot.delete_message, chat_id=chat_id, message_id=message_id
+        )
+    
+    async def send_message(
+        self,
+        bot,
+        chat_id: int,
+        text: str,
+        priority: int = PRIORITY_NOTIFY,
+        **kwargs
+    ) -> Any:
+        """إرسال رسالة"""
+        return await self.call(priority, chat_id, bot.send_message, chat_id, text, **kwargs)
+    
+    async def reply_text(self, message, text: str, priority: int = PRIORITY_REPLY, **kwargs) -> Any:
+        """الرد على رسالة"""
+        return await self.call(priority, message.chat_id, message.reply_text, text, **kwargs)
+    
+    async def edit_text(self, message, text: str, priority: int = PRIORITY_NOTIFY, **kwargs) -> Any:
+        """تعديل رسالة، مع دمج التعديلات المتتالية التي لم تُرسل بعد"""
+        return await self.submit(
+            priority, message.chat_id, partial(message.edit_text, text, **kwargs),
+            key=(message.chat_id, message.message_id)
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get scheduler statistics"""
+        return {
+            'running': self.running,
+            'global_rate': self.global_rate,
+            'queued': self._queued,
+            'queued_by_lane': [
+                sum(len(jobs) for jobs in lane.values()) for lane in self._lanes
+            ],
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'retries': self.retries,
+            'blocked_chats': len(self._blocked_until),
+        }
+
+
+# إنشاء نسخة واحدة من الجدولة
+outbound = OutboundScheduler()
@@ -0,0 +1,257 @@
+"""
+تشغيل البوت بعدة عمليات مع توجيه كل قروب إلى عملية واحدة
+Prefork Webhook Workers with Chat-Affinity Routing
+"""
+
+import asyncio
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import struct
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
+
+import uvicorn
+from telegram import Bot, Update
+from telegram.ext import Application
+
+from app.config import OUTBOUND_CONFIG, WEBHOOK_CONFIG
+from app.models.init_db import engine
+from app.services.chat_dispatcher import chat_dispatcher
+from app.services.detection import OptimizedDetectionEngine
+from app.services.outbound_scheduler import outbound
+from app.services.webhook import create_webhook_app, run_application, set_webhook, update_chat_id
+
+logger = logging.getLogger(__name__)
+
+# طول التحديث قبل نصه في الاتصال بين العملية الأمامية والعاملة
+FRAME_HEADER = struct.Struct('!I')
+
+# فترة انتظار العملية العاملة حتى يفرغ مكان في طابورها
+WORKER_POLL_INTERVAL = 0.01
+
+
+def worker_index(chat_id: int, workers: int) -> int:
+    """العملية التي تعالج القروب (نفس العملية دائماً لنفس القروب)"""
+    return chat_id % workers
+
+
+async def read_frames(reader: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    """قراءة التحديثات من العملية الأمامية حتى تغلق الاتصال"""
+    while True:
+        try:
+            header = await reader.readexactly(FRAME_HEADER.size)
+            frame = await reader.readexactly(FRAME_HEADER.unpack(header)[0])
+        except asyncio.IncompleteReadError:
+            return
+        yield frame
+
+
+class ChatAffinityRouter:
+    """
+    توزيع التحديثات على العمليات العاملة حسب القروب
+    
+    كل تحديث يُرسل كما وصل من تلقرام، مسبوقاً بطوله. رسائل القروب تصل دائماً
+    إلى نفس العملية، فيبقى ترتيبها وذاكراتها (الإعدادات، القوائم، بصمات
+    الإعلانات) في عملية واحدة. إذا تراكم لعملية أكثر من max_buffer بايت لم
+    تقرأها بعد يُرفض التحديث (503)، فعملية متأخرة لا تؤخر قروبات غيرها.
+    """
+    
+    def __init__(
+        self,
+        sockets: List[socket.socket],
+        max_buffer: int = WEBHOOK_CONFIG['worker_buffer_bytes']
+    ):
+        """
+        Initialize router
+        
+        Args:
+            sockets: Front end of one socket pair per worker
+            max_buffer: Unsent bytes per worker before updates are rejected
+        """
+        self.sockets = sockets
+        self.max_buffer = max_buffer
+        self.routed = [0] * len(sockets)
+        self.rejected = 0
+        self._writers: List[asyncio.StreamWriter] = []
+    
+    async def connect(self) -> None:
+        """فتح الاتصالات في حلقة الأحداث الحالية"""
+        for sock in self.sockets:
+            _, writer = await asyncio.open_connection(sock=sock)
+            self._writers.append(writer)
+    
+    async def close(self) -> None:
+        """إغلاق الاتصالات، فتنهي كل عملية عاملة ما وصلها ثم تتوقف"""
+        for writer in self._writers:
+            writer.close()
+        for writer in self._writers:
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+        self._writers = []
+    
+    async def sink(self, data: Dict[str, Any], body: bytes) -> bool:
+        """إرسال التحديث إلى عملية قروبه، أو False إذا كانت متأخرة"""
+        index = worker_index(update_chat_id(data), len(self._writers))
+        writer = self._writers[index]
+        if writer.transport.get_write_buffer_size() >= self.max_buffer:
+            self.rejected += 1
+            return False
+        # بدون drain: المخزن محدود بالفحص السابق، وانتظار عملية متأخرة يحجز الطلب
+        writer.write(FRAME_HEADER.pack(len(body)) + body)
+        self.routed[index] += 1
+        return True
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get router statistics"""
+        return {
+            'workers': len(self.sockets),
+            'routed': list(self.routed),
+            'rejected': self.rejected,
+        }
+
+
+async def serve_worker(
+    application: Application,
+    sock: socket.socket,
+    max_queued: int = WEBHOOK_CONFIG['max_queued_updates']
+) -> None:
+    """تشغيل التطبيق على التحديثات القادمة من العملية الأمامية حتى تغلق الاتصال"""
+    reader, writer = await asyncio.open_connection(sock=sock)
+    
+    async def serve() -> None:
+        async for frame in read_frames(reader):
+            # التوقف عن القراءة يملأ مخزن العملية الأمامية فترد 503
+            while application.update_queue.qsize() >= max_queued or chat_dispatcher.full:
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+            await application.update_queue.put(Update.de_json(json.loads(frame), application.bot))
+        writer.close()
+    
+    await run_application(application, serve)
+
+
+def _worker_main(
+    index: int,
+    sock: socket.socket,
+    inherited: List[socket.socket],
+    build_application: Callable[[str], Application],
+    token: str,
+    workers: int
+) -> None:
+    # أطراف العمليات الأخرى الموروثة تمنع وصول نهاية الاتصال إليها
+    for other in inherited:
+        other.close()
+    # حد تلقرام العام للبوت كله، فلكل عملية حصة ثابتة منه. حد القروب يبقى
+    # كما هو لأن كل قروب يصل إلى عملية واحدة فقط
+    outbound.set_global_rate(OUTBOUND_CONFIG['global_requests_per_second'] / workers)
+    # Ctrl+C يصل للعملية الأمامية فقط، والعاملة تتوقف عند إغلاق اتصالها
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logger.info(f"🚀 بدء العملية العاملة {index} (pid {os.getpid()})")
+    asyncio.run(serve_worker(build_application(token), sock))
+
+
+def prepare_fork() -> None:
+    """
+    تجهيز العملية الأمامية قبل إنشاء العمليات العاملة
+    
+    الجداول الثابتة تُبنى هنا مرة واحدة وتشترك فيها العمليات (copy-on-write)،
+    وgc.freeze ينقل الكائنات الموجودة إلى جيل دائم فلا يلمسها جامع القمامة في
+    العمليات العاملة ولا تُنسخ صفحاتها.
+    """
+    OptimizedDetectionEngine.build_tables()
+    # اتصالات قاعدة البيانات لا تُشارك بين العمليات
+    engine.dispose()
+    gc.collect()
+    gc.freeze()
+
+
+def start_workers(
+    workers: int,
+    target: Callable[..., None],
+    *args
+) -> Tuple[List[multiprocessing.Process], List[socket.socket]]:
+    """
+    إنشاء العمليات العاملة بـ fork، ولكل منها زوج sockets مع العملية الأمامية
+    
+    target يُستدعى في العملية العاملة بـ (index, sock, inherited, *args)
+    """
+    context = multiprocessing.get_context('fork')
+    processes: List[multiprocessing.Process] = []
+    sockets: List[socket.socket] = []
+    for index in range(workers):
+        front, back = socket.socketpair()
+        process = context.Process(
+            target=target, args=(index, back, sockets + [front], *args),
+            name=f"bot-worker-{index}"
+        )
+        process.start()
+        back.close()
+        processes.append(process)
+        sockets.append(front)
+    return processes, sockets
+
+
+async def _serve_front(
+    token: str,
+    router: ChatAffinityRouter,
+    webhook_url: str,
+    secret_token: str,
+    host: str,
+    port: int,
+    path: str
+) -> None:
+    await router.connect()
+    app = create_webhook_app(router.sink, secret_token, path)
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level='warning'))
+    try:
+        async with Bot(token) as bot:
+            await set_webhook(bot, webhook_url, secret_token, path)
+        await server.serve()
+    finally:
+        await router.close()
+        logger.info(f"📊 توزيع التحديثات على العمليات: {router.get_stats()}")
+
+
+def run_prefork(
+    build_application: Callable[[str], Application],
+    token: str,
+    webhook_url: str,
+    secret_token: str,
+    workers: int = WEBHOOK_CONFIG['workers'],
+    host: str = WEBHOOK_CONFIG['host'],
+    port: int = WEBHOOK_CONFIG['port'],
+    path: str = WEBHOOK_CONFIG['path']
+) -> None:
+    """
+    تشغيل البوت بوضع Webhook بعدة عمليات حتى Ctrl+C
+    
+    Args:
+        build_application: Builds an Application with handlers for a token
+        token: Bot token
+        webhook_url: Public base URL Telegram can reach (path is appended)
+        secret_token: Sent by Telegram in every request
+        workers: Worker processes (0 = one per CPU core)
+        host: Interface to listen on
+        port: Port to listen on
+        path: URL path of the endpoint
+    """
+    workers = workers or os.cpu_count() or 1
+    prepare_fork()
+    processes, sockets = start_workers(
+        workers, _worker_main, build_application, token, workers
+    )
+    logger.info(f"✅ تم تشغيل {workers} عملية عاملة")
+    try:
+        asyncio.run(_serve_front(
+            token, ChatAffinityRouter(sockets), webhook_url, secret_token, host, port, path
+        ))
+    finally:
+        for sock in sockets:
+            sock.close()
+        for process in processes:
+            process.join()
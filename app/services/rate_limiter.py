@@ -5,70 +5,126 @@ Rate Limiting Service to Prevent Abuse
 
 import logging
 import time
-from typing import Dict
-from collections import defaultdict
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+from app.config import RATE_LIMIT_CONFIG
 
 logger = logging.getLogger(__name__)
 
 
 class RateLimiter:
-    """خدمة تحديد معدل الطلبات"""
+    """
+    خدمة تحديد معدل الطلبات بدلو رموز (token bucket) لكل مفتاح
+    
+    الدلو يتسع max_requests رمزاً ويمتلئ بمعدل رمز كل time_window / max_requests
+    ثانية، وكل طلب يستهلك رمزاً. الدلو محفوظ كرقم واحد لكل مفتاح (GCRA): الوقت
+    الذي يمتلئ فيه الدلو من جديد. كل طلب يؤخره رمزاً واحداً، ويُرفض الطلب إذا
+    ابتعد هذا الوقت عن الآن أكثر من time_window. الفحص O(1) بدلاً من قائمة
+    أوقات تُبنى من جديد في كل طلب.
+    
+    المفاتيح مرتبة حسب آخر طلب. المفتاح الذي امتلأ دلوه لا يختلف عن مفتاح جديد
+    فيُحذف من أول الترتيب، وعند تجاوز max_keys يُحذف الأقدم، فيبقى حجم الجدول
+    محدوداً مهما كثر المستخدمون.
+    """
     
-    def __init__(self, max_requests: int = 10, time_window: int = 60):
+    def __init__(
+        self,
+        max_requests: int = 10,
+        time_window: int = 60,
+        max_keys: int = RATE_LIMIT_CONFIG['max_tracked_keys']
+    ):
         """
         Initialize rate limiter
         
         Args:
-            max_requests: Maximum requests allowed in time window
-            time_window: Time window in seconds
+            max_requests: Maximum requests allowed in time window (bucket capacity)
+            time_window: Seconds for an empty bucket to refill
+            max_keys: Maximum tracked keys (least recently seen are dropped)
         """
         self.max_requests = max_requests
         self.time_window = time_window
-        self.requests: Dict[int, list] = defaultdict(list)
+        self.max_keys = max_keys
+        self.interval = time_window / max_requests
+        self._max_delay = time_window * (1 + 1e-9)
+        self.evicted = 0
+        # المفتاح -> وقت امتلاء الدلو (time.monotonic)
+        self._full_at: "OrderedDict[Hashable, float]" = OrderedDict()
     
-    def is_allowed(self, user_id: int) -> bool:
-        """Check if user is allowed to make request"""
-        current_time = time.time()
-        
-        # Clean old requests
-        self.requests[user_id] = [
-            req_time for req_time in self.requests[user_id]
-            if current_time - req_time < self.time_window
-        ]
-        
-        # Check if limit exceeded
-        if len(self.requests[user_id]) >= self.max_requests:
-            logger.warning(f"Rate limit exceeded for user {user_id}")
-            return False
+    def __len__(self) -> int:
+        return len(self._full_at)
+    
+    def _evict(self, now: float) -> None:
+        full_at = self._full_at
+        while full_at:
+            key = next(iter(full_at))
+            if full_at[key] > now and len(full_at) <= self.max_keys:
+                break
+            del full_at[key]
+            self.evicted += 1
+    
+    def is_allowed(self, user_id: Hashable) -> bool:
+        """Check if user (or any key, e.g. (chat_id, user_id)) is allowed to make request"""
+        now = time.monotonic()
+        full_at = self._full_at.get(user_id, now)
+        if full_at < now:
+            full_at = now
         
-        # Add current request
-        self.requests[user_id].append(current_time)
-        return True
+        full_at += self.interval
+        # هامش صغير لأخطاء تقريب جمع interval المتكرر
+        allowed = full_at - now <= self._max_delay
+        if allowed:
+            self._full_at[user_id] = full_at
+        # المرفوض موجود دائماً لأن دلوه غير ممتلئ
+        self._full_at.move_to_end(user_id)
+        self._evict(now)
+        return allowed
+    
+    def wait_time(self, user_id: Hashable) -> float:
+        """Seconds until is_allowed() would allow the next request (0 if allowed now)"""
+        full_at = self._full_at.get(user_id)
+        if full_at is None:
+            return 0.0
+        now = time.monotonic()
+        delay = max(full_at, now) + self.interval - now - self._max_delay
+        return delay if delay > 0 else 0.0
     
-    def get_remaining_requests(self, user_id: int) -> int:
+    def get_remaining_requests(self, user_id: Hashable) -> int:
         """Get remaining requests for user"""
-        current_time = time.time()
-        
-        # Clean old requests
-        self.requests[user_id] = [
-            req_time for req_time in self.requests[user_id]
-            if current_time - req_time < self.time_window
-        ]
-        
-        return max(0, self.max_requests - len(self.requests[user_id]))
+        full_at = self._full_at.get(user_id)
+        if full_at is None:
+            return self.max_requests
+        used = max(0.0, full_at - time.monotonic())
+        return int((self.time_window - used) / self.interval + 1e-9)
     
-    def reset_user(self, user_id: int) -> None:
+    def reset_user(self, user_id: Hashable) -> None:
         """Reset rate limit for user"""
-        if user_id in self.requests:
-            del self.requests[user_id]
+        if user_id in self._full_at:
+            del self._full_at[user_id]
             logger.info(f"تم إعادة تعيين حد المعدل للمستخدم {user_id}")
     
     def reset_all(self) -> None:
         """Reset all rate limits"""
-        self.requests.clear()
+        self._full_at.clear()
         logger.info("تم إعادة تعيين جميع حدود المعدل")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get limiter statistics"""
+        return {
+            'tracked_keys': len(self._full_at),
+            'max_keys': self.max_keys,
+            'evicted': self.evicted,
+            'max_requests': self.max_requests,
+            'time_window': self.time_window,
+        }
 
 
 # Global rate limiter instances
-message_rate_limiter = RateLimiter(max_requests=30, time_window=60)  # 30 messages per minute
-command_rate_limiter = RateLimiter(max_requests=10, time_window=60)  # 10 commands per minute
+message_rate_limiter = RateLimiter(
+    max_requests=RATE_LIMIT_CONFIG['message_max_requests'],
+    time_window=RATE_LIMIT_CONFIG['message_time_window'],
+)  # 30 messages per minute per user in each chat
+command_rate_limiter = RateLimiter(
+    max_requests=RATE_LIMIT_CONFIG['command_max_requests'],
+    time_window=RATE_LIMIT_CONFIG['command_time_window'],
+)  # 10 commands per minute per user
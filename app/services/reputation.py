@@ -0,0 +1,299 @@
+"""
+سمعة الأعضاء في كل قروب ومسار سريع للأعضاء الموثوقين
+Incremental Member Reputation for the Trusted Fast Path
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.dialects.sqlite import insert
+
+from app.config import REPUTATION_CONFIG
+from app.models.init_db import UserStatistics
+from app.services.async_database import async_db
+
+logger = logging.getLogger(__name__)
+
+# (chat_id, user_id)
+MemberKey = Tuple[int, int]
+
+
+class MemberReputation:
+    """عدادات العضو ودرجته في لحظة updated_at"""
+    
+    __slots__ = ('user_name', 'clean_count', 'spam_count', 'score', 'updated_at', 'last_spam_at')
+    
+    def __init__(
+        self,
+        user_name: str = "",
+        clean_count: int = 0,
+        spam_count: int = 0,
+        score: float = 0.0,
+        updated_at: float = 0.0,
+        last_spam_at: Optional[float] = None
+    ):
+        self.user_name = user_name
+        self.clean_count = clean_count
+        self.spam_count = spam_count
+        self.score = score
+        self.updated_at = updated_at
+        self.last_spam_at = last_spam_at
+
+
+def _to_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def _to_timestamp(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class ReputationTracker:
+    """
+    درجة سمعة لكل (قروب، عضو) تتناقص مع الوقت
+    
+    كل رسالة سليمة تضيف نقطة، والرسالة المزعجة تنزل الدرجة إلى ما دون الصفر
+    بمقدار spam_penalty، والدرجة تفقد نصف قيمتها كل half_life. العضو الذي
+    تبلغ درجته trust_threshold تُكشف رسائله بالمراحل الرخيصة فقط. السجلات
+    المعدلة تُكتب في user_statistics على دفعات كل flush_interval.
+    
+    العضو الذي خرج من الذاكرة يبدأ من الصفر ويُفحص كاملاً، فالخطأ هنا يكلف
+    وقت معالج فقط ولا يمرر إعلاناً.
+    """
+    
+    def __init__(
+        self,
+        trust_threshold: float = REPUTATION_CONFIG['trust_threshold'],
+        half_life: float = REPUTATION_CONFIG['half_life_days'] * 86400,
+        spam_penalty: float = REPUTATION_CONFIG['spam_penalty'],
+        max_entries: int = REPUTATION_CONFIG['max_entries'],
+        flush_interval: float = REPUTATION_CONFIG['flush_interval'],
+        saver: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None
+    ):
+        """
+        Initialize reputation tracker
+        
+        Args:
+            trust_threshold: Decayed score from which a member is trusted
+            half_life: Seconds for a score to lose half its value
+            spam_penalty: Score subtracted for each spam message
+            max_entries: Maximum (chat, user) records kept in memory
+            flush_interval: Seconds between batched writes
+            saver: Writes changed rows in one transaction (default: async_db)
+        """
+        self.trust_threshold = trust_threshold
+        self.half_life = half_life
+        self.spam_penalty = spam_penalty
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.saver = saver or ReputationTracker._save_with_executor
+        self.rows_written = 0
+        self.rows_failed = 0
+        # زمن الكشف لرسائل الأعضاء الموثوقين وبقية الرسائل
+        self.trusted_messages = 0
+        self.trusted_seconds = 0.0
+        self.full_messages = 0
+        self.full_seconds = 0.0
+        self._entries: "OrderedDict[MemberKey, MemberReputation]" = OrderedDict()
+        # السجلات المعدلة منذ آخر كتابة، وتبقى هنا ولو خرجت من الذاكرة
+        self._dirty: Dict[MemberKey, MemberReputation] = {}
+        self._stopping: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+    
+    def score(self, chat_id: int, user_id: int, now: Optional[float] = None) -> float:
+        """درجة العضو الحالية بعد التناقص"""
+        entry = self._entries.get((chat_id, user_id))
+        if entry is None:
+            return 0.0
+        return self._decayed(entry, time.time() if now is None else now)
+    
+    def _decayed(self, entry: MemberReputation, now: float) -> float:
+        elapsed = max(now - entry.updated_at, 0.0)
+        return entry.score * 0.5 ** (elapsed / self.half_life)
+    
+    def is_trusted(self, chat_id: int, user_id: int, now: Optional[float] = None) -> bool:
+        """هل تكفي رسائل العضو المراحل الرخيصة"""
+        return self.score(chat_id, user_id, now) >= self.trust_threshold
+    
+    def record(
+        self,
+        chat_id: int,
+        user_id: int,
+        user_name: str,
+        is_spam: bool,
+        now: Optional[float] = None
+    ) -> float:
+        """تحديث سمعة العضو بحكم رسالته، وإرجاع الدرجة الجديدة"""
+        now = time.time() if now is None else now
+        key = (chat_id, user_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._dirty.get(key) or MemberReputation(updated_at=now)
+            self._entries[key] = entry
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        
+        score = self._decayed(entry, now)
+        if is_spam:
+            entry.spam_count += 1
+            entry.last_spam_at = now
+            score = min(score, 0.0) - self.spam_penalty
+        else:
+            entry.clean_count += 1
+            score += 1.0
+        entry.score = score
+        entry.updated_at = now
+        entry.user_name = user_name
+        self._dirty[key] = entry
+        return score
+    
+    def record_detection(self, trusted: bool, seconds: float) -> None:
+        """تسجيل زمن كشف رسالة حسب مسارها"""
+        if trusted:
+            self.trusted_messages += 1
+            self.trusted_seconds += seconds
+        else:
+            self.full_messages += 1
+            self.full_seconds += seconds
+    
+    def load(self, rows: Iterable[UserStatistics]) -> int:
+        """
+        تحميل سجلات user_statistics عند بدء التشغيل
+        
+        Returns:
+            Number of loaded records
+        """
+        for row in rows:
+            self._entries[(row.chat_id, row.user_id)] = MemberReputation(
+                row.user_name or "",
+                row.clean_count or 0,
+                row.spam_count or 0,
+                row.reputation or 0.0,
+                _to_timestamp(row.reputation_at) or 0.0,
+                _to_timestamp(row.last_spam_at),
+            )
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return len(self._entries)
+    
+    @staticmethod
+    def save_rows(db, rows: List[Dict[str, Any]]) -> None:
+        """إدراج السجلات أو تحديثها في معاملة واحدة"""
+        try:
+            statement = insert(UserStatistics)
+            statement = statement.on_conflict_do_update(
+                index_elements=[UserStatistics.chat_id, UserStatistics.user_id],
+                set_={
+                    column: statement.excluded[column]
+                    for column in (
+                        'user_name', 'clean_count', 'spam_count', 'reputation',
+                        'reputation_at', 'last_spam_at', 'updated_at',
+                    )
+                },
+            )
+            db.execute(statement, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    
+    @staticmethod
+    async def _save_with_executor(rows: List[Dict[str, Any]]) -> None:
+        await async_db.run(ReputationTracker.save_rows, rows)
+    
+    async def flush(self) -> int:
+        """كتابة السجلات المعدلة منذ آخر كتابة"""
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, {}
+        updated_at = datetime.utcnow()
+        rows = [
+            {
+                'chat_id': chat_id,
+                'user_id': user_id,
+                'user_name': entry.user_name,
+                'clean_count': entry.clean_count,
+                'spam_count': entry.spam_count,
+                'reputation': entry.score,
+                'reputation_at': _to_datetime(entry.updated_at),
+                'last_spam_at': _to_datetime(entry.last_spam_at),
+                'updated_at': updated_at,
+            }
+            for (chat_id, user_id), entry in dirty.items()
+        ]
+        try:
+            await self.saver(rows)
+            self.rows_written += len(rows)
+        except Exception as e:
+            self.rows_failed += len(rows)
+            logger.error(f"❌ فشل حفظ سمعة {len(rows)} عضو، ستُعاد في الكتابة التالية: {e}")
+            # السجلات التي تعدلت أثناء الكتابة أحدث فتبقى كما هي
+            for key, entry in dirty.items():
+                self._dirty.setdefault(key, entry)
+            return 0
+        return len(rows)
+    
+    async def start(self) -> None:
+        """بدء الكتابة الدورية في حلقة الأحداث الحالية"""
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """إيقاف الكتابة الدورية وكتابة ما بقي"""
+        if self._task is not None:
+            # بدون إلغاء: الدفعة التي بدأت كتابتها لا تضيع
+            self._stopping.set()
+            await self._task
+            self._task = None
+            self._stopping = None
+        await self.flush()
+    
+    async def _run(self) -> None:
+        stopping = self._stopping
+        while not stopping.is_set():
+            try:
+                await asyncio.wait_for(stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get reputation and fast-path statistics"""
+        avg_full = self.full_seconds / self.full_messages if self.full_messages else 0.0
+        avg_trusted = self.trusted_seconds / self.trusted_messages if self.trusted_messages else 0.0
+        # الوقت الذي كانت ستأخذه رسائل الموثوقين بالكشف الكامل
+        saved = max(self.trusted_messages * (avg_full - avg_trusted), 0.0)
+        total = self.full_seconds + self.trusted_seconds + saved
+        return {
+            'members': len(self._entries),
+            'pending_writes': len(self._dirty),
+            'rows_written': self.rows_written,
+            'rows_failed': self.rows_failed,
+            'trusted_messages': self.trusted_messages,
+            'full_messages': self.full_messages,
+            'avg_full_ms': round(avg_full * 1000, 3),
+            'avg_trusted_ms': round(avg_trusted * 1000, 3),
+            'saved_seconds': round(saved, 3),
+            'saved_rate': f"{(saved / total * 100) if total else 0:.2f}%",
+        }
+
+
+# إنشاء نسخة واحدة من المتتبع
+reputation_tracker = ReputationTracker()
@@ -0,0 +1,133 @@
+"""
+مطبّع النصوص بمرور واحد
+Single-Pass Text Normalizer
+"""
+
+import re
+import logging
+from typing import Dict, FrozenSet, List, Sequence, Tuple
+
+from app.services.obfuscation_detector import ObfuscationDetector
+
+logger = logging.getLogger(__name__)
+
+
+def _build_translation_table(char_replacements: Dict[str, List[str]]) -> List[object]:
+    """
+    بناء جدول str.translate مرة واحدة عند التحميل
+    
+    الجدول قائمة تغطي المستوى الأساسي من يونيكود بدلاً من قاموس، لأن
+    translate مع القاموس يرفع استثناء KeyError داخلياً لكل حرف غير موجود.
+    """
+    table: List[object] = list(range(0x10000))
+    
+    # الحركات العربية (U+064B - U+065F)
+    for codepoint in range(0x064B, 0x0660):
+        table[codepoint] = None
+    
+    # التطويل والأحرف غير المرئية
+    for char in '\u0640\u061C\u200B\u200C\u200D\u200E\u200F\u2060\uFEFF':
+        table[ord(char)] = None
+    
+    # الأرقام العربية الهندية والفارسية
+    for digit in range(10):
+        table[0x0660 + digit] = str(digit)
+        table[0x06F0 + digit] = str(digit)
+    
+    # الأحرف البديلة: تُوحّد فقط الأحرف الخارجة عن الأبجدية الأساسية،
+    # فالأحرف مثل ة و م حروف حقيقية في الكلمات المفتاحية ولا يجوز استبدالها
+    variant_targets: Dict[str, set] = {}
+    for canonical, variants in char_replacements.items():
+        for variant in variants:
+            variant_targets.setdefault(variant, set()).add(canonical)
+    for variant, targets in variant_targets.items():
+        if len(targets) != 1 or variant.isascii() or '\u0621' <= variant <= '\u064A':
+            continue
+        table[ord(variant)] = targets.pop()
+    
+    # الأحرف اللاتينية الكبيرة
+    for codepoint in range(ord('A'), ord('Z') + 1):
+        table[codepoint] = chr(codepoint + 32)
+    
+    return table
+
+
+class TextNormalizer:
+    """مطبّع نصوص يعمل بجدول ترجمة محسوب مسبقاً"""
+    
+    # نفس الأحرف البديلة المستخدمة في محرك الكشف
+    CHAR_REPLACEMENTS = {
+        'ا': ['ا', 'آ', 'أ', 'ى'],
+        'ه': ['ه', 'ة', 'ۀ'],
+        'ي': ['ي', 'ى', 'ئ'],
+        'س': ['س', 'ص', 'ث', 'ڰ'],
+        'ع': ['ع', 'غ'],
+        'ح': ['ح', 'خ'],
+        'ط': ['ط', 'ض'],
+        'ق': ['ق', 'غ'],
+        'ن': ['ن', 'م'],
+        'ل': ['ل', 'ا'],
+        'r': ['r', 'ر'],
+        'o': ['o', 'ه', 'ۆ'],
+    }
+    
+    TRANSLATION_TABLE = _build_translation_table(CHAR_REPLACEMENTS)
+    
+    # فاصل بين حرفين عربيين. النمط يبدأ بالفاصل نفسه ليقفز محرك التعابير
+    # بسرعة فوق النص العادي، والحرف السابق يُفحص بنظرة للخلف.
+    # ملاحظة: [\.-_] مدى من '.' إلى '_' لا يشمل الشرطة، لذلك تبقى الشرطة في النص
+    SEPARATOR_PATTERN = re.compile(r'[\.-_](?<=[ا-ي].)[\.-_]*(?=[ا-ي])')
+    
+    @staticmethod
+    def normalize(text: str) -> Tuple[str, FrozenSet[str]]:
+        """
+        تطبيع النص مع جمع إشارات التمويه
+        
+        العودة:
+            (النص المطبّع, أنواع التمويه المكتشفة)
+        """
+        # مرور واحد: الحركات، التطويل، الأحرف غير المرئية، الأرقام، الأحرف البديلة
+        text = text.translate(TextNormalizer.TRANSLATION_TABLE)
+        
+        # الإشارات تُجمع بعد إزالة الحركات حتى لا تخفي الحركة فاصلاً بين حرفين
+        signals = frozenset(ObfuscationDetector.scan(text))
+        
+        # إزالة الفواصل بين الأحرف
+        text = TextNormalizer.SEPARATOR_PATTERN.sub('', text)
+        
+        # تطبيع المسافات
+        text = ' '.join(text.split())
+        
+        return text, signals
+    
+    # فاصل الرسائل في التطبيع المجمّع: لا يغيره جدول الترجمة ولا نمط الفواصل
+    # ولا split، ولا يمكن أن يكون جزءاً من فاصل بين حرفين عربيين
+    BATCH_SEPARATOR = '\x00'
+    
+    @staticmethod
+    def normalize_many(texts: Sequence[str]) -> List[Tuple[str, FrozenSet[str]]]:
+        """
+        تطبيع عدة نصوص بنفس نتيجة normalize لكل نص
+        
+        الترجمة وإزالة الفواصل تعمل على النصوص مجمّعة في سلسلة واحدة، فتنخفض
+        تكلفة الاستدعاء لكل رسالة، بينما تُجمع إشارات التمويه لكل نص على حدة.
+        """
+        separator = TextNormalizer.BATCH_SEPARATOR
+        if not texts:
+            return []
+        if any(separator in text for text in texts):
+            return [TextNormalizer.normalize(text) for text in texts]
+        
+        translated = separator.join(texts).translate(TextNormalizer.TRANSLATION_TABLE)
+        parts = translated.split(separator)
+        signals = [frozenset(ObfuscationDetector.scan(part)) for part in parts]
+        
+        joined = TextNormalizer.SEPARATOR_PATTERN.sub('', translated)
+        return [
+            (' '.join(part.split()), part_signals)
+            for part, part_signals in zip(joined.split(separator), signals)
+        ]
+
+
+# إنشاء نسخة واحدة من المطبّع
+text_normalizer = TextNormalizer()
@@ -0,0 +1,66 @@
+"""
+ذاكرة أحكام الكشف حسب بصمة المحتوى
+Content-Fingerprint Verdict Cache
+"""
+
+import re
+import logging
+import hashlib
+
+from app.config import CACHE_CONFIG
+from app.services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+
+class VerdictCache(CacheService):
+    """
+    ذاكرة LRU محدودة الحجم والعمر لأحكام الكشف
+    
+    حملات الإعلانات تكرر نفس النص مع تغيير رقم الهاتف أو الرابط فقط، لذلك
+    تُستبدل الروابط والأرقام في النص المطبّع بعلامات ثابتة، وتُحفظ بصمة
+    القالب الناتج مع حكم أول نسخة منه.
+    """
+    
+    # روابط، ثم أرقام هواتف، ثم أي أرقام أخرى. النظرة الأمامية في البداية
+    # تجعل محرك التعابير يقفز فوق الأحرف التي لا يمكن أن تبدأ بها أي حالة
+    MASK_PATTERN = re.compile(
+        r'(?=[\d+hwt])(?:'
+        r'(?P<url>(?:https?://|www\.|t\.me/)\S+)'
+        r'|(?P<phone>\+?966\d{9}|05\d{8}|\+?\d{10,})'
+        r'|(?P<num>\d+))'
+    )
+    
+    PLACEHOLDERS = {'url': '<url>', 'phone': '<phone>', 'num': '<num>'}
+    
+    def __init__(
+        self,
+        max_size: int = CACHE_CONFIG['verdict_max_size'],
+        ttl: float = CACHE_CONFIG['verdict_ttl']
+    ):
+        """
+        Initialize verdict cache
+        
+        Args:
+            max_size: Maximum number of verdicts kept
+            ttl: Seconds a verdict stays valid
+        """
+        super().__init__(ttl=ttl, max_size=max_size)
+    
+    @staticmethod
+    def mask(normalized_text: str) -> str:
+        """استبدال الروابط والهواتف والأرقام بعلامات ثابتة"""
+        placeholders = VerdictCache.PLACEHOLDERS
+        return VerdictCache.MASK_PATTERN.sub(
+            lambda match: placeholders[match.lastgroup], normalized_text
+        )
+    
+    @staticmethod
+    def hash_template(template: str) -> bytes:
+        """بصمة قالب مخفي مسبقاً"""
+        return hashlib.blake2b(template.encode('utf-8'), digest_size=16).digest()
+    
+    @staticmethod
+    def fingerprint(normalized_text: str) -> bytes:
+        """بصمة قالب الرسالة بعد الإخفاء"""
+        return VerdictCache.hash_template(VerdictCache.mask(normalized_text))
@@ -0,0 +1,152 @@
+"""
+استقبال تحديثات تلقرام عبر Webhook بدلاً من السحب الدوري
+Webhook Update Ingestion Served by FastAPI/uvicorn
+"""
+
+import hmac
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from telegram import Update
+from telegram.ext import Application
+
+from app.config import WEBHOOK_CONFIG
+from app.services.chat_dispatcher import chat_dispatcher
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+# (التحديث بعد فك JSON، نصه الخام) -> False إذا لم يوجد مكان له الآن
+UpdateSink = Callable[[Dict[str, Any], bytes], Awaitable[bool]]
+
+# الحقول التي تحمل القروب مباشرة في التحديث
+CHAT_FIELDS = (
+    'message', 'edited_message', 'channel_post', 'edited_channel_post',
+    'my_chat_member', 'chat_member', 'chat_join_request',
+)
+
+
+def update_chat_id(data: Dict[str, Any]) -> int:
+    """معرف القروب في التحديث الخام (0 إذا لم يكن له قروب)"""
+    for field in CHAT_FIELDS:
+        payload = data.get(field)
+        if payload and 'chat' in payload:
+            return payload['chat'].get('id', 0)
+    callback = data.get('callback_query')
+    if callback and callback.get('message'):
+        return callback['message']['chat'].get('id', 0)
+    return 0
+
+
+def create_webhook_app(
+    sink: UpdateSink,
+    secret_token: str,
+    path: str = WEBHOOK_CONFIG['path'],
+    retry_after: int = WEBHOOK_CONFIG['retry_after']
+) -> FastAPI:
+    """
+    تطبيق FastAPI بنقطة واحدة يرسل إليها تلقرام التحديثات
+    
+    الطلب بدون الرمز السري الصحيح يُرفض بـ 403. إذا لم يجد sink مكاناً للتحديث
+    يُرد 503 مع Retry-After، فيعيد تلقرام إرساله لاحقاً بدلاً من أن يتراكم في
+    الذاكرة.
+    """
+    app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+    expected = secret_token.encode()
+    
+    @app.post(path)
+    async def receive_update(request: Request) -> Response:
+        received = request.headers.get(SECRET_HEADER, '').encode()
+        if not hmac.compare_digest(received, expected):
+            return Response(status_code=403)
+        
+        body = await request.body()
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return Response(status_code=400)
+        if not isinstance(data, dict):
+            return Response(status_code=400)
+        
+        if not await sink(data, body):
+            return Response(status_code=503, headers={'Retry-After': str(retry_after)})
+        return Response(status_code=200)
+    
+    return app
+
+
+def application_sink(
+    application: Application,
+    max_queued: int = WEBHOOK_CONFIG['max_queued_updates']
+) -> UpdateSink:
+    """إدخال التحديثات في طابور التطبيق، ما لم يمتلئ هو أو موزع القروبات"""
+    
+    async def sink(data: Dict[str, Any], body: bytes) -> bool:
+        if application.update_queue.qsize() >= max_queued or chat_dispatcher.full:
+            return False
+        await application.update_queue.put(Update.de_json(data, application.bot))
+        return True
+    
+    return sink
+
+
+async def run_application(application: Application, serve: Callable[[], Awaitable[None]]) -> None:
+    """
+    تشغيل التطبيق بنفس ترتيب run_polling مع serve بدلاً من السحب
+    
+    initialize -> post_init -> start -> serve() -> stop -> post_stop
+    -> shutdown -> post_shutdown
+    """
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        try:
+            await serve()
+        finally:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+async def serve_webhook(
+    application: Application,
+    webhook_url: str,
+    secret_token: str,
+    host: str = WEBHOOK_CONFIG['host'],
+    port: int = WEBHOOK_CONFIG['port'],
+    path: str = WEBHOOK_CONFIG['path']
+) -> None:
+    """
+    تشغيل البوت بوضع Webhook حتى Ctrl+C
+    
+    Args:
+        application: Application with handlers registered
+        webhook_url: Public base URL Telegram can reach (path is appended)
+        secret_token: Sent by Telegram in every request
+        host: Interface to listen on
+        port: Port to listen on
+        path: URL path of the endpoint
+    """
+    app = create_webhook_app(application_sink(application), secret_token, path)
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level='warning'))
+    
+    async def serve() -> None:
+        await set_webhook(application.bot, webhook_url, secret_token, path)
+        await server.serve()
+    
+    await run_application(application, serve)
+
+
+async def set_webhook(bot, webhook_url: str, secret_token: str, path: str) -> None:
+    """تسجيل عنوان Webhook والرمز السري لدى تلقرام"""
+    url = webhook_url.rstrip('/') + path
+    await bot.set_webhook(url=url, secret_token=secret_token, allowed_updates=Update.ALL_TYPES)
+    logger.info(f"✅ تم تسجيل Webhook على {url}")
+
@@ -0,0 +1,304 @@
+"""
+كتابة سجلات الإشراف المؤجلة على دفعات
+Write-Behind Batched Persistence for Moderation Records
+"""
+
+import json
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from app.config import DATABASE_CONFIG
+from app.models.init_db import ActivityLog, DeletedMessage, SuspiciousUsername
+from app.services.async_database import async_db
+
+logger = logging.getLogger(__name__)
+
+# (الجدول، قيم الصف)
+Record = Tuple[Any, Dict[str, Any]]
+
+
+class WriteBehindBuffer:
+    """
+    طابور محدود لسجلات DeletedMessage و ActivityLog و SuspiciousUsername
+    
+    السجلات تُكتب كل interval_ms أو كل batch_rows صف، أيهما أسبق، بإدراج
+    مجمّع في معاملة واحدة بدلاً من commit لكل سجل. عند امتلاء الطابور
+    تنتظر المعالجات حتى تُفرغ الكتابة مكاناً له.
+    
+    الدفعة التي تفشل كتابتها تعود إلى مقدمة الطابور وتُعاد بعد مهلة تتضاعف
+    مع كل فشل، ولا تُسقط صفوفها إلا إذا تجاوز مجموع المعاد والمنتظر حد
+    الطابور، فيُسقط الأقدم أولاً.
+    """
+    
+    def __init__(
+        self,
+        interval_ms: int = DATABASE_CONFIG['write_behind_interval_ms'],
+        batch_rows: int = DATABASE_CONFIG['write_behind_batch_rows'],
+        queue_size: int = DATABASE_CONFIG['write_behind_queue_size'],
+        retry_ms: int = DATABASE_CONFIG['write_behind_retry_ms'],
+        max_retry_ms: int = DATABASE_CONFIG['write_behind_max_retry_ms'],
+        writer: Optional[Callable[[Dict[Any, List[Dict[str, Any]]]], Awaitable[None]]] = None
+    ):
+        """
+        Initialize buffer
+        
+        Args:
+            interval_ms: Maximum milliseconds a record waits before being written
+            batch_rows: Maximum rows per transaction
+            queue_size: Queued rows before put() waits
+            retry_ms: Delay before retrying a failed batch, doubled per failure
+            max_retry_ms: Maximum delay between retries
+            writer: Writes {model: rows} in one transaction (default: async_db)
+        """
+        self.interval = interval_ms / 1000
+        self.batch_rows = batch_rows
+        self.queue_size = queue_size
+        self.retry_delay = retry_ms / 1000
+        self.max_retry_delay = max_retry_ms / 1000
+        self.writer = writer or WriteBehindBuffer._write_with_executor
+        self.flushes = 0
+        self.retries = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        # صفوف دفعات فشلت كتابتها، من الأقدم إلى الأحدث، تسبق ما في الطابور
+        self._retry: List[Record] = []
+        self._delay = self.retry_delay
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+    
+    @staticmethod
+    def insert_rows(db, grouped_rows: Dict[Any, List[Dict[str, Any]]]) -> None:
+        """إدراج صفوف كل جدول دفعة واحدة ثم commit واحد"""
+        try:
+            for model, rows in grouped_rows.items():
+                db.execute(insert(model), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    
+    @staticmethod
+    async def _write_with_executor(grouped_rows: Dict[Any, List[Dict[str, Any]]]) -> None:
+        await async_db.run(WriteBehindBuffer.insert_rows, grouped_rows)
+    
+    async def start(self) -> None:
+        """بدء مهمة الكتابة في حلقة الأحداث الحالية"""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """إيقاف مهمة الكتابة وكتابة كل ما بقي في الطابور"""
+        if self._task is None:
+            return
+        # علامة الإيقاف تصل بعد السجلات التي سبقتها، فتُكتب هذه السجلات أولاً،
+        # والدفعات الفاشلة لا تنتظر مهلة الإعادة أثناء الإيقاف
+        self._stopping.set()
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        
+        remaining = self._retry + [record for record in self._drain() if record is not None]
+        self._retry = []
+        self._queue = None
+        self._stopping = None
+        # محاولة أخيرة، وما يفشل بعدها لا يمكن الاحتفاظ به
+        for start in range(0, len(remaining), self.batch_rows):
+            batch = remaining[start:start + self.batch_rows]
+            if not await self._flush(batch):
+                self._drop(batch)
+    
+    def _drain(self) -> List[Optional[Record]]:
+        records = []
+        while not self._queue.empty():
+            records.append(self._queue.get_nowait())
+        return records
+    
+    async def put(self, model: Any, values: Dict[str, Any]) -> None:
+        """إضافة سجل إلى الطابور، والانتظار إذا كان ممتلئاً"""
+        if self._queue is None:
+            # الطابور لا يعمل (قبل التشغيل أو بعد الإيقاف): كتابة فورية
+            batch = [(model, values)]
+            if not await self._flush(batch):
+                self._drop(batch)
+            return
+        await self._queue.put((model, values))
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            if self._retry and not self._stopping.is_set():
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self._delay)
+                except asyncio.TimeoutError:
+                    await self._flush_retry()
+                    continue
+            
+            record = await queue.get()
+            if record is None:
+                return
+            
+            batch = [record]
+            deadline = loop.time() + self.interval
+            stopping = False
+            while len(batch) < self.batch_rows:
+                try:
+                    record = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        record = await asyncio.wait_for(queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            
+            if not await self._flush(batch):
+                self._requeue(batch, front=False)
+            if stopping:
+                return
+    
+    async def _flush_retry(self) -> None:
+        """إعادة كتابة أقدم الصفوف الفاشلة"""
+        batch = self._retry[:self.batch_rows]
+        del self._retry[:self.batch_rows]
+        self.retries += 1
+        if await self._flush(batch):
+            self._delay = self.retry_delay
+        else:
+            self._requeue(batch, front=True)
+    
+    def _requeue(self, batch: List[Record], front: bool) -> None:
+        """
+        إعادة دفعة فاشلة قبل ما في الطابور
+        
+        front: الدفعة من الصفوف المعادة نفسها فتعود قبلها، وإلا فهي أحدث منها
+        """
+        if not self._retry:
+            self._delay = self.retry_delay
+        elif front:
+            self._delay = min(self._delay * 2, self.max_retry_delay)
+        
+        if front:
+            self._retry[:0] = batch
+        else:
+            self._retry.extend(batch)
+        
+        overflow = len(self._retry) + self._queue.qsize() - self.queue_size
+        if overflow > 0:
+            self._drop(self._retry[:overflow])
+            del self._retry[:overflow]
+    
+    def _drop(self, batch: List[Record]) -> None:
+        self.rows_failed += len(batch)
+        logger.error(f"❌ إسقاط {len(batch)} سجل تعذرت كتابته")
+    
+    async def _flush(self, batch: List[Record]) -> bool:
+        """كتابة دفعة في معاملة واحدة، وإرجاع False إذا فشلت"""
+        grouped_rows: Dict[Any, List[Dict[str, Any]]] = {}
+        for model, values in batch:
+            grouped_rows.setdefault(model, []).append(values)
+        
+        try:
+            await self.writer(grouped_rows)
+        except Exception as e:
+            logger.error(f"❌ خطأ في كتابة {len(batch)} سجل: {e}")
+            return False
+        
+        self.flushes += 1
+        self.rows_written += len(batch)
+        return True
+    
+    async def log_deleted_message(
+        self,
+        chat_id: int,
+        message_id: int,
+        user_id: int,
+        user_name: str,
+        message_text: str,
+        keywords: list,
+        confidence: float
+    ) -> None:
+        """تسجيل رسالة محذوفة (نفس حقول DatabaseService.log_deleted_message)"""
+        await self.put(DeletedMessage, {
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'user_id': user_id,
+            'user_name': user_name,
+            'message_text': message_text[:500],  # أول 500 حرف فقط
+            'detected_keywords': json.dumps(keywords),
+            'confidence_score': confidence,
+            'deleted_at': datetime.utcnow(),
+        })
+    
+    async def log_activity(
+        self,
+        chat_id: int,
+        action: str,
+        user_id: int = None,
+        user_name: str = "",
+        details: str = ""
+    ) -> None:
+        """تسجيل نشاط"""
+        # جدول activity_logs لا يحتوي عمود اسم المستخدم
+        await self.put(ActivityLog, {
+            'chat_id': chat_id,
+            'action': action,
+            'user_id': user_id,
+            'details': details,
+            'timestamp': datetime.utcnow(),
+        })
+    
+    async def save_suspicious_username(
+        self,
+        chat_id: int,
+        user_id: int,
+        username: str,
+        risk_score: float,
+        reason: str
+    ) -> None:
+        """حفظ اسم مستخدم مشبوه"""
+        now = datetime.utcnow()
+        await self.put(SuspiciousUsername, {
+            'chat_id': chat_id,
+            'user_id': user_id,
+            'username': username,
+            'risk_score': risk_score,
+            'reason': reason,
+            'is_limited': False,
+            'created_at': now,
+            'updated_at': now,
+        })
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get buffer statistics"""
+        return {
+            'running': self.running,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'retrying': len(self._retry),
+            'queue_size': self.queue_size,
+            'flushes': self.flushes,
+            'retries': self.retries,
+            'rows_written': self.rows_written,
+            'rows_failed': self.rows_failed,
+        }
+
+
+# إنشاء نسخة واحدة من الطابور
+write_behind = WriteBehindBuffer()
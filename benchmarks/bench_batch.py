@@ -0,0 +1,64 @@
+"""
+قياس أداء الكشف المجمّع مقارنة بالكشف رسالة رسالة
+Batch Detection Benchmark
+
+الاستخدام:
+    python benchmarks/bench_batch.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.chat_detector_registry import chat_detector_registry
+from app.services.detection import OptimizedDetectionEngine
+from benchmarks.bench_pipeline import build_corpus
+
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+
+
+def per_message(corpus: list) -> float:
+    OptimizedDetectionEngine.get_verdict_cache().clear()
+    started = time.perf_counter()
+    results = [OptimizedDetectionEngine.detect_spam(message, 1, 1, 0.7) for message in corpus]
+    elapsed = time.perf_counter() - started
+    per_message.results = results
+    return elapsed / len(corpus) * 1e6
+
+
+def batched(corpus: list, batch_size: int) -> float:
+    OptimizedDetectionEngine.get_verdict_cache().clear()
+    started = time.perf_counter()
+    results = []
+    for offset in range(0, len(corpus), batch_size):
+        results.extend(
+            OptimizedDetectionEngine.detect_many(corpus[offset:offset + batch_size], 0.7, 1)
+        )
+    elapsed = time.perf_counter() - started
+    batched.results = results
+    return elapsed / len(corpus) * 1e6
+
+
+def main():
+    # بدون قاعدة بيانات: لا كلمات مخصصة للقروب
+    chat_detector_registry.loader = lambda chat_id: []
+    corpus = build_corpus(1) * 2
+    per_message(corpus)
+    
+    baseline = per_message(corpus)
+    print(f"{len(corpus)} رسالة")
+    print(f"  detect_spam:              {baseline:8.1f} µs/رسالة")
+    
+    for batch_size in BATCH_SIZES:
+        elapsed = batched(corpus, batch_size)
+        matches = batched.results == per_message.results
+        print(
+            f"  detect_many ({batch_size:>5}):     {elapsed:8.1f} µs/رسالة"
+            f"  ({baseline / elapsed:.2f}x، مطابق: {matches})"
+        )
+
+
+if __name__ == '__main__':
+    main()
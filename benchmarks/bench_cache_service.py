@@ -0,0 +1,119 @@
+"""
+قياس CacheService المحدودة مقارنة بالقاموس غير المحدود السابق
+Bounded CacheService Benchmark
+
+سيل من المفاتيح الجديدة مع قراءات متكررة لمفاتيح حديثة، بوقت مزيف يتقدم
+مع كل كتابة. التنفيذ السابق (منسوخ هنا كما كان) يحتاج cleanup_expired دورياً
+يمر على كل القيم، والجديد يحذف المنتهية من عجلة المؤقتات أثناء الكتابة.
+
+الاستخدام:
+    python benchmarks/bench_cache_service.py
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.cache_service import CacheService
+
+OPERATIONS = 200000
+TTL = 60.0
+MAX_SIZE = 10000
+STEP = 0.002  # ثوانٍ مزيفة بين كل كتابة وأخرى
+CLEANUP_EVERY = 1000  # كتابات بين كل cleanup_expired في التنفيذ السابق
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+class LegacyCacheService:
+    """التنفيذ السابق: قاموس لكل قيمة وحذف بالمرور على الكل"""
+    
+    def __init__(self, ttl: float, clock: Clock):
+        self.cache = {}
+        self.ttl = ttl
+        self.clock = clock
+    
+    def get(self, key):
+        if key not in self.cache:
+            return None
+        entry = self.cache[key]
+        if self.clock() - entry['timestamp'] > self.ttl:
+            del self.cache[key]
+            return None
+        return entry['value']
+    
+    def set(self, key, value):
+        self.cache[key] = {'value': value, 'timestamp': self.clock()}
+    
+    def cleanup_expired(self):
+        current_time = self.clock()
+        expired_keys = [
+            key for key, entry in self.cache.items()
+            if current_time - entry['timestamp'] > self.ttl
+        ]
+        for key in expired_keys:
+            del self.cache[key]
+        return len(expired_keys)
+    
+    def __len__(self):
+        return len(self.cache)
+
+
+def run(legacy: bool, clock: Clock):
+    """تنفيذ السيل، وإرجاع الذاكرة وعدد الإصابات"""
+    rng = random.Random(1)
+    if legacy:
+        cache = LegacyCacheService(TTL, clock)
+    else:
+        cache = CacheService(ttl=TTL, max_size=MAX_SIZE, clock=clock)
+    
+    hits = 0
+    for index in range(OPERATIONS):
+        clock.now += STEP
+        # قراءة مفتاح حديث ثم كتابة مفتاح جديد
+        if cache.get(index - rng.randrange(1, 5000)) is not None:
+            hits += 1
+        cache.set(index, index)
+        if legacy and index % CLEANUP_EVERY == 0:
+            cache.cleanup_expired()
+    return cache, hits
+
+
+def measure(name: str, legacy: bool) -> None:
+    started = time.perf_counter()
+    cache, hits = run(legacy, Clock())
+    elapsed = time.perf_counter() - started
+    
+    # الذاكرة في تشغيل ثانٍ لأن tracemalloc يبطئ التوقيت
+    tracemalloc.start()
+    run(legacy, Clock())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    print(
+        f"  {name:<10} {elapsed:6.3f} s  الحجم النهائي {len(cache):6}  "
+        f"الإصابات {hits:6}  ذروة الذاكرة {peak / 1024 / 1024:6.2f} MB"
+    )
+
+
+def main():
+    print(
+        f"\n{OPERATIONS:,} كتابة، عمر {TTL:g} s، حد الحجم {MAX_SIZE:,}، "
+        f"كتابة كل {STEP * 1000:g} ms\n"
+    )
+    measure("السابق", True)
+    measure("الحالي", False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+قياس تأخر حلقة الأحداث أثناء كشف رسائل طويلة مموهة
+Event-Loop Lag While Detecting Long Obfuscated Messages
+
+رسائل قصيرة من عدة قروبات تصل كل 2 ms، وبينها رسائل مموهة من 4096 حرفاً
+بكلمات جديدة لا توجد في ذاكرة المطابقة الضبابية. يقيس زمن كشف الرسائل
+القصيرة وأقصى تأخر لمؤقت يعمل كل 5 ms، مرة بالكشف في حلقة الأحداث ومرة مع
+إرسال المطابقة الضبابية للرسائل الطويلة إلى عمليات منفصلة.
+
+الاستخدام:
+    python benchmarks/bench_detection_pool.py
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import FEATURES
+from app.services.chat_detector_registry import chat_detector_registry
+from app.services.detection import OptimizedDetectionEngine
+from app.services.detection_pool import DetectionPool
+
+SHORT_MESSAGES = 1000
+LONG_MESSAGES = 10
+LONG_LENGTH = 4096
+TICK = 0.005
+ARRIVAL = 0.002
+
+SHORT_WORDS = 'السلام عليكم كيف حالكم سكليف رسمي واتساب للتواصل اليوم'.split()
+LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+
+
+def long_message(rng: random.Random) -> str:
+    """رسالة مموهة بكلمات عشوائية تتجاوز ذاكرة المطابقة الضبابية"""
+    words = []
+    while sum(len(word) + 1 for word in words) < LONG_LENGTH:
+        word = ''.join(rng.choice(LETTERS) for _ in range(rng.randint(4, 8)))
+        words.append('.'.join(word) if rng.random() < 0.3 else word)
+    return ' '.join(words)[:LONG_LENGTH]
+
+
+async def measure(pool: DetectionPool, seed: int) -> dict:
+    rng = random.Random(seed)
+    lags = []
+    latencies = []
+    done = asyncio.Event()
+    
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + TICK
+            await asyncio.sleep(TICK)
+            lags.append((time.perf_counter() - expected) * 1000)
+    
+    async def short(index: int, arrived: float):
+        text = ' '.join(rng.choice(SHORT_WORDS) for _ in range(rng.randint(3, 12)))
+        await pool.detect_spam(text, index, -1000 - index % 50)
+        # من الوصول: يشمل انتظار الحلقة وهي مشغولة برسالة طويلة
+        latencies.append((time.perf_counter() - arrived) * 1000)
+    
+    ticker_task = asyncio.create_task(ticker())
+    long_every = SHORT_MESSAGES // LONG_MESSAGES
+    tasks = []
+    started = time.perf_counter()
+    for index in range(SHORT_MESSAGES):
+        if index % long_every == 0:
+            tasks.append(asyncio.create_task(pool.detect_spam(long_message(rng), 0, -999)))
+        tasks.append(asyncio.create_task(short(index, time.perf_counter())))
+        await asyncio.sleep(ARRIVAL)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ticker_task
+    
+    lags.sort()
+    latencies.sort()
+    return {
+        'elapsed': elapsed,
+        'short_p99': latencies[int(len(latencies) * 0.99) - 1],
+        'short_max': latencies[-1],
+        'lag_max': lags[-1],
+        'lag_p50': statistics.median(lags),
+    }
+
+
+def report(name: str, result: dict, pool: DetectionPool) -> None:
+    print(
+        f"  {name:<18} المدة {result['elapsed']:5.2f} s  "
+        f"الرسائل القصيرة p99 {result['short_p99']:7.2f} ms أقصى {result['short_max']:7.2f} ms  "
+        f"تأخر الحلقة أقصى {result['lag_max']:7.2f} ms"
+    )
+    if pool.offloaded:
+        print(f"  {'':<18} {pool.get_stats()}")
+
+
+async def main():
+    # بدون قاعدة بيانات: لا كلمات مخصصة للقروب
+    chat_detector_registry.loader = lambda chat_id: []
+    FEATURES['enable_verdict_cache'] = False
+    OptimizedDetectionEngine.build_tables()
+    
+    print(f"\n{SHORT_MESSAGES} رسالة قصيرة و{LONG_MESSAGES} رسائل من {LONG_LENGTH} حرف، "
+          f"{os.cpu_count()} نواة\n")
+    in_loop = DetectionPool(workers=0)
+    report("في حلقة الأحداث", await measure(in_loop, 1), in_loop)
+    
+    FEATURES['enable_detection_process_pool'] = True
+    for timeout in (5.0, 0.5):
+        pool = DetectionPool(workers=2, min_length=1024, timeout=timeout)
+        await pool.start()
+        try:
+            report(f"عمليات (مهلة {timeout} s)", await measure(pool, 1), pool)
+        finally:
+            pool.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+"""
+قياس تأخر حلقة الأحداث أثناء عمليات قاعدة البيانات المتزامنة
+Event-Loop Lag Under Concurrent Database Load
+
+يقيس مؤقت يعمل كل 5 ms مقدار تأخره عن موعده بينما تسجل عدة مهام متزامنة
+رسائل محذوفة، مرة باستدعاء DatabaseService مباشرة ومرة عبر async_db.
+
+الاستخدام:
+    python benchmarks/bench_event_loop.py
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from app.models.init_db import Base, SessionLocal
+from app.services.async_database import AsyncDatabaseService
+from app.services.database_service import DatabaseService
+
+TASKS = 50
+WRITES_PER_TASK = 20
+TICK = 0.005
+
+
+def log_message(db, task: int, index: int) -> None:
+    DatabaseService.log_deleted_message(
+        db, -1000 - task, index, task, "user", "نطلع إجازة مرضية " * 5, ['إجازة'], 0.9
+    )
+
+
+async def sync_worker(task: int) -> None:
+    for index in range(WRITES_PER_TASK):
+        db = SessionLocal()
+        try:
+            log_message(db, task, index)
+        finally:
+            db.close()
+        await asyncio.sleep(0)
+
+
+async def async_worker(async_db: AsyncDatabaseService, task: int) -> None:
+    for index in range(WRITES_PER_TASK):
+        await async_db.run(log_message, task, index)
+
+
+async def measure(workers) -> dict:
+    lags = []
+    done = asyncio.Event()
+    
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + TICK
+            await asyncio.sleep(TICK)
+            lags.append((time.perf_counter() - expected) * 1000)
+    
+    ticker_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*workers)
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ticker_task
+    
+    lags.sort()
+    return {
+        'elapsed': elapsed,
+        'p50': statistics.median(lags),
+        'p99': lags[int(len(lags) * 0.99) - 1] if len(lags) > 1 else lags[-1],
+        'max': lags[-1],
+    }
+
+
+def report(name: str, result: dict) -> None:
+    print(
+        f"  {name:<14} المدة {result['elapsed']:6.2f} s  "
+        f"تأخر الحلقة p50 {result['p50']:7.2f} ms  p99 {result['p99']:7.2f} ms  "
+        f"أقصى {result['max']:7.2f} ms"
+    )
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(
+            f"sqlite:///{os.path.join(directory, 'bench.db')}",
+            connect_args={'check_same_thread': False, 'timeout': 30},
+        )
+        Base.metadata.create_all(engine)
+        SessionLocal.configure(bind=engine)
+        
+        print(f"{TASKS} مهمة × {WRITES_PER_TASK} كتابة، مؤقت كل {TICK * 1000:.0f} ms")
+        report("DatabaseService", await measure([sync_worker(task) for task in range(TASKS)]))
+        
+        async_db = AsyncDatabaseService()
+        try:
+            report("async_db", await measure([async_worker(async_db, task) for task in range(TASKS)]))
+        finally:
+            async_db.shutdown()
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
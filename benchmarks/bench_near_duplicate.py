@@ -0,0 +1,57 @@
+"""
+قياس زمن الاستعلام في فهرس النسخ شبه المكررة
+Near-Duplicate Index Query Benchmark
+
+الاستخدام:
+    python benchmarks/bench_near_duplicate.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.near_duplicate_index import NearDuplicateIndex
+
+QUERIES = 2000
+
+WORDS = (
+    'تضبط سكليف رسمي حتى لو كان الغياب قديم من مستشفيات حكومية إجازات مرضية '
+    'معتمدة وموثقة للتواصل واتساب نستقبل طلباتكم انجاز فوري السلام عليكم كيف '
+    'حالكم اليوم الجو جميل في المدينة نتمنى لكم يوما سعيدا مع تحياتنا'
+).split()
+
+
+def build_message(rng: random.Random) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 40)))
+
+
+def main():
+    rng = random.Random(1)
+    index = NearDuplicateIndex()
+    
+    started = time.perf_counter()
+    while len(index) < index.max_entries:
+        index.add_message(build_message(rng), ['سكليف'])
+    print(f"بناء الفهرس: {len(index)} رسالة في {time.perf_counter() - started:.2f} ث")
+    
+    templates = [index.make_template(build_message(rng)) for _ in range(QUERIES)]
+    timings = []
+    matches = 0
+    for template in templates:
+        started = time.perf_counter()
+        if index.query(template) is not None:
+            matches += 1
+        timings.append((time.perf_counter() - started) * 1e6)
+    
+    timings.sort()
+    print(f"{QUERIES} استعلام ({matches} تطابق):")
+    print(f"  p50: {timings[len(timings) // 2]:8.1f} µs")
+    print(f"  p99: {timings[int(len(timings) * 0.99)]:8.1f} µs")
+    print(f"  max: {timings[-1]:8.1f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+قياس أداء مطبّع النصوص
+Text Normalizer Benchmark
+
+الاستخدام:
+    python benchmarks/bench_normalizer.py
+"""
+
+import os
+import re
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.text_normalizer import TextNormalizer
+
+MESSAGE_LENGTH = 4096
+ITERATIONS = 2000
+
+
+def legacy_normalize(text: str):
+    """المطبّع السابق مع فحص التمويه المنفصل على النص الخام"""
+    text_copy = text
+    text = re.sub(r'[ً-ٟ]', '', text)
+    text = re.sub(r'([ا-ي])[\.-_]+([ا-ي])', r'\1\2', text)
+    text = text.lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    
+    signals = []
+    if re.search(r'[ا-ي]\.[ا-ي]', text_copy):
+        signals.append('dots')
+    if re.search(r'[ا-ي]\s{2,}[ا-ي]', text_copy):
+        signals.append('spaces')
+    if re.search(r'[ا-ي]-[ا-ي]', text_copy):
+        signals.append('dashes')
+    if re.search(r'[ا-ي][_\-\.][ا-ي]', text_copy):
+        signals.append('special_chars')
+    if re.search(r'[؀-ۿ]', text_copy) and re.search(r'[a-z]', text_copy):
+        signals.append('mixed_languages')
+    return text, signals
+
+
+def build_message(seed: int) -> str:
+    """بناء رسالة 4096 حرفاً بحركات وتطويل وفواصل"""
+    rng = random.Random(seed)
+    words = [
+        'إِجَازَة', 'مرضـــية', 'سكليف', 'م.و.ث.ق', 'نستقبل', 'طلباتكم',
+        'واتس', 'للتواصل', '٠٥٥١٢٣٤٥٦٧', 'السلام', 'عليكم', 'HELLO', 'ت-ق-ر-ي-ر',
+        'معتم.د', 'فوري', 'اليوم', 'الجو', 'جميل',
+    ]
+    parts = []
+    length = 0
+    while length < MESSAGE_LENGTH:
+        word = rng.choice(words)
+        separator = rng.choice([' ', ' ', ' ', '  ', '\n'])
+        parts.append(word + separator)
+        length += len(word) + len(separator)
+    return ''.join(parts)[:MESSAGE_LENGTH]
+
+
+def build_plain_message(seed: int) -> str:
+    """بناء رسالة عادية 4096 حرفاً بدون تمويه"""
+    rng = random.Random(seed)
+    words = (
+        'السلام عليكم ورحمة الله وبركاته كيف حالكم اليوم الجو جميل جدا '
+        'في المدينة نتمنى لكم يوما سعيدا مع تحياتنا للجميع'
+    ).split()
+    return ' '.join(rng.choice(words) for _ in range(MESSAGE_LENGTH))[:MESSAGE_LENGTH]
+
+
+def run(name: str, messages: list):
+    legacy = timeit.timeit(
+        lambda: [legacy_normalize(message) for message in messages], number=ITERATIONS
+    )
+    single_pass = timeit.timeit(
+        lambda: [TextNormalizer.normalize(message) for message in messages], number=ITERATIONS
+    )
+    
+    calls = ITERATIONS * len(messages)
+    print(f"{name}: رسائل بطول {MESSAGE_LENGTH} حرف، {calls} استدعاء")
+    print(f"  المطبّع السابق + فحص التمويه: {legacy / calls * 1e6:8.1f} µs/رسالة")
+    print(f"  المطبّع بمرور واحد:           {single_pass / calls * 1e6:8.1f} µs/رسالة")
+    print(f"  التسريع: {legacy / single_pass:.2f}x")
+
+
+def main():
+    run("نص عادي", [build_plain_message(seed) for seed in range(8)])
+    run("نص مموّه", [build_message(seed) for seed in range(8)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+قياس أداء كاشف التمويه
+Obfuscation Detector Benchmark
+
+الاستخدام:
+    python benchmarks/bench_obfuscation.py
+"""
+
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.obfuscation_detector import ObfuscationDetector
+from benchmarks.bench_normalizer import build_message, build_plain_message
+
+ITERATIONS = 2000
+
+
+def legacy_detect_obfuscation(text: str):
+    """الكاشف السابق: خمسة تعابير منتظمة على النص كاملاً"""
+    obfuscation_score = 0.0
+    obfuscation_types = []
+    if re.search(r'[ا-ي]\.[ا-ي]', text):
+        obfuscation_score += 0.2
+        obfuscation_types.append('dots')
+    if re.search(r'[ا-ي]\s{2,}[ا-ي]', text):
+        obfuscation_score += 0.2
+        obfuscation_types.append('spaces')
+    if re.search(r'[ا-ي]-[ا-ي]', text):
+        obfuscation_score += 0.15
+        obfuscation_types.append('dashes')
+    if re.search(r'[ا-ي][_\-\.][ا-ي]', text):
+        obfuscation_score += 0.15
+        obfuscation_types.append('special_chars')
+    if re.search(r'[؀-ۿ]', text) and re.search(r'[a-z]', text):
+        obfuscation_score += 0.1
+        obfuscation_types.append('mixed_languages')
+    return min(obfuscation_score, 1.0), obfuscation_types
+
+
+def run(name: str, messages: list):
+    for message in messages:
+        assert legacy_detect_obfuscation(message) == ObfuscationDetector.detect_obfuscation(message)
+    
+    legacy = timeit.timeit(
+        lambda: [legacy_detect_obfuscation(message) for message in messages], number=ITERATIONS
+    )
+    single_scan = timeit.timeit(
+        lambda: [ObfuscationDetector.detect_obfuscation(message) for message in messages],
+        number=ITERATIONS
+    )
+    
+    calls = ITERATIONS * len(messages)
+    print(f"{name}: {calls} استدعاء")
+    print(f"  خمسة تعابير منتظمة: {legacy / calls * 1e6:8.1f} µs/رسالة")
+    print(f"  مرور واحد:          {single_scan / calls * 1e6:8.1f} µs/رسالة")
+    print(f"  التسريع: {legacy / single_scan:.2f}x")
+
+
+def main():
+    run("نص عادي 4096 حرفاً", [build_plain_message(seed) for seed in range(8)])
+    run("نص مموّه 4096 حرفاً", [build_message(seed) for seed in range(8)])
+    run("رسائل قصيرة", [build_plain_message(seed)[:120] for seed in range(8)])
+
+
+if __name__ == '__main__':
+    main()
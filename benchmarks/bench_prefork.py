@@ -0,0 +1,114 @@
+"""
+اختبار حمل للعمليات المتفرعة: إنتاجية الكشف مع عدد العمليات العاملة
+Prefork Load Test: Detection Throughput vs Worker Processes
+
+العملية الأمامية توزع تحديثات مسجلة من عدة قروبات على العمليات حسب القروب
+(ChatAffinityRouter)، وكل عملية تقرأ تحديثاتها وتشغل الكشف عليها. الجداول
+المترجمة تُبنى قبل التفرع ويُطبق gc.freeze كما في وضع prefork.
+
+الاستخدام:
+    python benchmarks/bench_prefork.py [عدد العمليات ...]
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.chat_detector_registry import chat_detector_registry
+from app.services.detection import OptimizedDetectionEngine
+from app.services.prefork import ChatAffinityRouter, prepare_fork, read_frames, start_workers
+
+UPDATES = 20000
+CHATS = 64
+
+SPAM_WORDS = 'تضبط سكليف رسمي إجازة مرضية موثقة واتساب للتواصل نستقبل انجاز فوري'.split()
+HAM_WORDS = 'السلام عليكم كيف حالكم اليوم الجو جميل في المدينة نتمنى لكم يوما سعيدا'.split()
+
+
+def build_updates(seed: int) -> list:
+    """تحديثات رسائل كما يرسلها تلقرام، 30% منها إعلانات"""
+    rng = random.Random(seed)
+    updates = []
+    for update_id in range(UPDATES):
+        if rng.random() < 0.3:
+            words = [rng.choice(SPAM_WORDS) for _ in range(rng.randint(5, 20))]
+            text = ' '.join(words) + f" 05{rng.randint(10000000, 99999999)}"
+        else:
+            text = ' '.join(rng.choice(HAM_WORDS) for _ in range(rng.randint(3, 30)))
+        chat_id = -1000 - rng.randrange(CHATS)
+        updates.append({'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': 1700000000, 'text': text,
+            'chat': {'id': chat_id, 'type': 'supergroup'},
+            'from': {'id': rng.randrange(10000), 'is_bot': False, 'first_name': 'user'},
+        }})
+    return updates
+
+
+def detect_frames(index, sock, inherited, results):
+    """عملية عاملة: كشف كل رسالة تصلها حتى يُغلق الاتصال"""
+    for other in inherited:
+        other.close()
+    
+    async def run():
+        reader, writer = await asyncio.open_connection(sock=sock)
+        detected = 0
+        async for frame in read_frames(reader):
+            message = json.loads(frame)['message']
+            is_spam, _, _ = OptimizedDetectionEngine.detect_spam(
+                message['text'], message['from']['id'], message['chat']['id']
+            )
+            detected += is_spam
+        writer.close()
+        return detected
+    
+    results.put(asyncio.run(run()))
+
+
+def measure(workers: int, frames: list) -> float:
+    results = multiprocessing.get_context('fork').Queue()
+    processes, sockets = start_workers(workers, detect_frames, results)
+    
+    async def route():
+        router = ChatAffinityRouter(sockets, max_buffer=2**30)
+        await router.connect()
+        for data, body in frames:
+            await router.sink(data, body)
+            # إتاحة الفرصة لإرسال المخزن كما بين طلبات HTTP
+            await asyncio.sleep(0)
+        await router.close()
+    
+    started = time.perf_counter()
+    asyncio.run(route())
+    detected = sum(results.get() for _ in processes)
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+    
+    assert detected > 0
+    return UPDATES / elapsed
+
+
+def main():
+    # بدون قاعدة بيانات: لا كلمات مخصصة للقروب
+    chat_detector_registry.loader = lambda chat_id: []
+    counts = [int(arg) for arg in sys.argv[1:]] or [1, 2, 4]
+    frames = [(update, json.dumps(update).encode()) for update in build_updates(1)]
+    prepare_fork()
+    
+    print(f"\n{UPDATES:,} تحديث من {CHATS} قروب، {os.cpu_count()} نواة\n")
+    baseline = None
+    for workers in counts:
+        throughput = measure(workers, frames)
+        baseline = baseline or throughput / workers  # عملية واحدة تقريباً
+        print(f"  {workers} عملية: {throughput:10,.0f} تحديث/ث "
+              f"({throughput / baseline:4.1f}x من عملية واحدة)")
+
+
+if __name__ == '__main__':
+    main()
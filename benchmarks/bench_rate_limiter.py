@@ -0,0 +1,101 @@
+"""
+قياس أداء محدد معدل الطلبات مع مليون مستخدم مختلف
+Rate Limiter Benchmark with a Million Distinct Users
+
+يقيس زمن الفحص والذاكرة المستخدمة للمحدد السابق (قائمة أوقات لكل مستخدم)
+ولدلو الرموز، مرة بدون حد للمفاتيح ومرة بالحد الافتراضي.
+
+الاستخدام:
+    python benchmarks/bench_rate_limiter.py
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import RATE_LIMIT_CONFIG
+from app.services.rate_limiter import RateLimiter
+
+USERS = 1_000_000
+HOT_USERS = 1000
+HOT_REQUESTS = 200_000
+
+
+class LegacyRateLimiter:
+    """المحدد السابق: قائمة أوقات لكل مستخدم تُبنى من جديد في كل فحص"""
+    
+    def __init__(self, max_requests: int = 10, time_window: int = 60):
+        self.max_requests = max_requests
+        self.time_window = time_window
+        self.requests: Dict[int, list] = defaultdict(list)
+    
+    def is_allowed(self, user_id: int) -> bool:
+        current_time = time.time()
+        self.requests[user_id] = [
+            req_time for req_time in self.requests[user_id]
+            if current_time - req_time < self.time_window
+        ]
+        if len(self.requests[user_id]) >= self.max_requests:
+            return False
+        self.requests[user_id].append(current_time)
+        return True
+
+
+def fill(limiter) -> float:
+    start = time.perf_counter()
+    for user_id in range(USERS):
+        limiter.is_allowed(user_id)
+    return time.perf_counter() - start
+
+
+def measure(name: str, factory) -> None:
+    limiter = factory()
+    distinct = fill(limiter)
+    
+    # مستخدمون نشطون يرسلون بكثافة (أغلب الطلبات بعد امتلاء القائمة أو نفاد الرموز)
+    start = time.perf_counter()
+    for index in range(HOT_REQUESTS):
+        limiter.is_allowed(index % HOT_USERS)
+    hot = time.perf_counter() - start
+    del limiter
+    
+    # الذاكرة في تشغيل منفصل لأن tracemalloc يبطئ الفحص
+    tracemalloc.start()
+    limiter = factory()
+    fill(limiter)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    
+    print(f"  {name}")
+    print(f"    مستخدمون مختلفون: {distinct / USERS * 1e9:8.0f} ns/فحص، "
+          f"الذاكرة {memory / 2**20:7.1f} MB")
+    print(f"    مستخدمون نشطون:  {hot / HOT_REQUESTS * 1e9:8.0f} ns/فحص")
+
+
+def main():
+    max_requests = RATE_LIMIT_CONFIG['message_max_requests']
+    time_window = RATE_LIMIT_CONFIG['message_time_window']
+    
+    print(f"\n{USERS:,} مستخدم مختلف، ثم {HOT_REQUESTS:,} طلب من {HOT_USERS} مستخدم "
+          f"({max_requests} طلب / {time_window} ثانية)\n")
+    measure(
+        "المحدد السابق (قائمة أوقات)",
+        lambda: LegacyRateLimiter(max_requests, time_window),
+    )
+    measure(
+        "دلو الرموز بدون حد للمفاتيح",
+        lambda: RateLimiter(max_requests, time_window, max_keys=USERS),
+    )
+    measure(
+        f"دلو الرموز بحد {RATE_LIMIT_CONFIG['max_tracked_keys']:,} مفتاح",
+        lambda: RateLimiter(max_requests, time_window),
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+قياس وقت الكشف الموفر بالمسار السريع للأعضاء الموثوقين
+Trusted-Member Fast Path Benchmark
+
+محادثة في عدة قروبات: أعضاء قدامى يرسلون أغلب الرسائل العادية، وحسابات
+جديدة ترسل إعلانات. تمر الرسائل بنفس ترتيب معالج الرسائل: حساب الثقة من
+ReputationTracker ثم الكشف ثم تحديث السمعة بالحكم، مرة بدون المسار السريع
+ومرة معه.
+
+الاستخدام:
+    python benchmarks/bench_trusted_fast_path.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import FEATURES
+from app.services.chat_detector_registry import chat_detector_registry
+from app.services.detection import OptimizedDetectionEngine
+from app.services.reputation import ReputationTracker
+
+MESSAGES = 30000
+CHATS = 10
+MEMBERS = 10  # أعضاء قدامى في كل قروب
+
+SPAM_WORDS = 'تضبط سكليف رسمي إجازة مرضية موثقة واتساب للتواصل نستقبل انجاز فوري'.split()
+# بدون "كيف": المطابقة الضبابية تطابقها مع "سكليف" فيفقد العضو ثقته
+HAM_WORDS = 'السلام عليكم حالكم اليوم الجو جميل في المدينة نتمنى لكم يوما سعيدا'.split()
+
+
+def build_conversation(seed: int) -> list:
+    """(القروب، المرسل، النص): 85% رسائل الأعضاء و15% إعلانات من حسابات جديدة"""
+    rng = random.Random(seed)
+    messages = []
+    for index in range(MESSAGES):
+        chat_id = -1000 - rng.randrange(CHATS)
+        if rng.random() < 0.15:
+            words = [rng.choice(SPAM_WORDS) for _ in range(rng.randint(5, 20))]
+            text = ' '.join(words) + f" 05{rng.randint(10000000, 99999999)}"
+            messages.append((chat_id, 100000 + index, text))
+        else:
+            text = ' '.join(rng.choice(HAM_WORDS) for _ in range(rng.randint(3, 30)))
+            messages.append((chat_id, rng.randrange(MEMBERS), text))
+    return messages
+
+
+def run(messages: list, fast_path: bool) -> dict:
+    OptimizedDetectionEngine.get_verdict_cache().clear()
+    tracker = ReputationTracker(trust_threshold=100, saver=lambda rows: None)
+    detected = 0
+    for chat_id, user_id, text in messages:
+        trusted = fast_path and tracker.is_trusted(chat_id, user_id)
+        started = time.perf_counter()
+        verdict = None
+        if trusted:
+            verdict = OptimizedDetectionEngine.trusted_verdict(text, chat_id)
+        if verdict is None:
+            verdict = OptimizedDetectionEngine.detect_spam(text, user_id, chat_id)
+        tracker.record_detection(trusted, time.perf_counter() - started)
+        tracker.record(chat_id, user_id, 'user', verdict[0])
+        detected += verdict[0]
+    stats = tracker.get_stats()
+    stats['detected'] = detected
+    stats['seconds'] = tracker.full_seconds + tracker.trusted_seconds
+    return stats
+
+
+def main():
+    # بدون قاعدة بيانات: لا كلمات مخصصة للقروب
+    chat_detector_registry.loader = lambda chat_id: []
+    FEATURES['enable_verdict_cache'] = True
+    OptimizedDetectionEngine.build_tables()
+    messages = build_conversation(1)
+    
+    print(f"\n{MESSAGES:,} رسالة في {CHATS} قروب\n")
+    for name, fast_path in (("كشف كامل", False), ("مسار الموثوقين", True)):
+        stats = run(messages, fast_path)
+        print(
+            f"  {name:<16} {stats['seconds']:6.2f} s  المحذوفة {stats['detected']:5}  "
+            f"رسائل الموثوقين {stats['trusted_messages']:6}  "
+            f"متوسط {stats['avg_trusted_ms']:6.3f} ms مقابل {stats['avg_full_ms']:6.3f} ms  "
+            f"الموفر {stats['saved_rate']}"
+        )
+
+
+if __name__ == '__main__':
+    main()
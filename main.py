@@ -6,11 +6,15 @@ Telegram Spam Killer Bot - Main Entry Point
 
 import os
 import sys
+import asyncio
 import logging
+import secrets
+from typing import Any, Awaitable, Callable
 from dotenv import load_dotenv
 from telegram.ext import (
-    Application, CommandHandler, MessageHandler as TgMessageHandler, filters
+    Application, ChatMemberHandler, CommandHandler, MessageHandler as TgMessageHandler, filters
 )
+from telegram import Update
 
 # استيراد المعالجات والخدمات
 from app.handlers.message_handler import MessageHandler
@@ -18,6 +22,17 @@ from app.handlers.admin_handler import AdminHandler, AdvancedFeatures
 from app.handlers.cleanup_handler import ImprovedCleanupHandler
 from app.utils.commands import CommandRegistry
 from app.models.init_db import init_db, SessionLocal
+from app.services.database_service import DatabaseService
+from app.services.near_duplicate_index import near_duplicate_index
+from app.services.membership_index import BLACKLIST, WHITELIST, membership_index
+from app.services.async_database import async_db
+from app.services.write_behind import write_behind
+from app.services.chat_dispatcher import chat_dispatcher
+from app.services.outbound_scheduler import outbound
+from app.services.notification_digest import notification_digest
+from app.services.reputation import reputation_tracker
+from app.services.detection_pool import detection_pool
+from app.config import WEBHOOK_CONFIG
 
 # إعداد السجلات
 logging.basicConfig(
@@ -30,23 +45,89 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 
+async def _start_service(name: str, start: Callable[[], Awaitable[None]]) -> None:
+    """بدء خدمة واحدة؛ الخدمة التي لم تبدأ تعمل بشكل مباشر بدون طابورها"""
+    try:
+        await start()
+    except Exception as e:
+        logger.error(f"❌ تعذر بدء {name}: {e}")
+
+
+def _load_index(name: str, load: Callable[[Any], int]) -> None:
+    """تحميل فهرس واحد من قاعدة البيانات؛ فشله يترك الفهرس فارغاً"""
+    db = SessionLocal()
+    try:
+        loaded = load(db)
+        logger.info(f"✅ تم تحميل {loaded} سجل في {name}")
+    except Exception as e:
+        logger.error(f"❌ تعذر تحميل {name}: {e}")
+    finally:
+        db.close()
+
+
 async def post_init(application: Application) -> None:
-    """تهيئة البوت بعد الإنشاء"""
+    """تهيئة البوت بعد الإنشاء، وكل خطوة مستقلة حتى لا يوقف فشلها ما بعدها"""
+    # تسجيل الأوامر في تلقرام
     try:
-        # تسجيل الأوامر في تلقرام
         commands = CommandRegistry.get_all_bot_commands()
         await application.bot.set_my_commands(commands)
         logger.info(f"✅ تم تسجيل {len(commands)} أمر بنجاح")
-        
-        # طباعة رسالة البدء
-        print("\n" + "="*70)
-        print("✅ البوت جاهز للاستخدام!")
-        print("="*70)
-        print("\n💡 اكتب / في القروب لرؤية جميع الأوامر المتاحة\n")
-        
     except Exception as e:
-        logger.error(f"❌ خطأ في تهيئة البوت: {e}")
-        print(f"❌ خطأ في التهيئة: {e}")
+        logger.error(f"❌ تعذر تسجيل الأوامر: {e}")
+    
+    # بدء كتابة سجلات الإشراف على دفعات
+    await _start_service("كتابة السجلات على دفعات", write_behind.start)
+    
+    # بدء جدولة طلبات تلقرام الصادرة ثم عمال معالجة الرسائل لكل قروب
+    await _start_service("جدولة الطلبات الصادرة", outbound.start)
+    await _start_service("موزع رسائل القروبات", chat_dispatcher.start)
+    
+    # ملخص إشعارات الإعلانات المحذوفة لكل قروب
+    await _start_service("ملخص الإشعارات", notification_digest.start)
+    
+    # عمليات المطابقة الضبابية للرسائل الطويلة (إذا كانت مفعلة)
+    await _start_service("عمليات المطابقة الضبابية", detection_pool.start)
+    
+    # تحميل القائمتين البيضاء والسوداء في فهرس العضوية
+    _load_index("فهرس القائمتين البيضاء والسوداء", lambda db: membership_index.load(
+        DatabaseService.stream_list_members(db, WHITELIST),
+        DatabaseService.stream_list_members(db, BLACKLIST),
+    ))
+    
+    # تحميل الإعلانات المحذوفة مؤخراً في فهرس النسخ المكررة
+    _load_index("فهرس النسخ المكررة", lambda db: near_duplicate_index.load_deleted_messages(
+        DatabaseService.get_recent_deleted_messages(
+            db, int(near_duplicate_index.ttl), near_duplicate_index.max_entries
+        )
+    ))
+    
+    # تحميل سمعة الأعضاء وبدء حفظها على دفعات
+    _load_index("سمعة الأعضاء", lambda db: reputation_tracker.load(
+        DatabaseService.get_recent_user_statistics(db, reputation_tracker.max_entries)
+    ))
+    await _start_service("حفظ سمعة الأعضاء", reputation_tracker.start)
+    
+    # طباعة رسالة البدء
+    print("\n" + "="*70)
+    print("✅ البوت جاهز للاستخدام!")
+    print("="*70)
+    print("\n💡 اكتب / في القروب لرؤية جميع الأوامر المتاحة\n")
+
+
+async def post_stop(application: Application) -> None:
+    """معالجة الرسائل المنتظرة وإرسال طلباتها قبل إغلاق اتصال البوت"""
+    await chat_dispatcher.stop()
+    await MessageHandler.wait_for_background_tasks()
+    await notification_digest.stop()
+    await outbound.stop()
+
+
+async def post_shutdown(application: Application) -> None:
+    """كتابة السجلات المتبقية ثم إيقاف منفذي قاعدة البيانات والكشف"""
+    await write_behind.stop()
+    await reputation_tracker.stop()
+    async_db.shutdown()
+    detection_pool.shutdown()
 
 
 def setup_handlers(application: Application):
@@ -57,6 +138,11 @@ def setup_handlers(application: Application):
     admin_handler = AdminHandler()
     advanced_features = AdvancedFeatures()
     
+    # ===== حد الأوامر (يعمل قبل كل معالجات الأوامر) =====
+    application.add_handler(
+        TgMessageHandler(filters.COMMAND, message_handler.limit_commands), group=-1
+    )
+    
     # ===== الأوامر العامة =====
     application.add_handler(CommandHandler("start", message_handler.start))
     application.add_handler(CommandHandler("help", message_handler.help_command))
@@ -79,19 +165,74 @@ def setup_handlers(application: Application):
     
     # ===== أوامر التنظيف =====
     cleanup_handler = ImprovedCleanupHandler()
-    application.add_handler(CommandHandler("cleanup_old", cleanup_handler.cleanup_old_messages))
-    application.add_handler(CommandHandler("cleanup_user", cleanup_handler.cleanup_user_messages))
+    # block=False: حذف التنظيف في آخر مسار، فلا ينتظره استلام الرسائل الجديدة
+    application.add_handler(
+        CommandHandler("cleanup_old", cleanup_handler.cleanup_old_messages, block=False)
+    )
+    application.add_handler(
+        CommandHandler("cleanup_user", cleanup_handler.cleanup_user_messages, block=False)
+    )
     application.add_handler(CommandHandler("archive", cleanup_handler.archive_summary))
     
+    # ===== تحديث قائمة المسؤولين من تغييرات العضوية =====
+    application.add_handler(
+        ChatMemberHandler(admin_handler.track_chat_member, ChatMemberHandler.ANY_CHAT_MEMBER)
+    )
+    
     # ===== معالج الرسائل العام =====
     application.add_handler(
         TgMessageHandler(
             filters.TEXT & ~filters.COMMAND,
-            message_handler.handle_message
+            message_handler.dispatch_message
         )
     )
 
 
+def build_application(token: str) -> Application:
+    """إنشاء التطبيق مع كل المعالجات"""
+    application = (
+        Application.builder()
+        .token(token)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    setup_handlers(application)
+    return application
+
+
+def run_webhook(token: str, mode: str):
+    """
+    تشغيل البوت بوضع Webhook
+    
+    WEBHOOK_URL: العنوان العام الذي يصل إليه تلقرام (يُضاف إليه المسار)
+    WEBHOOK_SECRET: الرمز السري (يُولد رمز عشوائي إذا لم يوجد)
+    WEBHOOK_PORT: منفذ الخادم
+    WEBHOOK_WORKERS: عدد العمليات في وضع prefork (0 = عدد الأنوية)
+    """
+    # استيراد متأخر: وضع السحب لا يحتاج FastAPI و uvicorn
+    from app.services.webhook import serve_webhook
+    from app.services.prefork import run_prefork
+    
+    webhook_url = os.getenv('WEBHOOK_URL')
+    if not webhook_url:
+        print("❌ خطأ: WEBHOOK_URL مطلوب في وضع Webhook\n")
+        sys.exit(1)
+    secret_token = os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+    port = int(os.getenv('WEBHOOK_PORT', WEBHOOK_CONFIG['port']))
+    
+    if mode == 'prefork':
+        workers = int(os.getenv('WEBHOOK_WORKERS', WEBHOOK_CONFIG['workers']))
+        print(f"✅ البوت يعمل الآن بوضع prefork على المنفذ {port}... اضغط Ctrl+C للإيقاف\n")
+        run_prefork(build_application, token, webhook_url, secret_token, workers, port=port)
+    else:
+        print(f"✅ البوت يعمل الآن بوضع Webhook على المنفذ {port}... اضغط Ctrl+C للإيقاف\n")
+        asyncio.run(serve_webhook(
+            build_application(token), webhook_url, secret_token, port=port
+        ))
+
+
 def main():
     """الدالة الرئيسية"""
     
@@ -124,20 +265,17 @@ def main():
         else:
             print("⚠️ تحذير: قد يكون هناك مشكلة في قاعدة البيانات\n")
         
-        # إنشاء التطبيق
-        application = (
-            Application.builder()
-            .token(token)
-            .post_init(post_init)
-            .build()
-        )
-        
-        # إعداد المعالجات
-        setup_handlers(application)
-        
-        # تشغيل البوت
-        print("✅ البوت يعمل الآن... اضغط Ctrl+C للإيقاف\n")
-        application.run_polling()
+        mode = os.getenv('BOT_MODE', 'polling').lower()
+        if mode == 'polling':
+            # تشغيل البوت
+            print("✅ البوت يعمل الآن... اضغط Ctrl+C للإيقاف\n")
+            # chat_member لا يصل إلا إذا طُلب صراحة
+            build_application(token).run_polling(allowed_updates=Update.ALL_TYPES)
+        elif mode in ('webhook', 'prefork'):
+            run_webhook(token, mode)
+        else:
+            print(f"❌ BOT_MODE غير معروف: {mode} (polling أو webhook أو prefork)\n")
+            sys.exit(1)
     
     except KeyboardInterrupt:
         print("\n" + "="*70)
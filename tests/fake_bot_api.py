@@ -0,0 +1,153 @@
+"""
+خادم Bot API محلي للاختبارات
+Local Fake Bot API Server for Tests
+
+الاستخدام:
+    server = FakeBotAPI()
+    server.start()
+    bot = Bot("123:TEST", base_url=server.base_url)
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+
+class FakeBotAPIError(Exception):
+    """رد خطأ من الخادم (مثل 400 أو 429)"""
+    
+    def __init__(self, error_code: int, description: str, retry_after: Optional[int] = None):
+        super().__init__(description)
+        self.error_code = error_code
+        self.description = description
+        self.retry_after = retry_after
+
+
+class FakeBotAPI:
+    """
+    خادم HTTP يرد على طلبات البوت من دوال api_<method>
+    
+    كل طلب يُسجل في requests كـ (method, params) بعد فك قيم JSON.
+    """
+    
+    def __init__(self):
+        self.requests: List[Tuple[str, Dict[str, Any]]] = []
+        self.missing_messages = set()
+        self.undeletable_messages = set()
+        self.retry_after: List[int] = []
+        # معرف القروب -> قائمة المسؤولين كما يرسلها تلقرام
+        self.administrators: Dict[int, List[Dict[str, Any]]] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+    
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/bot"
+    
+    def start(self) -> None:
+        api = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length).decode()
+                method = self.path.rsplit('/', 1)[-1]
+                status, payload = api.handle(method, api.parse(body, self.headers))
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+    
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    @staticmethod
+    def parse(body: str, headers) -> Dict[str, Any]:
+        if 'json' in headers.get('Content-Type', ''):
+            return json.loads(body or '{}')
+        params = {}
+        for key, value in parse_qsl(body):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
+    
+    def handle(self, method: str, params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        self.requests.append((method, params))
+        try:
+            result = getattr(self, f"api_{method}")(params)
+        except FakeBotAPIError as e:
+            payload = {'ok': False, 'error_code': e.error_code, 'description': e.description}
+            if e.retry_after is not None:
+                payload['parameters'] = {'retry_after': e.retry_after}
+            return e.error_code, payload
+        return 200, {'ok': True, 'result': result}
+    
+    def calls(self, method: str) -> List[Dict[str, Any]]:
+        """معاملات كل طلبات الدالة بترتيب وصولها"""
+        return [params for name, params in self.requests if name == method]
+    
+    def api_getMe(self, params):
+        return {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+    
+    def api_setWebhook(self, params):
+        return True
+    
+    def _check_rate_limit(self):
+        if self.retry_after:
+            seconds = self.retry_after.pop(0)
+            raise FakeBotAPIError(429, f"Too Many Requests: retry after {seconds}", seconds)
+    
+    def api_sendMessage(self, params):
+        self._check_rate_limit()
+        return {
+            'message_id': len(self.requests), 'date': 1700000000, 'text': params['text'],
+            'chat': {'id': int(params['chat_id']), 'type': 'supergroup'},
+        }
+    
+    def api_deleteMessage(self, params):
+        self._check_rate_limit()
+        message_id = int(params['message_id'])
+        if message_id in self.missing_messages:
+            raise FakeBotAPIError(400, "Bad Request: message to delete not found")
+        if message_id in self.undeletable_messages:
+            raise FakeBotAPIError(400, "Bad Request: message can't be deleted")
+        return True
+    
+    def api_deleteMessages(self, params):
+        self._check_rate_limit()
+        message_ids = params['message_ids']
+        if not 1 <= len(message_ids) <= 100:
+            raise FakeBotAPIError(400, "Bad Request: too many messages to delete")
+        # الرسائل غير الموجودة تُتجاهل، والدفعة تُرفض إذا تعذر حذف إحداها
+        if self.undeletable_messages.intersection(message_ids):
+            raise FakeBotAPIError(400, "Bad Request: message can't be deleted")
+        return True
+    
+    def api_getChatAdministrators(self, params):
+        self._check_rate_limit()
+        # مثل تلقرام: البوتات لا تظهر في قائمة المسؤولين
+        return [
+            member for member in self.administrators.get(int(params['chat_id']), [])
+            if not member['user']['is_bot']
+        ]
+    
+    def api_getChatMember(self, params):
+        chat_id, user_id = int(params['chat_id']), int(params['user_id'])
+        for member in self.administrators.get(chat_id, []):
+            if member['user']['id'] == user_id:
+                return member
+        return {'status': 'member', 'user': {'id': user_id, 'is_bot': False, 'first_name': 'user'}}
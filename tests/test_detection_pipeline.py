@@ -0,0 +1,706 @@
+"""
+اختبارات مكونات خط الكشف
+Detection Pipeline Components Tests
+"""
+
+import time
+import asyncio
+import threading
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from difflib import SequenceMatcher
+from app.services.keyword_automaton import KeywordAutomaton
+from app.services.text_normalizer import TextNormalizer
+from app.services.obfuscation_detector import ObfuscationDetector
+from app.services.verdict_cache import VerdictCache
+from app.services.detection import OptimizedDetectionEngine
+from app.services.near_duplicate_index import NearDuplicateIndex, near_duplicate_index
+from app.services.chat_detector_registry import ChatDetectorRegistry, chat_detector_registry
+from app.config import DETECTION_CONFIG, FEATURES
+from app.services.fuzzy_index import FuzzyKeywordIndex, FuzzyMatchMemo
+from app.services.detection_pool import DetectionPool, FuzzyTask, fuzzy_search
+
+
+class TestKeywordAutomaton(unittest.TestCase):
+    """اختبارات أتمتة الكلمات المفتاحية"""
+    
+    def setUp(self):
+        self.automaton = KeywordAutomaton(['اجازة', 'اجازة مرضية', 'مرضي', 'واتس'])
+    
+    def test_find_all_overlapping(self):
+        """اختبار إيجاد الكلمات المتداخلة"""
+        matches = self.automaton.find_all("اجازة مرضية")
+        self.assertIn((0, 'اجازة'), matches)
+        self.assertIn((6, 'مرضي'), matches)
+        self.assertIn((0, 'اجازة مرضية'), matches)
+    
+    def test_find_words_whole_words_only(self):
+        """اختبار مطابقة الكلمات الكاملة فقط"""
+        hits = self.automaton.find_words("واتساب اجازة مرضية")
+        self.assertNotIn(0, hits)
+        self.assertEqual(sorted(hits[7]), ['اجازة', 'اجازة مرضية'])
+        self.assertNotIn(13, hits)
+    
+    def test_add_and_remove(self):
+        """اختبار الإضافة والإزالة"""
+        self.automaton.add('سكليف')
+        self.assertIn(0, self.automaton.find_words("سكليف فوري"))
+        self.automaton.remove('سكليف')
+        self.assertEqual(self.automaton.find_words("سكليف فوري"), {})
+
+
+
+class TestFuzzyKeywordIndex(unittest.TestCase):
+    """اختبارات فهرس المطابقة الضبابية"""
+    
+    KEYWORDS = ['إجازة', 'اجازة', 'اجازات', 'سكليف', 'مرضية', 'واتساب', 'وتساب', 'تطبيق']
+    
+    def setUp(self):
+        self.index = FuzzyKeywordIndex(self.KEYWORDS, 0.75)
+    
+    def test_matches_pairwise_scan(self):
+        """اختبار تطابق النتائج مع المقارنة الزوجية"""
+        for word in ['إجاز', 'اجازه', 'سڰليف', 'واتس', 'مرحبا', 'تطبيقات', 'ا']:
+            expected = [
+                (keyword, SequenceMatcher(None, word, keyword).ratio())
+                for keyword in self.KEYWORDS
+                if SequenceMatcher(None, word, keyword).ratio() >= 0.75
+            ]
+            self.assertEqual(self.index.search(word), expected, word)
+    
+    def test_remove_bumps_version(self):
+        """اختبار الإزالة وتحديث الإصدار"""
+        version = self.index.version
+        self.index.remove('سكليف')
+        self.assertGreater(self.index.version, version)
+        self.assertEqual(self.index.search('سكليف'), [])
+
+
+
+class TestFuzzyMatchMemo(unittest.TestCase):
+    """اختبارات ذاكرة المطابقة الضبابية"""
+    
+    def setUp(self):
+        self.index = FuzzyKeywordIndex(['اجازة', 'سكليف'], 0.75)
+        self.memo = FuzzyMatchMemo(self.index, max_size=2)
+    
+    def test_hits_and_misses(self):
+        """اختبار عدادات الإصابة والإخفاق"""
+        first = self.memo.search('اجازه')
+        second = self.memo.search('اجازه')
+        self.assertEqual(first, second)
+        self.assertEqual((self.memo.hits, self.memo.misses), (1, 1))
+    
+    def test_lru_eviction(self):
+        """اختبار إخراج أقدم كلمة عند امتلاء الذاكرة"""
+        self.memo.search('a')
+        self.memo.search('b')
+        self.memo.search('a')
+        self.memo.search('c')
+        self.assertEqual(len(self.memo), 2)
+        self.memo.search('b')
+        self.assertEqual(self.memo.misses, 4)
+    
+    def test_invalidated_on_version_change(self):
+        """اختبار مسح الذاكرة عند تغيّر الكلمات المفتاحية"""
+        self.assertEqual(self.memo.search('تقرير'), ())
+        self.index.add('تقرير')
+        self.assertEqual(self.memo.search('تقرير'), (('تقرير', 1.0),))
+
+
+
+class TestTextNormalizer(unittest.TestCase):
+    """اختبارات المطبّع بمرور واحد"""
+    
+    def test_strips_marks_and_folds_digits(self):
+        """اختبار إزالة الحركات والتطويل والأحرف غير المرئية"""
+        text, _ = TextNormalizer.normalize("إِجـــازة\u200b  مرضية ٠٥٥ HELLO")
+        self.assertEqual(text, "إجازة مرضية 055 hello")
+    
+    def test_folds_homoglyphs(self):
+        """اختبار توحيد الأحرف البديلة"""
+        text, _ = TextNormalizer.normalize("سڰليف")
+        self.assertEqual(text, "سسليف")
+    
+    def test_reports_signals(self):
+        """اختبار جمع إشارات التمويه أثناء التطبيع"""
+        text, signals = TextNormalizer.normalize("ت.ق.ر.ي.ر ط-ب  ي ok")
+        self.assertEqual(text, "تقرير ط-ب ي ok")
+        self.assertEqual(
+            signals, {'dots', 'dashes', 'special_chars', 'spaces', 'mixed_languages'}
+        )
+    
+    def test_clean_text_has_no_signals(self):
+        """اختبار النص العادي"""
+        self.assertEqual(TextNormalizer.normalize("السلام عليكم"), ("السلام عليكم", frozenset()))
+    
+    def test_normalize_many_matches_normalize(self):
+        """اختبار أن التطبيع المجمّع يطابق تطبيع كل نص وحده"""
+        texts = ["ت.ق.ر.ي.ر", ".ا", "ا_", "", "  إِجـــازة  ", "ok واتس", "a\x00b"]
+        self.assertEqual(
+            TextNormalizer.normalize_many(texts), [TextNormalizer.normalize(t) for t in texts]
+        )
+        self.assertEqual(
+            TextNormalizer.normalize_many(texts[:-1]), TextNormalizer.normalize_many(texts)[:-1]
+        )
+        self.assertEqual(TextNormalizer.normalize_many([]), [])
+
+
+
+class TestObfuscationDetector(unittest.TestCase):
+    """اختبارات كاشف التمويه الموحد"""
+    
+    def test_scan_signals(self):
+        """اختبار أنواع التمويه"""
+        self.assertEqual(ObfuscationDetector.scan("م.و.ث.ق"), ['dots', 'special_chars'])
+        self.assertEqual(ObfuscationDetector.scan("ط-ب"), ['dashes', 'special_chars'])
+        self.assertEqual(ObfuscationDetector.scan("ط_ب"), ['special_chars'])
+        self.assertEqual(ObfuscationDetector.scan("ط \t ب"), ['spaces'])
+        self.assertEqual(ObfuscationDetector.scan("واتس app"), ['mixed_languages'])
+        self.assertEqual(ObfuscationDetector.scan("السلام عليكم. WORLD"), [])
+    
+    def test_score_uses_config_weights(self):
+        """اختبار حساب الدرجة بأوزان الإعدادات"""
+        score, types = ObfuscationDetector.detect_obfuscation("م.و  ث-ق ok")
+        self.assertEqual(types, ['dots', 'spaces', 'dashes', 'special_chars', 'mixed_languages'])
+        self.assertAlmostEqual(score, 0.8)
+    
+    def test_heavily_obfuscated(self):
+        """اختبار حد التمويه الشديد"""
+        self.assertTrue(ObfuscationDetector.is_heavily_obfuscated("م.و  ث-ق"))
+        self.assertFalse(ObfuscationDetector.is_heavily_obfuscated("م.وثق"))
+
+
+
+class TestVerdictCache(unittest.TestCase):
+    """اختبارات ذاكرة الأحكام"""
+    
+    def test_mask_template(self):
+        """اختبار إخفاء الروابط والهواتف والأرقام"""
+        self.assertEqual(
+            VerdictCache.mask("واتس +966541904263 https://wa.me/966541904263 خصم 50"),
+            "واتس <phone> <url> خصم <num>"
+        )
+    
+    def test_variants_share_fingerprint(self):
+        """اختبار تطابق بصمة نسخ نفس الإعلان"""
+        self.assertEqual(
+            VerdictCache.fingerprint("سكليف 0551234567"),
+            VerdictCache.fingerprint("سكليف 0559876543")
+        )
+        self.assertNotEqual(
+            VerdictCache.fingerprint("سكليف 0551234567"),
+            VerdictCache.fingerprint("اجازة 0551234567")
+        )
+    
+    def test_lru_and_ttl(self):
+        """اختبار حد الحجم وانتهاء الصلاحية"""
+        cache = VerdictCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        
+        expired = VerdictCache(max_size=2, ttl=-1)
+        expired.set('a', 1)
+        self.assertIsNone(expired.get('a'))
+    
+    def test_detect_spam_reuses_verdict(self):
+        """اختبار إعادة استخدام الحكم لنسخة برقم مختلف"""
+        chat_detector_registry.clear()
+        self.addCleanup(setattr, chat_detector_registry, 'loader', chat_detector_registry.loader)
+        self.addCleanup(chat_detector_registry.clear)
+        chat_detector_registry.loader = lambda chat_id: []
+        
+        cache = OptimizedDetectionEngine.get_verdict_cache()
+        cache.clear()
+        first = OptimizedDetectionEngine.detect_spam("سكليف مرضية واتس 0551234567", 1, 1, 0.7)
+        hits = cache.hits
+        second = OptimizedDetectionEngine.detect_spam("سكليف مرضية واتس 0557654321", 2, 2, 0.7)
+        self.assertEqual(cache.hits, hits + 1)
+        self.assertEqual(first, second)
+        
+        OptimizedDetectionEngine.detect_spam("سكليف مرضية واتس 0557654321", 2, 2, 0.9)
+        self.assertEqual(cache.hits, hits + 1)
+    
+    def test_distinct_phone_numbers_not_shared(self):
+        """اختبار أن القالب نفسه بعدد أرقام مختلف لا يأخذ الحكم المحفوظ"""
+        chat_detector_registry.clear()
+        self.addCleanup(setattr, chat_detector_registry, 'loader', chat_detector_registry.loader)
+        self.addCleanup(chat_detector_registry.clear)
+        chat_detector_registry.loader = lambda chat_id: []
+        
+        OptimizedDetectionEngine.get_verdict_cache().clear()
+        self.addCleanup(OptimizedDetectionEngine.get_verdict_cache().clear)
+        repeated = OptimizedDetectionEngine.detect_spam("موعد الاجتماع 0551234567 او 0551234567", 1, 1, 0.5)
+        distinct = OptimizedDetectionEngine.detect_spam("موعد الاجتماع 0551234567 او 0557654321", 1, 1, 0.5)
+        self.assertFalse(repeated[0])
+        self.assertTrue(distinct[0])
+        self.assertGreater(distinct[1], repeated[1])
+
+
+
+class TestNearDuplicateIndex(unittest.TestCase):
+    """اختبارات فهرس النسخ شبه المكررة"""
+    
+    SPAM = "تضبط سكليف رسمي حتى لو كان الغياب قديم من مستشفيات حكومية للتواصل واتساب 0551234567"
+    EDITED = "تضبط سكليفات رسمية حتى لو كان الغياب قديم من مستشفيات حكومية للتواصل واتساب 0559876543"
+    
+    def test_edited_copy_matches(self):
+        """اختبار كشف النسخة المعدلة قليلاً"""
+        index = NearDuplicateIndex()
+        self.assertTrue(index.add_message(self.SPAM, ['سكليف']))
+        match = index.query(index.make_template(self.EDITED))
+        self.assertIsNotNone(match)
+        self.assertGreaterEqual(match[0], index.threshold)
+        self.assertEqual(match[1], ('سكليف',))
+        self.assertIsNone(index.query(index.make_template(
+            "السلام عليكم ورحمة الله وبركاته، موعد الاجتماع القادم يوم الخميس بعد العصر"
+        )))
+    
+    def test_short_messages_ignored(self):
+        """اختبار تجاهل الرسائل القصيرة"""
+        index = NearDuplicateIndex()
+        self.assertFalse(index.add_message("سكليف", ['سكليف']))
+        self.assertEqual(len(index), 0)
+    
+    def test_bounded_and_aged(self):
+        """اختبار حد الحجم وانتهاء العمر"""
+        index = NearDuplicateIndex(max_entries=2, ttl=60)
+        index.add_message(self.SPAM)
+        index.add_message("رسالة مختلفة تماماً عن الإعلان الأول ولا تشبهه في أي شيء ابداً")
+        index.add_message("نص ثالث طويل بما يكفي لدخول الفهرس مع كلمات أخرى غير مكررة هنا")
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.query(index.make_template(self.SPAM)))
+        
+        self.assertFalse(index.add_message(self.SPAM, deleted_at=time.time() - 120))
+    
+    def test_duplicate_refreshes_entry(self):
+        """اختبار أن النسخة المكررة تجدد المدخل الأصلي بحكمه بدلاً من تكراره"""
+        index = NearDuplicateIndex()
+        index.add_message(self.SPAM, ['سكليف'], chat_id=1, confidence=0.95)
+        index.add_message(self.EDITED, ['رسمية'], chat_id=1, confidence=0.6)
+        self.assertEqual(len(index), 1)
+        match = index.query(index.make_template(self.EDITED), 1)
+        self.assertEqual(match[1:], (('سكليف',), 0.95))
+        # التوقيع يبقى توقيع الأصل فلا ينجرف المدخل مع النسخ المعدلة
+        self.assertEqual(index.query(index.make_template(self.SPAM), 1)[0], 1.0)
+    
+    def test_scoped_per_chat(self):
+        """اختبار أن رسائل قروب لا تطابق رسائل قروب آخر"""
+        index = NearDuplicateIndex()
+        index.add_message(self.SPAM, ['سكليف'], chat_id=1)
+        self.assertIsNotNone(index.query(index.make_template(self.EDITED), 1))
+        self.assertIsNone(index.query(index.make_template(self.EDITED), 2))
+        
+        index.add_message(self.EDITED, ['سكليف'], chat_id=2)
+        self.assertEqual(len(index), 2)
+    
+    def test_load_deleted_messages(self):
+        """اختبار التحميل الأولي من جدول الرسائل المحذوفة"""
+        index = NearDuplicateIndex(ttl=3600)
+        now = datetime.utcnow()
+        rows = [
+            SimpleNamespace(message_text=self.SPAM, detected_keywords='["سكليف"]', chat_id=1,
+                            confidence_score=0.9, deleted_at=now - timedelta(hours=2)),
+            SimpleNamespace(message_text=self.SPAM, detected_keywords='["سكليف"]', chat_id=1,
+                            confidence_score=0.9, deleted_at=now - timedelta(minutes=5)),
+        ]
+        self.assertEqual(index.load_deleted_messages(rows), 1)
+        match = index.query(index.make_template(self.EDITED), 1)
+        self.assertEqual(match[1:], (('سكليف',), 0.9))
+        self.assertIsNone(index.query(index.make_template(self.EDITED), 2))
+    
+    def test_detect_spam_uses_index(self):
+        """اختبار الحكم الفوري للنسخة المعدلة من إعلان محذوف"""
+        text = "عرض خاص لفترة محدودة تواصلوا معنا على الخاص للحصول على التفاصيل 0551234567"
+        variant = "عرض خاص لفترة محدودة جداً تواصلوا معنا على الخاص للحصول على التفاصيل 0551234567"
+        OptimizedDetectionEngine.get_verdict_cache().clear()
+        try:
+            near_duplicate_index.add_message(text, ['عرض'], chat_id=1, confidence=0.85)
+            is_spam, confidence, keywords = OptimizedDetectionEngine.detect_spam(variant, 1, 1, 0.7)
+            self.assertTrue(is_spam)
+            self.assertEqual(confidence, 0.85)
+            self.assertEqual(keywords, ['عرض'])
+            
+            # قروب آخر لا يرث الحكم من الفهرس ولا من ذاكرة الأحكام
+            decisions = OptimizedDetectionEngine.get_stage_stats()['decisions']
+            OptimizedDetectionEngine.detect_spam(variant, 1, 2, 0.7)
+            after = OptimizedDetectionEngine.get_stage_stats()['decisions']
+            self.assertEqual(after['near_duplicate'], decisions['near_duplicate'])
+            self.assertEqual(after['verdict_cache'], decisions['verdict_cache'])
+        finally:
+            near_duplicate_index.clear()
+            OptimizedDetectionEngine.get_verdict_cache().clear()
+    
+    def test_weak_confidence_runs_keyword_stages(self):
+        """اختبار أن ثقة الحكم الأصلي الأقل من عتبة القروب لا تحسم الحكم كرسالة سليمة"""
+        chat_detector_registry.clear()
+        self.addCleanup(setattr, chat_detector_registry, 'loader', chat_detector_registry.loader)
+        self.addCleanup(chat_detector_registry.clear)
+        self.addCleanup(near_duplicate_index.clear)
+        self.addCleanup(OptimizedDetectionEngine.get_verdict_cache().clear)
+        chat_detector_registry.loader = lambda chat_id: []
+        
+        text = "سكليف اجازة مرضية سكليف رسمي واتساب للتواصل 0551234567 سكليف اجازة مرضية معتمدة"
+        variant = "سكليف اجازة مرضية سكليفات رسمية واتساب للتواصل 0559876543 سكليف اجازة مرضية"
+        # حُذف الأصل بحساسية أعلى سابقاً، والعتبة الحالية 0.82 فوق ثقته وتحت درجة الكلمات
+        sensitivity = 0.18
+        near_duplicate_index.add_message(text, ['سكليف'], chat_id=1, confidence=0.6)
+        self.assertIsNotNone(
+            near_duplicate_index.query(near_duplicate_index.make_template(variant), 1)
+        )
+        
+        decisions = OptimizedDetectionEngine.get_stage_stats()['decisions']['near_duplicate']
+        is_spam, confidence, _ = OptimizedDetectionEngine.detect_spam(variant, 1, 1, sensitivity)
+        self.assertTrue(is_spam)
+        self.assertGreater(confidence, 0.6)
+        self.assertEqual(
+            OptimizedDetectionEngine.get_stage_stats()['decisions']['near_duplicate'], decisions
+        )
+
+
+
+class TestChatDetectorRegistry(unittest.TestCase):
+    """اختبارات سجل كواشف القروبات"""
+    
+    def setUp(self):
+        self.rows = {
+            10: [('عرض حصري', True), ('بيع', False)],
+            20: [],
+        }
+        self.registry = ChatDetectorRegistry(max_chats=2, loader=lambda chat_id: self.rows[chat_id])
+    
+    def test_lazy_build_and_lru(self):
+        """اختبار البناء عند أول استخدام والإخراج الأقدم"""
+        detector = self.registry.get(10)
+        self.assertIs(self.registry.get(10), detector)
+        self.assertEqual(self.registry.builds, 1)
+        self.assertEqual(detector.weights, {'عرض حصري': 0.85, 'بيع': 1.0})
+        
+        self.rows[30] = []
+        self.registry.get(20)
+        self.registry.get(30)
+        self.assertEqual(len(self.registry), 2)
+        self.assertIsNot(self.registry.get(10), detector)
+    
+    def test_failed_load_not_cached(self):
+        """اختبار عدم حفظ الكاشف عند فشل التحميل"""
+        self.assertIsNone(self.registry.get(99))
+        self.rows[99] = [('بيع', True)]
+        self.assertIn('بيع', self.registry.get(99))
+    
+    def test_async_load_off_loop(self):
+        """اختبار تحميل الكلمات خارج حلقة الأحداث مرة واحدة لكل قروب"""
+        threads = []
+        
+        def loader(chat_id):
+            threads.append(threading.get_ident())
+            return self.rows[chat_id]
+        
+        registry = ChatDetectorRegistry(max_chats=2, loader=loader)
+        
+        async def scenario():
+            detectors = await asyncio.gather(*(registry.load(10) for _ in range(3)))
+            return threading.get_ident(), detectors
+        
+        loop_thread, detectors = asyncio.run(scenario())
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], loop_thread)
+        self.assertTrue(all(detector is detectors[0] for detector in detectors))
+        self.assertIs(registry.get(10), detectors[0])
+    
+    def test_update_during_load_not_cached(self):
+        """اختبار عدم حفظ كاشف قُرئت كلماته قبل تعديلها"""
+        async def scenario():
+            load = asyncio.ensure_future(self.registry.load(10))
+            await asyncio.sleep(0)
+            self.registry.add_keyword(10, 'خصم')
+            return await load
+        
+        self.assertIsNotNone(asyncio.run(scenario()))
+        self.assertEqual(len(self.registry), 0)
+    
+    def test_incremental_update(self):
+        """اختبار تحديث الكاشف بعد إضافة وإزالة كلمة"""
+        detector = self.registry.get(20)
+        self.assertIsNone(detector.cache_key)
+        
+        self.registry.add_keyword(20, 'إِجـازة مرضية')
+        self.assertIn('إجازة مرضية', detector)
+        self.assertEqual(detector.automaton.find_words('عندي إجازة مرضية'), {5: ['إجازة مرضية']})
+        version = detector.cache_key
+        
+        self.registry.remove_keyword(20, 'إجازة مرضية')
+        self.assertNotIn('إجازة مرضية', detector)
+        self.assertNotEqual(detector.cache_key, version)
+    
+    def test_detect_spam_uses_chat_keywords(self):
+        """اختبار كشف عبارة مخصصة لقروب واحد فقط"""
+        chat_detector_registry.clear()
+        self.addCleanup(setattr, chat_detector_registry, 'loader', chat_detector_registry.loader)
+        self.addCleanup(chat_detector_registry.clear)
+        chat_detector_registry.loader = lambda chat_id: self.rows.get(chat_id, [])
+        
+        text = "لدينا عرض حصري على البيع"
+        is_spam, _, keywords = OptimizedDetectionEngine.detect_spam(text, 1, 10, 0.7)
+        self.assertTrue(is_spam)
+        self.assertIn('عرض حصري', keywords)
+        
+        _, _, keywords = OptimizedDetectionEngine.detect_spam(text, 1, 20, 0.7)
+        self.assertNotIn('عرض حصري', keywords)
+
+
+
+class TestDetectionStages(unittest.TestCase):
+    """اختبارات مراحل الكشف المتدرجة"""
+    
+    def setUp(self):
+        saved_features = dict(FEATURES)
+        self.addCleanup(FEATURES.update, saved_features)
+        self.addCleanup(setattr, chat_detector_registry, 'loader', chat_detector_registry.loader)
+        self.addCleanup(chat_detector_registry.clear)
+        chat_detector_registry.clear()
+        chat_detector_registry.loader = lambda chat_id: []
+        OptimizedDetectionEngine.get_verdict_cache().clear()
+        FEATURES['enable_verdict_cache'] = False
+    
+    def decided_by(self, text: str, sensitivity: float = 0.7) -> str:
+        before = dict(OptimizedDetectionEngine.get_stage_stats()['decisions'])
+        OptimizedDetectionEngine.detect_spam(text, 1, 1, sensitivity)
+        after = OptimizedDetectionEngine.get_stage_stats()['decisions']
+        return [stage for stage in after if after[stage] != before[stage]][0]
+    
+    def test_empty_stage(self):
+        """اختبار حسم الرسائل الفارغة والرموز التعبيرية"""
+        self.assertEqual(self.decided_by("🌹🌹 👍"), 'empty')
+        self.assertEqual(OptimizedDetectionEngine.detect_spam("😂", 1, 1, 1.0), (False, 0.0, []))
+        self.assertNotEqual(self.decided_by("0551234567"), 'empty')
+    
+    def test_exact_stage_skips_fuzzy(self):
+        """اختبار تخطي المطابقة الضبابية عندما يكون الحكم محسوماً"""
+        text = "سكليف مرضية للتواصل واتساب"
+        self.assertEqual(self.decided_by(text), 'exact')
+        self.assertEqual(self.decided_by("السلام عليكم كيف حالكم"), 'fuzzy')
+        
+        FEATURES['enable_early_exit'] = False
+        self.assertEqual(self.decided_by(text), 'fuzzy')
+    
+    def test_early_exit_keeps_verdict(self):
+        """اختبار أن التخطي لا يغير الحكم"""
+        texts = [
+            "سكليفات مرضيه واتس 0551234567", "نطلع إجازة طبية موثقة", "عرض خاص اليوم",
+            "خدمة سريعة", "السلام عليكم",
+        ]
+        for sensitivity in (0.2, 0.5, 0.7, 0.9):
+            for text in texts:
+                FEATURES['enable_early_exit'] = True
+                fast = OptimizedDetectionEngine.detect_spam(text, 1, 1, sensitivity)[0]
+                FEATURES['enable_early_exit'] = False
+                full = OptimizedDetectionEngine.detect_spam(text, 1, 1, sensitivity)[0]
+                self.assertEqual(fast, full, (text, sensitivity))
+    
+    def test_trusted_verdict_runs_cheap_stages_only(self):
+        """اختبار مسار الأعضاء الموثوقين: المراحل الرخيصة أو الكشف الكامل"""
+        engine = OptimizedDetectionEngine
+        before = engine.get_stage_stats()['decisions']['trusted']
+        self.assertEqual(engine.trusted_verdict("سكليف مرضية للتواصل", 1), (False, 0.0, []))
+        self.assertEqual(engine.get_stage_stats()['decisions']['trusted'], before + 1)
+        
+        # رابط أو رقم هاتف (ولو بأرقام عربية) أو تمويه: كشف كامل
+        for text in ("شوفوا t.me/offers", "كلموني ٠٥٥١٢٣٤٥٦٧", "ا.ج.ا.ز.ة مرضية"):
+            self.assertIsNone(engine.trusted_verdict(text, 1), text)
+        
+        # بصمة إعلان معروف تبقى محسومة للموثوقين
+        FEATURES['enable_verdict_cache'] = True
+        spam = "نطلع سكليف مرضية بسعر خاص"
+        self.assertTrue(engine.detect_spam(spam, 1, 1)[0])
+        self.assertTrue(engine.trusted_verdict(spam, 1)[0])
+
+
+
+class TestBatchDetection(unittest.TestCase):
+    """اختبارات الكشف المجمّع"""
+    
+    TEXTS = [
+        "سكليفات مرضيه واتس 0551234567", "نطلع إجازة طبية موثقة", "عرض خاص اليوم",
+        "خدمة سريعة", "السلام عليكم", "🌹🌹", "", "ت.ق.ر.ي.ر ط.ب.ي hello",
+        "اجازه مرضيه للتواصل", "عرض خاص اليوم", "تضبط سكليف +966541904263 0551234567",
+    ]
+    
+    def setUp(self):
+        saved_features = dict(FEATURES)
+        saved_min_size = DETECTION_CONFIG['batch_vectorize_min_size']
+        self.addCleanup(FEATURES.update, saved_features)
+        self.addCleanup(DETECTION_CONFIG.__setitem__, 'batch_vectorize_min_size', saved_min_size)
+        self.addCleanup(setattr, chat_detector_registry, 'loader', chat_detector_registry.loader)
+        self.addCleanup(chat_detector_registry.clear)
+        self.addCleanup(OptimizedDetectionEngine.get_verdict_cache().clear)
+        chat_detector_registry.loader = lambda chat_id: (
+            [('عرض خاص', True), ('سريعة', False)] if chat_id == 2 else []
+        )
+    
+    def compare(self, texts, sensitivities, chat_ids):
+        chat_detector_registry.clear()
+        OptimizedDetectionEngine.get_verdict_cache().clear()
+        single = [
+            OptimizedDetectionEngine.detect_spam(text, 1, chat_id, sensitivity)
+            for text, sensitivity, chat_id in zip(texts, sensitivities, chat_ids)
+        ]
+        chat_detector_registry.clear()
+        OptimizedDetectionEngine.get_verdict_cache().clear()
+        batch = OptimizedDetectionEngine.detect_many(texts, sensitivities, chat_ids)
+        self.assertEqual(batch, single)
+        for (is_spam, confidence, _), (_, expected, _) in zip(batch, single):
+            self.assertIs(type(is_spam), bool)
+            self.assertEqual(confidence.hex(), float(expected).hex())
+    
+    def test_matches_single_message_path(self):
+        """اختبار تطابق النتائج مع detect_spam بالمصفوفات وبدونها"""
+        texts = self.TEXTS * 3
+        sensitivities = [(0.2, 0.5, 0.7, 0.9)[i % 4] for i in range(len(texts))]
+        chat_ids = [1 + i % 2 for i in range(len(texts))]
+        for min_size in (1, 1000):
+            DETECTION_CONFIG['batch_vectorize_min_size'] = min_size
+            for early_exit in (True, False):
+                for verdict_cache in (True, False):
+                    FEATURES['enable_early_exit'] = early_exit
+                    FEATURES['enable_verdict_cache'] = verdict_cache
+                    self.compare(texts, sensitivities, chat_ids)
+    
+    def test_scalar_arguments(self):
+        """اختبار حساسية وقروب واحد لكل الرسائل"""
+        self.assertEqual(OptimizedDetectionEngine.detect_many([]), [])
+        results = OptimizedDetectionEngine.detect_many(self.TEXTS, 0.7, 1)
+        self.assertEqual(len(results), len(self.TEXTS))
+        self.assertEqual(results[5], (False, 0.0, []))
+        self.assertTrue(results[0][0])
+
+
+class TestDetectionPool(unittest.TestCase):
+    """اختبارات المطابقة الضبابية للرسائل الطويلة في عمليات منفصلة"""
+    
+    # رسائل طويلة تحتاج المطابقة الضبابية، وإحداها بكلمات القروب 2
+    TEXTS = [
+        "السلام عليكم كيف حالكم " * 60,
+        "عروض خاصه اليوم " * 80,
+        "سكليفاتت مرضيهه " * 70,
+        "وتسابب اجازاتت " * 70 + "اهلا",
+        "ا.ج.ا.ز.ه " * 150,
+    ]
+    
+    def setUp(self):
+        saved_features = dict(FEATURES)
+        self.addCleanup(FEATURES.update, saved_features)
+        self.addCleanup(setattr, chat_detector_registry, 'loader', chat_detector_registry.loader)
+        self.addCleanup(chat_detector_registry.clear)
+        self.addCleanup(OptimizedDetectionEngine.get_verdict_cache().clear)
+        chat_detector_registry.clear()
+        chat_detector_registry.loader = lambda chat_id: (
+            [('عرض خاص', True), ('سريعة', False)] if chat_id == 2 else []
+        )
+        FEATURES['enable_detection_process_pool'] = True
+    
+    def run_pool(self, pool, texts, chat_id):
+        async def scenario():
+            await pool.start()
+            try:
+                return [await pool.detect_spam(text, 1, chat_id, 0.7) for text in texts]
+            finally:
+                pool.shutdown()
+        
+        return asyncio.run(scenario())
+    
+    def expected(self, texts, chat_id):
+        chat_detector_registry.clear()
+        OptimizedDetectionEngine.get_verdict_cache().clear()
+        results = [OptimizedDetectionEngine.detect_spam(text, 1, chat_id, 0.7) for text in texts]
+        chat_detector_registry.clear()
+        OptimizedDetectionEngine.get_verdict_cache().clear()
+        return results
+    
+    def test_matches_in_loop_detection(self):
+        """اختبار تطابق أحكام العمليات مع الكشف في حلقة الأحداث"""
+        pool = DetectionPool(workers=1, min_length=0, timeout=30)
+        for chat_id in (1, 2):
+            expected = self.expected(self.TEXTS, chat_id)
+            self.assertEqual(self.run_pool(pool, self.TEXTS, chat_id), expected)
+        self.assertEqual(pool.offloaded, 2 * len(self.TEXTS))
+        self.assertEqual((pool.timeouts, pool.failures, pool.skipped), (0, 0, 0))
+        # كلمات القروب 2 تُرسل مرة واحدة للعملية، ثم يكفي إصدارها
+        self.assertEqual(pool.keyword_resends, 1)
+    
+    def test_fuzzy_search_with_chat_keywords(self):
+        """اختبار نتائج العملية العاملة مع كلمات القروب"""
+        words = ('سكليفات', 'عروض', 'خاصه', 'سريعه')
+        detector = chat_detector_registry.get(2)
+        self.assertIsNone(fuzzy_search(FuzzyTask(words, detector.cache_key)))
+        results = fuzzy_search(FuzzyTask(words, detector.cache_key, tuple(detector.weights.items())))
+        self.assertEqual(fuzzy_search(FuzzyTask(words, detector.cache_key)), results)
+        memo = OptimizedDetectionEngine.get_fuzzy_memo()
+        self.assertEqual([result[0] for result in results], [memo.search(word) for word in words])
+        self.assertEqual(
+            [result[1] for result in results],
+            [detector.fuzzy_memo.search(word) for word in words]
+        )
+        self.assertEqual(fuzzy_search(FuzzyTask(words, None))[0][1], ())
+    
+    def test_timeout_falls_back_to_exact_verdict(self):
+        """اختبار حكم الكلمات الدقيقة عند انتهاء المهلة دون حفظه"""
+        FEATURES['enable_fuzzy_matching'] = False
+        expected = self.expected(self.TEXTS, 1)
+        FEATURES['enable_fuzzy_matching'] = True
+        
+        pool = DetectionPool(workers=1, min_length=0, timeout=0)
+        self.assertEqual(self.run_pool(pool, self.TEXTS, 1), expected)
+        # المهمة التي انتهت مهلتها تشغل العملية، فلا تُرسل الرسائل التالية إليها
+        self.assertEqual(pool.timeouts + pool.skipped, len(self.TEXTS))
+        self.assertEqual(pool.offloaded, pool.timeouts)
+        self.assertEqual(len(OptimizedDetectionEngine.get_verdict_cache()), 0)
+    
+    def test_light_messages_stay_in_loop(self):
+        """اختبار كشف الرسائل القصيرة دون إرسالها للعمليات"""
+        pool = DetectionPool(workers=1, min_length=1024, timeout=0)
+        texts = ["السلام عليكم كيف حالكم", "سكليفات مرضيه للتواصل"]
+        expected = self.expected(texts, 1)
+        self.assertEqual(self.run_pool(pool, texts, 1), expected)
+        self.assertEqual((pool.offloaded, pool.timeouts), (0, 0))
+    
+    def test_failed_keyword_load_stays_off_loop(self):
+        """اختبار عدم تحميل كلمات القروب في حلقة الأحداث بعد فشل التحميل في المنفذ"""
+        threads = []
+        
+        def loader(chat_id):
+            threads.append(threading.get_ident())
+            raise RuntimeError("database is locked")
+        
+        chat_detector_registry.loader = loader
+        pool = DetectionPool(workers=1, min_length=1024)
+        
+        async def scenario():
+            verdicts = [
+                await pool.detect_spam("سكليفات مرضيه للتواصل", 1, 5, 0.7, trusted=trusted)
+                for trusted in (True, False)
+            ]
+            return threading.get_ident(), verdicts
+        
+        loop_thread, verdicts = asyncio.run(scenario())
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(loop_thread, threads)
+        self.assertTrue(verdicts[1][0])
+    
+    def test_disabled_by_default(self):
+        """اختبار عدم تشغيل العمليات بدون تفعيل الميزة"""
+        FEATURES['enable_detection_process_pool'] = False
+        pool = DetectionPool(workers=1, min_length=0)
+        results = self.run_pool(pool, self.TEXTS[:1], 1)
+        self.assertEqual(results, self.expected(self.TEXTS[:1], 1))
+        self.assertFalse(pool.running)
+        self.assertEqual(pool.offloaded, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,1471 @@
+"""
+اختبارات خدمات معالجة الرسائل
+Message Processing Services Tests
+"""
+
+import json
+import time
+import socket
+import asyncio
+import threading
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import httpx
+import uvicorn
+from telegram import Bot, ChatMemberUpdated
+from telegram.error import RetryAfter
+from telegram.ext import Application, ApplicationHandlerStop, MessageHandler as TgMessageHandler
+from app.services.async_database import AsyncDatabaseService
+from app.services.cache_service import CacheService
+from app.services.chat_settings_cache import (
+    ChatSettingsCache, CachedChatSettings, chat_settings_cache
+)
+from app.services.database_service import DatabaseService
+from app.services.membership_index import (
+    BLACKLIST, WHITELIST, MembershipIndex, membership_index
+)
+from app.services.write_behind import WriteBehindBuffer
+from app.services.chat_dispatcher import ChatDispatcher
+from app.services.rate_limiter import RateLimiter, command_rate_limiter, message_rate_limiter
+from app.services.latency_histogram import LatencyHistogram, delete_latency
+from app.services.near_duplicate_index import near_duplicate_index
+from app.handlers.message_handler import MessageHandler
+from app.handlers.message_deletion_handler import MessageDeletionHandler
+from app.services.admin_roster import AdminRoster, admin_roster
+from app.services.notification_digest import NotificationDigest
+from app.services.reputation import ReputationTracker
+from app.services.outbound_scheduler import (
+    PRIORITY_CLEANUP, PRIORITY_DELETE, PRIORITY_REPLY, OutboundScheduler, outbound
+)
+from app.services.webhook import (
+    SECRET_HEADER, application_sink, create_webhook_app, run_application, set_webhook,
+    update_chat_id
+)
+from app.services.prefork import ChatAffinityRouter, read_frames, start_workers, worker_index
+from app.config import FEATURES, OUTBOUND_CONFIG, WEBHOOK_CONFIG
+from tests.fake_bot_api import FakeBotAPI
+from app.models.init_db import Base, ActivityLog, DeletedMessage, UserStatistics
+
+
+def make_settings(chat_id: int, is_enabled: bool = True, sensitivity: float = 0.7):
+    return SimpleNamespace(
+        chat_id=chat_id, is_enabled=is_enabled, detection_sensitivity=sensitivity,
+        auto_delete=True, notify_admins=True, max_warnings=3,
+    )
+
+
+class TestChatSettingsCache(unittest.TestCase):
+    """اختبارات ذاكرة إعدادات القروبات"""
+    
+    def setUp(self):
+        self.loads = []
+        self.cache = ChatSettingsCache(max_chats=2, ttl=60, loader=self.load)
+    
+    def load(self, chat_id: int):
+        self.loads.append(chat_id)
+        return make_settings(chat_id)
+    
+    def test_lazy_load_once(self):
+        """اختبار تحميل إعدادات القروب مرة واحدة فقط"""
+        settings = self.cache.get(1)
+        self.assertIsInstance(settings, CachedChatSettings)
+        self.assertTrue(settings.is_enabled)
+        self.assertEqual(self.cache.get(1), settings)
+        self.assertEqual(self.loads, [1])
+        self.assertEqual(self.cache.get_stats()['hits'], 1)
+    
+    def test_update_in_place(self):
+        """اختبار تحديث الإعدادات بعد أوامر التعديل دون إعادة التحميل"""
+        self.cache.get(1)
+        self.cache.update(make_settings(1, is_enabled=False, sensitivity=0.9))
+        settings = self.cache.get(1)
+        self.assertFalse(settings.is_enabled)
+        self.assertEqual(settings.detection_sensitivity, 0.9)
+        self.assertEqual(self.loads, [1])
+    
+    def test_invalidate_and_lru(self):
+        """اختبار الإزالة وحد الحجم"""
+        self.cache.get(1)
+        self.cache.invalidate(1)
+        self.cache.get(1)
+        self.cache.get(2)
+        self.cache.get(3)
+        self.assertEqual(len(self.cache), 2)
+        self.cache.get(1)
+        self.assertEqual(self.loads, [1, 1, 2, 3, 1])
+    
+    def test_expired_settings_reloaded(self):
+        """اختبار إعادة تحميل الإعدادات بعد انتهاء عمرها"""
+        cache = ChatSettingsCache(max_chats=2, ttl=0.01, loader=self.load)
+        cache.get(1)
+        time.sleep(0.02)
+        cache.get(1)
+        self.assertEqual(self.loads, [1, 1])
+
+
+class TestCacheService(unittest.TestCase):
+    """اختبارات ذاكرة LRU وعجلة المؤقتات"""
+    
+    def setUp(self):
+        self.now = 1000.0
+        self.cache = CacheService(ttl=10, max_size=3, clock=lambda: self.now)
+    
+    def test_lru_eviction(self):
+        """اختبار إخراج الأقدم استخداماً عند الامتلاء"""
+        for key in 'abc':
+            self.cache.set(key, key.upper())
+        self.assertEqual(self.cache.get('a'), 'A')
+        self.cache.set('d', 'D')
+        self.assertNotIn('b', self.cache)
+        self.assertEqual([self.cache.get(key) for key in 'acd'], ['A', 'C', 'D'])
+        stats = self.cache.get_stats()
+        self.assertEqual((stats['size'], stats['evictions']), (3, 1))
+        self.assertEqual((stats['hits'], stats['misses']), (4, 0))
+    
+    def test_expired_entry_is_a_miss(self):
+        """اختبار أن القيمة المنتهية لا تُعاد"""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2, ttl=100)
+        self.now += 11
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('b'), 2)
+        stats = self.cache.get_stats()
+        self.assertEqual((stats['misses'], stats['expirations'], stats['size']), (1, 1, 1))
+    
+    def test_timer_wheel_removes_expired_on_write(self):
+        """اختبار حذف المنتهية من خانات العجلة عند الكتابة دون قراءتها"""
+        cache = CacheService(ttl=10, max_size=100, clock=lambda: self.now)
+        for key in range(50):
+            cache.set(key, key)
+        self.now += 5
+        cache.set('late', 1)
+        self.now += 6
+        cache.set('fresh', 1)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get_stats()['expirations'], 50)
+        self.now += 11
+        self.assertEqual(cache.cleanup_expired(), 2)
+        self.assertEqual(len(cache), 0)
+    
+    def test_overwrite_reschedules(self):
+        """اختبار أن إعادة الكتابة تنقل القيمة إلى خانة انتهائها الجديدة"""
+        self.cache.set('a', 1)
+        self.now += 8
+        self.cache.set('a', 2)
+        self.now += 8
+        self.assertEqual(self.cache.cleanup_expired(), 0)
+        self.assertEqual(self.cache.get('a'), 2)
+    
+    def test_no_ttl(self):
+        """اختبار القيم التي لا تنتهي"""
+        cache = CacheService(ttl=None, max_size=2, clock=lambda: self.now)
+        cache.set('a', 1)
+        self.now += 10 ** 6
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('b', 2)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+
+
+
+class TestMembershipIndex(unittest.TestCase):
+    """اختبارات فهرس عضوية القائمتين"""
+    
+    def setUp(self):
+        self.index = MembershipIndex()
+        self.index.load(iter([(1, 10), (1, 11), (2, 10)]), iter([(1, 20)]))
+    
+    def test_lookup(self):
+        """اختبار البحث بعد التحميل"""
+        self.assertTrue(self.index.loaded)
+        self.assertEqual(len(self.index), 4)
+        self.assertTrue(self.index.is_whitelisted(1, 11))
+        self.assertFalse(self.index.is_whitelisted(2, 11))
+        self.assertTrue(self.index.is_blacklisted(1, 20))
+        self.assertFalse(self.index.is_blacklisted(1, 10))
+    
+    def test_add_and_remove(self):
+        """اختبار مزامنة الإضافة والإزالة"""
+        self.index.add(BLACKLIST, 3, 30)
+        self.assertTrue(self.index.is_blacklisted(3, 30))
+        self.index.remove(BLACKLIST, 3, 30)
+        self.index.remove(BLACKLIST, 3, 30)
+        self.assertFalse(self.index.is_blacklisted(3, 30))
+        self.assertEqual(self.index.get_stats()['chats'], 2)
+    
+    def test_database_service_uses_loaded_index(self):
+        """اختبار أن الفحص لا يستعلم قاعدة البيانات بعد التحميل"""
+        self.addCleanup(membership_index.clear)
+        membership_index.load([(5, 50)], [(5, 51)])
+        self.assertTrue(DatabaseService.is_user_whitelisted(None, 5, 50))
+        self.assertFalse(DatabaseService.is_user_whitelisted(None, 5, 51))
+        self.assertTrue(DatabaseService.is_user_blacklisted(None, 5, 51))
+
+
+
+class TestAsyncDatabaseService(unittest.TestCase):
+    """اختبارات طبقة قاعدة البيانات غير المتزامنة"""
+    
+    def setUp(self):
+        self.async_db = AsyncDatabaseService(max_workers=2)
+        self.addCleanup(self.async_db.shutdown)
+    
+    def test_runs_outside_event_loop_thread(self):
+        """اختبار تنفيذ العملية في خيط المنفذ مع جلسة خاصة بها"""
+        def operation(db, value):
+            return threading.current_thread().name, db is not None, value
+        
+        name, has_session, value = asyncio.run(self.async_db.run(operation, 7))
+        self.assertTrue(name.startswith('db'))
+        self.assertTrue(has_session)
+        self.assertEqual(value, 7)
+    
+    def test_exposes_database_service_operations(self):
+        """اختبار أن عمليات DatabaseService متاحة كدوال async"""
+        self.assertTrue(asyncio.iscoroutinefunction(self.async_db.log_activity))
+        with self.assertRaises(AttributeError):
+            self.async_db.not_an_operation
+    
+    def test_uses_loaded_membership_index(self):
+        """اختبار فحص القائمتين دون المنفذ بعد تحميل الفهرس"""
+        self.addCleanup(membership_index.clear)
+        membership_index.load([(1, 10)], [])
+        self.assertTrue(asyncio.run(self.async_db.is_user_whitelisted(1, 10)))
+        self.assertFalse(asyncio.run(self.async_db.is_user_blacklisted(1, 10)))
+        self.assertIsNone(self.async_db._executor)
+    
+    def test_settings_loaded_in_executor_once(self):
+        """اختبار تحميل إعدادات القروب في المنفذ ثم من الذاكرة"""
+        loads = []
+        self.addCleanup(setattr, chat_settings_cache, 'loader', chat_settings_cache.loader)
+        self.addCleanup(chat_settings_cache.clear)
+        chat_settings_cache.loader = lambda chat_id: loads.append(
+            threading.current_thread().name
+        ) or make_settings(chat_id, sensitivity=0.4)
+        
+        async def load_twice():
+            return [await self.async_db.get_chat_settings(9) for _ in range(2)]
+        
+        first, second = asyncio.run(load_twice())
+        self.assertEqual(first.detection_sensitivity, 0.4)
+        self.assertEqual(first, second)
+        self.assertEqual(len(loads), 1)
+        self.assertTrue(loads[0].startswith('db'))
+
+
+
+class TestWriteBehindBuffer(unittest.TestCase):
+    """اختبارات كتابة السجلات على دفعات"""
+    
+    def setUp(self):
+        self.batches = []
+    
+    async def write(self, grouped_rows):
+        self.batches.append({model: len(rows) for model, rows in grouped_rows.items()})
+    
+    def make_buffer(self, **kwargs):
+        options = dict(interval_ms=20, batch_rows=3, queue_size=100, writer=self.write)
+        options.update(kwargs)
+        return WriteBehindBuffer(**options)
+    
+    def test_flush_on_batch_rows_and_stop(self):
+        """اختبار الكتابة عند اكتمال الدفعة وكتابة الباقي عند الإيقاف"""
+        async def scenario():
+            buffer = self.make_buffer(interval_ms=10000)
+            await buffer.start()
+            for i in range(4):
+                await buffer.log_activity(1, "action", i)
+            await buffer.log_deleted_message(1, 5, 2, "user", "text", ["k"], 0.9)
+            await asyncio.sleep(0.01)
+            self.assertEqual(self.batches, [{ActivityLog: 3}])
+            await buffer.stop()
+            return buffer
+        
+        buffer = asyncio.run(scenario())
+        self.assertEqual(self.batches[1], {ActivityLog: 1, DeletedMessage: 1})
+        self.assertEqual(buffer.rows_written, 5)
+        self.assertFalse(buffer.running)
+    
+    def test_flush_on_interval(self):
+        """اختبار كتابة الدفعة الناقصة بعد انتهاء المهلة"""
+        async def scenario():
+            buffer = self.make_buffer()
+            await buffer.start()
+            await buffer.log_activity(1, "action")
+            await asyncio.sleep(0.1)
+            flushed = list(self.batches)
+            await buffer.stop()
+            return flushed
+        
+        self.assertEqual(asyncio.run(scenario()), [{ActivityLog: 1}])
+    
+    def test_backpressure_when_queue_full(self):
+        """اختبار انتظار المعالج عند امتلاء الطابور"""
+        async def scenario():
+            release = asyncio.Event()
+            
+            async def slow_write(grouped_rows):
+                await release.wait()
+                await self.write(grouped_rows)
+            
+            buffer = self.make_buffer(batch_rows=1, queue_size=1, writer=slow_write)
+            await buffer.start()
+            await buffer.log_activity(1, "first")
+            await asyncio.sleep(0.01)
+            await buffer.log_activity(1, "second")
+            third = asyncio.create_task(buffer.log_activity(1, "third"))
+            await asyncio.sleep(0.01)
+            blocked = not third.done()
+            release.set()
+            await third
+            await buffer.stop()
+            return blocked, buffer.rows_written
+        
+        self.assertEqual(asyncio.run(scenario()), (True, 3))
+    
+    def test_failed_batch_retried_in_order(self):
+        """اختبار إعادة الدفعة الفاشلة قبل ما بعدها بدلاً من إسقاطها"""
+        written = []
+        failures = [RuntimeError("database is locked")] * 2
+        
+        async def flaky_write(grouped_rows):
+            if failures:
+                raise failures.pop()
+            written.extend(row['action'] for row in grouped_rows[ActivityLog])
+        
+        async def scenario():
+            buffer = self.make_buffer(batch_rows=1, retry_ms=5, writer=flaky_write)
+            await buffer.start()
+            for action in ("a", "b", "c"):
+                await buffer.log_activity(1, action)
+            await asyncio.sleep(0.1)
+            await buffer.stop()
+            return buffer
+        
+        buffer = asyncio.run(scenario())
+        self.assertEqual(written, ["a", "b", "c"])
+        self.assertEqual((buffer.rows_written, buffer.rows_failed, buffer.retries), (3, 0, 2))
+    
+    def test_failed_rows_dropped_only_over_limit(self):
+        """اختبار إسقاط أقدم الصفوف الفاشلة عند تجاوز حد الطابور فقط"""
+        written = []
+        database = {'up': False}
+        
+        async def write(grouped_rows):
+            if not database['up']:
+                raise RuntimeError("database is locked")
+            written.extend(row['action'] for row in grouped_rows[ActivityLog])
+        
+        async def scenario():
+            buffer = self.make_buffer(
+                batch_rows=1, queue_size=2, retry_ms=10, max_retry_ms=10, writer=write
+            )
+            await buffer.start()
+            await buffer.log_activity(1, "a")
+            await asyncio.sleep(0.005)
+            await buffer.log_activity(1, "b")
+            await buffer.log_activity(1, "c")
+            await asyncio.sleep(0.1)
+            database['up'] = True
+            await asyncio.sleep(0.05)
+            await buffer.stop()
+            return buffer
+        
+        buffer = asyncio.run(scenario())
+        self.assertEqual(written, ["b", "c"])
+        self.assertEqual((buffer.rows_written, buffer.rows_failed), (2, 1))
+    
+    def test_failed_flush_counted(self):
+        """اختبار إسقاط ما تعذرت كتابته عند الإيقاف"""
+        async def failing_write(grouped_rows):
+            raise RuntimeError("database is locked")
+        
+        async def scenario():
+            buffer = self.make_buffer(writer=failing_write)
+            await buffer.start()
+            await buffer.log_activity(1, "action")
+            await buffer.stop()
+            return buffer
+        
+        buffer = asyncio.run(scenario())
+        self.assertEqual((buffer.rows_written, buffer.rows_failed), (0, 1))
+    
+    def test_insert_rows_single_transaction(self):
+        """اختبار إدراج صفوف عدة جداول بمعاملة واحدة"""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine)()
+        self.addCleanup(db.close)
+        
+        WriteBehindBuffer.insert_rows(db, {
+            ActivityLog: [{'chat_id': 1, 'action': 'a'}, {'chat_id': 1, 'action': 'b'}],
+            DeletedMessage: [{'chat_id': 1, 'message_id': 2, 'user_id': 3}],
+        })
+        self.assertEqual(db.query(ActivityLog).count(), 2)
+        self.assertEqual(db.query(DeletedMessage).count(), 1)
+
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """اختبارات مدرج زمن الحذف"""
+    
+    def test_buckets_and_percentiles(self):
+        """اختبار توزيع القياسات على الخانات والنسب المئوية"""
+        histogram = LatencyHistogram(buckets_ms=(10, 50, 100))
+        self.assertIsNone(histogram.percentile(0.5))
+        for seconds in (0.004, 0.008, 0.030, 0.200):
+            histogram.observe(seconds)
+        
+        stats = histogram.get_stats()
+        self.assertEqual(stats['count'], 4)
+        self.assertEqual(stats['buckets'], {
+            'le_10ms': 2, 'le_50ms': 3, 'le_100ms': 3, 'le_inf': 4,
+        })
+        self.assertEqual(stats['p50_ms'], 10)
+        self.assertAlmostEqual(stats['p99_ms'], 200)
+        histogram.reset()
+        self.assertEqual(histogram.get_stats()['count'], 0)
+
+
+
+class TestDeleteFirstPath(unittest.TestCase):
+    """اختبارات حذف الإعلان قبل التسجيل والإشعار"""
+    
+    def setUp(self):
+        self.events = []
+        self.addCleanup(chat_settings_cache.clear)
+        self.addCleanup(membership_index.clear)
+        self.addCleanup(delete_latency.reset)
+        self.addCleanup(message_rate_limiter.reset_all)
+        chat_settings_cache.update(make_settings(-100))
+        membership_index.load([], [])
+        delete_latency.reset()
+        
+        patcher = mock.patch.object(near_duplicate_index, 'add_message')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    async def delete_message(self, chat_id, message_id):
+        self.events.append(('delete', message_id))
+    
+    def create_task(self, coroutine, update=None):
+        self.events.append(('background', coroutine.__qualname__))
+        coroutine.close()
+        done = asyncio.get_running_loop().create_future()
+        done.set_result(None)
+        return done
+    
+    def handle(self, text: str):
+        user = SimpleNamespace(id=7, username=None, first_name="User")
+        message = SimpleNamespace(chat_id=-100, message_id=42, text=text, from_user=user)
+        context = SimpleNamespace(
+            bot=SimpleNamespace(delete_message=self.delete_message),
+            application=SimpleNamespace(create_task=self.create_task),
+        )
+        asyncio.run(MessageHandler.handle_message(SimpleNamespace(message=message), context))
+    
+    def test_spam_deleted_before_background_logging(self):
+        """اختبار أن التسجيل ينتقل إلى الخلفية بعد الحذف وأن زمن الحذف يُقاس"""
+        self.handle("نطلع إجازة مرضية وسكليف معتمد تواصل واتساب")
+        self.assertEqual(self.events, [
+            ('delete', 42), ('background', 'MessageHandler._record_spam'),
+        ])
+        self.assertEqual(delete_latency.count, 1)
+    
+    def test_flood_deleted(self):
+        """اختبار حذف رسائل المستخدم بعد تجاوز حد الرسائل"""
+        with mock.patch.object(message_rate_limiter, 'is_allowed', return_value=False):
+            self.handle("السلام عليكم")
+        self.assertEqual(self.events, [
+            ('delete', 42), ('background', 'WriteBehindBuffer.log_activity'),
+        ])
+    
+    def test_command_limit_stops_handlers(self):
+        """اختبار إيقاف الأوامر بعد تجاوز حد الأوامر"""
+        self.addCleanup(command_rate_limiter.reset_all)
+        update = SimpleNamespace(effective_user=SimpleNamespace(id=77))
+        for _ in range(command_rate_limiter.max_requests):
+            asyncio.run(MessageHandler.limit_commands(update, None))
+        with self.assertRaises(ApplicationHandlerStop):
+            asyncio.run(MessageHandler.limit_commands(update, None))
+    
+    def test_ham_not_deleted(self):
+        """اختبار أن الرسالة العادية لا تُحذف ولا تُقاس"""
+        self.handle("السلام عليكم، متى موعد الاجتماع؟")
+        self.assertEqual(self.events, [])
+        self.assertEqual(delete_latency.count, 0)
+
+
+
+class TestChatDispatcher(unittest.TestCase):
+    """اختبارات موزع رسائل القروبات"""
+    
+    def setUp(self):
+        self.events = []
+    
+    async def handle(self, chat_id, index, delay=0):
+        await asyncio.sleep(delay)
+        self.events.append((chat_id, index))
+    
+    def test_order_kept_per_chat(self):
+        """اختبار ترتيب رسائل القروب مع معالجة القروبات بالتوازي"""
+        async def scenario():
+            dispatcher = ChatDispatcher(workers=4, quantum=2)
+            await dispatcher.start()
+            for index in range(10):
+                for chat_id in (1, 2, 3):
+                    # القروب 1 بطيء ولا يجب أن يؤخر البقية
+                    delay = 0.005 if chat_id == 1 else 0
+                    await dispatcher.submit(chat_id, self.handle, chat_id, index, delay)
+            await dispatcher.stop()
+            return dispatcher
+        
+        dispatcher = asyncio.run(scenario())
+        for chat_id in (1, 2, 3):
+            order = [index for chat, index in self.events if chat == chat_id]
+            self.assertEqual(order, list(range(10)))
+        self.assertEqual(self.events[-1][0], 1)
+        self.assertEqual(dispatcher.processed, 30)
+        self.assertEqual(dispatcher.get_stats()['pending'], 0)
+    
+    def test_large_chat_does_not_starve_others(self):
+        """اختبار أن القروب الكبير يأخذ quantum رسائل فقط في كل دور"""
+        async def scenario():
+            dispatcher = ChatDispatcher(workers=1, quantum=2)
+            await dispatcher.start()
+            for index in range(6):
+                await dispatcher.submit(1, self.handle, 1, index)
+            await dispatcher.submit(2, self.handle, 2, 0)
+            self.assertEqual(dispatcher.queue_depth(1), 6)
+            await dispatcher.stop()
+        
+        asyncio.run(scenario())
+        self.assertEqual([chat for chat, _ in self.events], [1, 1, 2, 1, 1, 1, 1])
+    
+    def test_backpressure_when_chat_queue_full(self):
+        """اختبار انتظار submit عند امتلاء طابور القروب"""
+        async def scenario():
+            release = asyncio.Event()
+            
+            async def blocked(index):
+                await release.wait()
+                self.events.append(index)
+            
+            dispatcher = ChatDispatcher(workers=1, max_queue_per_chat=1)
+            await dispatcher.start()
+            await dispatcher.submit(1, blocked, 0)
+            await asyncio.sleep(0)
+            await dispatcher.submit(1, blocked, 1)
+            third = asyncio.create_task(dispatcher.submit(1, blocked, 2))
+            await asyncio.sleep(0.01)
+            waiting = not third.done()
+            release.set()
+            await third
+            await dispatcher.stop()
+            return waiting, dispatcher.backpressure_waits
+        
+        self.assertEqual(asyncio.run(scenario()), (True, 1))
+        self.assertEqual(self.events, [0, 1, 2])
+    
+    def test_failures_do_not_stop_workers(self):
+        """اختبار استمرار المعالجة بعد خطأ في رسالة"""
+        async def failing():
+            raise RuntimeError("429 Too Many Requests")
+        
+        async def scenario():
+            dispatcher = ChatDispatcher(workers=1)
+            await dispatcher.start()
+            await dispatcher.submit(1, failing)
+            await dispatcher.submit(1, self.handle, 1, 1)
+            await dispatcher.stop()
+            return dispatcher
+        
+        dispatcher = asyncio.run(scenario())
+        self.assertEqual((dispatcher.failed, dispatcher.processed), (1, 1))
+        self.assertEqual(self.events, [(1, 1)])
+
+
+
+class TestRateLimiter(unittest.TestCase):
+    """اختبارات تحديد معدل الطلبات"""
+    
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('app.services.rate_limiter.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_bucket_refills(self):
+        """اختبار استهلاك الرموز وإعادة امتلائها مع الوقت"""
+        limiter = RateLimiter(max_requests=3, time_window=60, max_keys=10)
+        self.assertEqual([limiter.is_allowed(1) for _ in range(4)], [True, True, True, False])
+        self.assertEqual(limiter.get_remaining_requests(1), 0)
+        self.now += 20
+        self.assertEqual(limiter.get_remaining_requests(1), 1)
+        self.assertTrue(limiter.is_allowed(1))
+        self.assertFalse(limiter.is_allowed(1))
+        self.assertTrue(limiter.is_allowed((5, 1)))
+    
+    def test_idle_keys_evicted(self):
+        """اختبار حذف المفاتيح الخاملة"""
+        limiter = RateLimiter(max_requests=3, time_window=60, max_keys=10)
+        limiter.is_allowed(1)
+        limiter.is_allowed(2)
+        self.now += 61
+        limiter.is_allowed(3)
+        self.assertEqual(len(limiter), 1)
+        self.assertEqual(limiter.evicted, 2)
+    
+    def test_tracked_keys_capped(self):
+        """اختبار الحد الأعلى لعدد المفاتيح"""
+        limiter = RateLimiter(max_requests=3, time_window=60, max_keys=100)
+        for user_id in range(1000):
+            limiter.is_allowed(user_id)
+        self.assertEqual(len(limiter), 100)
+        self.assertEqual(limiter.get_remaining_requests(999), 2)
+        self.assertEqual(limiter.get_remaining_requests(0), 3)
+
+
+
+class TestBulkDeletion(unittest.TestCase):
+    """اختبارات الحذف على دفعات مقابل خادم Bot API محلي"""
+    
+    def setUp(self):
+        self.server = FakeBotAPI()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+    
+    def delete(self, message_ids):
+        async def scenario():
+            async with Bot("123:TEST", base_url=self.server.base_url) as bot:
+                return await MessageDeletionHandler.delete_messages_in_range(
+                    SimpleNamespace(bot=bot), -100, message_ids
+                )
+        
+        return asyncio.run(scenario())
+    
+    def test_batches_of_100(self):
+        """اختبار تجميع 250 رسالة في 3 طلبات deleteMessages"""
+        self.server.missing_messages.add(7)
+        stats = self.delete(list(range(1, 251)))
+        batches = self.server.calls('deleteMessages')
+        self.assertEqual([len(call['message_ids']) for call in batches], [100, 100, 50])
+        self.assertEqual(batches[0]['chat_id'], -100)
+        self.assertEqual(self.server.calls('deleteMessage'), [])
+        # الدفعة المقبولة لا تؤكد أي رسائلها حُذفت وأيها لم يكن موجوداً
+        self.assertEqual(stats, {
+            "total": 250, "deleted": 0, "unconfirmed": 250, "failed": 0, "not_found": 0,
+            "errors": [],
+        })
+    
+    def test_rejected_batch_falls_back_to_single_deletes(self):
+        """اختبار حذف رسائل الدفعة المرفوضة واحدة واحدة"""
+        self.server.undeletable_messages.add(105)
+        self.server.missing_messages.add(150)
+        stats = self.delete(list(range(1, 201)))
+        self.assertEqual(len(self.server.calls('deleteMessages')), 2)
+        singles = [call['message_id'] for call in self.server.calls('deleteMessage')]
+        self.assertEqual(singles, list(range(101, 201)))
+        self.assertEqual(
+            (stats["unconfirmed"], stats["deleted"], stats["failed"], stats["not_found"]),
+            (100, 98, 1, 1)
+        )
+    
+    def test_through_running_scheduler(self):
+        """اختبار الحذف عبر جدولة الطلبات الصادرة أثناء عملها"""
+        async def scenario():
+            await outbound.start()
+            try:
+                async with Bot("123:TEST", base_url=self.server.base_url) as bot:
+                    return await MessageDeletionHandler.delete_messages_in_range(
+                        SimpleNamespace(bot=bot), -100, list(range(1, 151))
+                    )
+            finally:
+                await outbound.stop()
+        
+        sent = outbound.sent
+        stats = asyncio.run(scenario())
+        self.assertEqual(stats["unconfirmed"], 150)
+        self.assertEqual(outbound.sent - sent, 2)
+    
+    def test_retry_after(self):
+        """اختبار إعادة الدفعة مرة واحدة من الجدولة بعد خطأ 429"""
+        async def scenario():
+            await outbound.start()
+            try:
+                async with Bot("123:TEST", base_url=self.server.base_url) as bot:
+                    return await MessageDeletionHandler.delete_messages_in_range(
+                        SimpleNamespace(bot=bot), -100, [1, 2, 3]
+                    )
+            finally:
+                await outbound.stop()
+        
+        self.server.retry_after.append(1)
+        retries = outbound.retries
+        stats = asyncio.run(scenario())
+        self.assertEqual(outbound.retries - retries, 1)
+        self.assertEqual(len(self.server.calls('deleteMessages')), 2)
+        self.assertEqual(stats["unconfirmed"], 3)
+
+
+def chat_member(user_id: int, status: str = 'administrator', **rights):
+    """عضوية كما يرسلها تلقرام"""
+    member = {
+        'status': status,
+        'user': {'id': user_id, 'is_bot': user_id == 1, 'first_name': f"user{user_id}"},
+        'is_anonymous': False,
+    }
+    if status == 'administrator':
+        member.update({
+            'can_be_edited': False, 'can_manage_chat': True, 'can_delete_messages': True,
+            'can_manage_video_chats': False, 'can_restrict_members': True,
+            'can_promote_members': False, 'can_change_info': False, 'can_invite_users': True,
+        })
+        member.update(rights)
+    return member
+
+
+def member_update(chat_id: int, old: dict, new: dict) -> ChatMemberUpdated:
+    return ChatMemberUpdated.de_json({
+        'chat': {'id': chat_id, 'type': 'supergroup'},
+        'from': {'id': 10, 'is_bot': False, 'first_name': 'owner'},
+        'date': 1700000000,
+        'old_chat_member': old,
+        'new_chat_member': new,
+    }, None)
+
+
+class TestAdminRoster(unittest.TestCase):
+    """اختبارات ذاكرة مسؤولي القروبات مقابل خادم Bot API محلي"""
+    
+    def setUp(self):
+        self.server = FakeBotAPI()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        # البوت (المعرف 1) مسؤول يحذف الرسائل، و10 المالك، و20 مسؤول
+        self.server.administrators[-100] = [
+            chat_member(10, 'creator'), chat_member(1), chat_member(20, can_delete_messages=False),
+        ]
+        admin_roster.clear()
+        self.addCleanup(admin_roster.clear)
+    
+    def run_with_bot(self, scenario):
+        async def run():
+            async with Bot("123:TEST", base_url=self.server.base_url) as bot:
+                return await scenario(bot)
+        
+        return asyncio.run(run())
+    
+    def test_permission_checks_use_one_request(self):
+        """اختبار أن فحوص الصلاحيات المتكررة ترسل طلب getChatAdministrators واحداً"""
+        async def scenario(bot):
+            context = SimpleNamespace(bot=bot)
+            results = []
+            for user_id in (10, 20, 30) * 10:
+                results.append(
+                    await MessageDeletionHandler.check_user_permissions(context, -100, user_id)
+                )
+            results.append(await MessageDeletionHandler.check_bot_permissions(context, -100))
+            return results
+        
+        results = self.run_with_bot(scenario)
+        self.assertEqual(len(self.server.calls('getChatAdministrators')), 1)
+        # عضوية البوت تُطلب مع القائمة لأنها لا تشمل البوتات
+        self.assertEqual(len(self.server.calls('getChatMember')), 1)
+        owner, admin, member = results[:3]
+        self.assertEqual((owner['is_creator'], owner['can_delete_messages']), (True, True))
+        self.assertEqual((admin['is_administrator'], admin['can_delete_messages']), (True, False))
+        self.assertEqual((member['is_administrator'], member['status']), (False, 'member'))
+        self.assertTrue(results[-1]['can_delete_messages'])
+        self.assertTrue(results[-1]['can_restrict_members'])
+    
+    def test_member_updates_change_roster(self):
+        """اختبار الترقية والإزالة من تحديثات chat_member دون طلبات"""
+        async def scenario(bot):
+            roster = AdminRoster(ttl=600)
+            await roster.get(bot, -100)
+            plain = {'status': 'member', 'user': chat_member(30)['user']}
+            roster.apply_member_update(member_update(-100, plain, chat_member(30)), bot.id)
+            roster.apply_member_update(member_update(-100, chat_member(20), {
+                'status': 'member', 'user': chat_member(20)['user'],
+            }), bot.id)
+            # قروب غير محفوظ: يُحمّل كاملاً عند أول أمر
+            roster.apply_member_update(member_update(-200, plain, chat_member(30)), bot.id)
+            return (
+                await roster.get_member(bot, -100, 30),
+                await roster.get_member(bot, -100, 20),
+                len(roster),
+            )
+        
+        promoted, demoted, chats = self.run_with_bot(scenario)
+        self.assertEqual(promoted.status, 'administrator')
+        self.assertIsNone(demoted)
+        self.assertEqual(chats, 1)
+        self.assertEqual(len(self.server.calls('getChatAdministrators')), 1)
+    
+    def test_bot_leaving_invalidates_chat(self):
+        """اختبار حذف قائمة القروب عند خروج البوت منه"""
+        async def scenario(bot):
+            roster = AdminRoster(ttl=600)
+            await roster.get(bot, -100)
+            roster.apply_member_update(member_update(-100, chat_member(1), {
+                'status': 'left', 'user': chat_member(1)['user'],
+            }), bot.id)
+            return len(roster)
+        
+        self.assertEqual(self.run_with_bot(scenario), 0)
+    
+    def test_concurrent_first_lookups_share_request(self):
+        """اختبار أن الأوامر المتزامنة لقروب جديد تنتظر نفس الطلب"""
+        async def scenario(bot):
+            roster = AdminRoster(ttl=600)
+            return await asyncio.gather(*(roster.get_member(bot, -100, 10) for _ in range(5)))
+        
+        members = self.run_with_bot(scenario)
+        self.assertEqual({member.status for member in members}, {'creator'})
+        self.assertEqual(len(self.server.calls('getChatAdministrators')), 1)
+    
+    def test_expired_roster_served_while_refreshing(self):
+        """اختبار استخدام القائمة المنتهية فوراً وبقائها إذا فشل التحديث بخطأ 429"""
+        async def scenario(bot):
+            roster = AdminRoster(ttl=0)
+            await roster.get(bot, -100)
+            self.server.retry_after.append(30)
+            stale = await roster.get_member(bot, -100, 20)
+            # التحديث في الخلفية فشل، فتبقى القائمة كما هي
+            await asyncio.gather(*roster._loading.values(), return_exceptions=True)
+            self.server.administrators[-100].pop()
+            kept = await roster.get_member(bot, -100, 20)
+            await asyncio.gather(*roster._loading.values(), return_exceptions=True)
+            refreshed = await roster.get_member(bot, -100, 20)
+            return stale, kept, refreshed, roster.refreshes
+        
+        stale, kept, refreshed, refreshes = self.run_with_bot(scenario)
+        self.assertIsNotNone(stale)
+        self.assertIsNotNone(kept)
+        self.assertIsNone(refreshed)
+        self.assertEqual(refreshes, 2)
+    
+    def test_bot_rights_survive_refresh(self):
+        """اختبار بقاء صلاحيات البوت بعد إعادة تحميل القائمة"""
+        async def scenario(bot):
+            roster = AdminRoster(ttl=0)
+            first = await roster.get_member(bot, -100, bot.id)
+            await asyncio.sleep(0.01)
+            await roster.get(bot, -100)
+            await asyncio.gather(*roster._loading.values())
+            return first, await roster.get_member(bot, -100, bot.id), roster.refreshes
+        
+        first, refreshed, refreshes = self.run_with_bot(scenario)
+        self.assertTrue(first.can_delete_messages)
+        self.assertTrue(refreshed.can_delete_messages)
+        self.assertEqual(refreshes, 2)
+
+
+
+class TestNotificationDigest(unittest.TestCase):
+    """اختبارات ملخص إشعارات الإعلانات المحذوفة"""
+    
+    def setUp(self):
+        self.server = FakeBotAPI()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+    
+    def run_with_bot(self, scenario):
+        async def run():
+            async with Bot("123:TEST", base_url=self.server.base_url) as bot:
+                return await scenario(bot)
+        
+        return asyncio.run(run())
+    
+    def test_one_digest_per_chat_per_window(self):
+        """اختبار إرسال رسالة واحدة لكل قروب تجمع إعلانات النافذة"""
+        async def scenario(bot):
+            digest = NotificationDigest(window=0.2, top_keywords=2, top_offenders=1)
+            await digest.start()
+            for index in range(30):
+                keywords = ['سكليف', 'واتساب'] if index % 3 else ['سكليف', 'اجازة']
+                user_id = 7 if index < 20 else 8
+                digest.add(bot, -100 - index % 2, user_id, f"user{user_id}",
+                           keywords, 0.5 + index / 100)
+            await asyncio.sleep(0.4)
+            digest.add(bot, -100, 9, 'late', ['رسمي'], 0.9)
+            await digest.stop()
+            return digest.get_stats()
+        
+        stats = self.run_with_bot(scenario)
+        sent = self.server.calls('sendMessage')
+        self.assertEqual([call['chat_id'] for call in sent], [-100, -101, -100])
+        first = sent[0]['text']
+        self.assertIn('عدد الرسائل: 15', first)
+        self.assertIn('سكليف (15)', first)
+        self.assertIn('واتساب (10)', first)
+        self.assertNotIn('اجازة', first)
+        self.assertIn('user7 (10)', first)
+        self.assertNotIn('user8', first)
+        self.assertIn('عدد الرسائل: 1', sent[2]['text'])
+        self.assertEqual((stats['events'], stats['sent'], stats['pending_chats']), (31, 3, 0))
+    
+    def test_stop_sends_pending_digests(self):
+        """اختبار إرسال الملخصات المنتظرة عند الإيقاف قبل نهاية النافذة"""
+        async def scenario(bot):
+            digest = NotificationDigest(window=600)
+            await digest.start()
+            digest.add(bot, -100, 7, 'spammer', ['سكليف'], 0.9)
+            await asyncio.sleep(0.05)
+            self.assertEqual(self.server.calls('sendMessage'), [])
+            await digest.stop()
+        
+        self.run_with_bot(scenario)
+        self.assertEqual(len(self.server.calls('sendMessage')), 1)
+    
+    def test_respects_notify_admins(self):
+        """اختبار تجاهل القروبات التي عطلت إشعارات المسؤولين"""
+        settings = {-100: make_settings(-100), -200: make_settings(-200)}
+        settings[-200].notify_admins = False
+        digest = NotificationDigest(window=600)
+        
+        async def scenario():
+            context = SimpleNamespace(bot=None)
+            for chat_id in (-100, -200):
+                await MessageHandler._notify_admins(context, chat_id, 7, 'spammer', 0.9, ['سكليف'])
+        
+        with mock.patch('app.handlers.message_handler.notification_digest', digest), \
+                mock.patch('app.handlers.message_handler.async_db.get_chat_settings',
+                           mock.AsyncMock(side_effect=settings.get)), \
+                mock.patch.dict(FEATURES, enable_group_spam_digest=True):
+            asyncio.run(scenario())
+        self.assertEqual(digest.get_stats()['pending_chats'], 1)
+        self.assertEqual(list(digest._pending), [-100])
+    
+    def test_disabled_by_default(self):
+        """اختبار عدم نشر الملخصات في القروبات بدون تفعيل الميزة"""
+        digest = NotificationDigest(window=600)
+        get_chat_settings = mock.AsyncMock(return_value=make_settings(-100))
+        
+        with mock.patch('app.handlers.message_handler.notification_digest', digest), \
+                mock.patch('app.handlers.message_handler.async_db.get_chat_settings',
+                           get_chat_settings):
+            asyncio.run(MessageHandler._notify_admins(
+                SimpleNamespace(bot=None), -100, 7, 'spammer', 0.9, ['سكليف']
+            ))
+        self.assertEqual(digest.get_stats()['pending_chats'], 0)
+        get_chat_settings.assert_not_awaited()
+
+
+
+class TestReputationTracker(unittest.TestCase):
+    """اختبارات سمعة الأعضاء وحفظها على دفعات"""
+    
+    DAY = 86400
+    
+    def setUp(self):
+        self.saved = []
+    
+    async def save(self, rows):
+        self.saved.append(rows)
+    
+    def make_tracker(self, **kwargs):
+        options = dict(
+            trust_threshold=100, half_life=30 * self.DAY, spam_penalty=200,
+            flush_interval=0.05, saver=self.save,
+        )
+        options.update(kwargs)
+        return ReputationTracker(**options)
+    
+    def test_trust_builds_decays_and_drops_on_spam(self):
+        """اختبار الوصول للثقة بالرسائل السليمة وفقدانها بالتناقص أو الإعلان"""
+        tracker = self.make_tracker()
+        for index in range(99):
+            tracker.record(1, 10, "member", False, now=index)
+        self.assertFalse(tracker.is_trusted(1, 10, now=100))
+        # التناقص خلال الدقائق الأولى ضئيل جداً
+        tracker.record(1, 10, "member", False, now=100)
+        tracker.record(1, 10, "member", False, now=100)
+        self.assertTrue(tracker.is_trusted(1, 10, now=100))
+        self.assertFalse(tracker.is_trusted(2, 10, now=100))
+        
+        # بعد نصف عمر تنخفض الدرجة للنصف
+        score = tracker.score(1, 10, now=100)
+        self.assertAlmostEqual(tracker.score(1, 10, now=100 + 30 * self.DAY), score / 2)
+        
+        tracker.record(1, 10, "member", True, now=200)
+        self.assertAlmostEqual(tracker.score(1, 10, now=200), -200)
+        for index in range(150):
+            tracker.record(1, 10, "member", False, now=300 + index)
+        self.assertFalse(tracker.is_trusted(1, 10, now=500))
+    
+    def test_batched_flush_and_reload(self):
+        """اختبار الحفظ الدوري للسجلات المعدلة فقط وإعادة تحميلها"""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine)()
+        self.addCleanup(db.close)
+        
+        async def scenario():
+            tracker = self.make_tracker()
+            await tracker.start()
+            for user_id in range(5):
+                tracker.record(1, user_id, f"user{user_id}", user_id == 4)
+            await asyncio.sleep(0.1)
+            tracker.record(1, 0, "user0", False)
+            await tracker.stop()
+            return tracker
+        
+        tracker = asyncio.run(scenario())
+        self.assertEqual([len(rows) for rows in self.saved], [5, 1])
+        for rows in self.saved:
+            ReputationTracker.save_rows(db, rows)
+        self.assertEqual(db.query(UserStatistics).count(), 5)
+        
+        reloaded = self.make_tracker()
+        self.assertEqual(reloaded.load(db.query(UserStatistics).all()), 5)
+        self.assertAlmostEqual(reloaded.score(1, 0), tracker.score(1, 0), places=3)
+        self.assertAlmostEqual(reloaded.score(1, 4), -200, places=3)
+        self.assertEqual(reloaded._entries[(1, 0)].clean_count, 2)
+    
+    def test_evicted_member_keeps_pending_write(self):
+        """اختبار بقاء تعديل العضو الخارج من الذاكرة حتى يُحفظ"""
+        tracker = self.make_tracker(max_entries=2)
+        for user_id in range(3):
+            tracker.record(1, user_id, "user", False, now=0)
+        self.assertEqual(len(tracker), 2)
+        tracker.record(1, 0, "user", False, now=1)
+        asyncio.run(tracker.flush())
+        counts = {row['user_id']: row['clean_count'] for row in self.saved[0]}
+        self.assertEqual(counts, {0: 2, 1: 1, 2: 1})
+    
+    def test_failed_flush_kept_for_next_write(self):
+        """اختبار إعادة السجلات التي فشل حفظها في الكتابة التالية"""
+        async def failing_save(rows):
+            tracker.saver = self.save
+            tracker.record(1, 1, "user", True, now=2)
+            raise RuntimeError("database is locked")
+        
+        tracker = self.make_tracker(saver=failing_save)
+        tracker.record(1, 0, "user", False, now=0)
+        tracker.record(1, 1, "user", False, now=0)
+        self.assertEqual(asyncio.run(tracker.flush()), 0)
+        self.assertEqual(tracker.rows_failed, 2)
+        
+        self.assertEqual(asyncio.run(tracker.flush()), 2)
+        counts = {
+            row['user_id']: (row['clean_count'], row['spam_count']) for row in self.saved[0]
+        }
+        self.assertEqual(counts, {0: (1, 0), 1: (1, 1)})
+        self.assertEqual(tracker.get_stats()['pending_writes'], 0)
+    
+    def test_fast_path_savings_stats(self):
+        """اختبار تقدير وقت الكشف الموفر"""
+        tracker = self.make_tracker()
+        for _ in range(10):
+            tracker.record_detection(False, 0.002)
+            tracker.record_detection(True, 0.0005)
+        stats = tracker.get_stats()
+        self.assertEqual((stats['trusted_messages'], stats['full_messages']), (10, 10))
+        self.assertAlmostEqual(stats['saved_seconds'], 0.015)
+        self.assertEqual(stats['saved_rate'], "37.50%")
+
+
+class TestOutboundScheduler(unittest.TestCase):
+    """اختبارات جدولة طلبات تلقرام الصادرة"""
+    
+    def setUp(self):
+        self.calls = []
+    
+    def make_call(self, name, result=None):
+        async def call():
+            self.calls.append(name)
+            await asyncio.sleep(0)
+            return result
+        return call
+    
+    def test_deletes_before_cleanup(self):
+        """اختبار أن حذف الإعلان الجديد يسبق دفعات التنظيف المنتظرة"""
+        async def scenario():
+            scheduler = OutboundScheduler(workers=1)
+            await scheduler.start()
+            cleanup = [
+                asyncio.create_task(
+                    scheduler.submit(PRIORITY_CLEANUP, 1, self.make_call(f"cleanup-{index}"))
+                )
+                for index in range(5)
+            ]
+            await asyncio.sleep(0)
+            await scheduler.submit(PRIORITY_DELETE, 2, self.make_call("spam"))
+            await asyncio.gather(*cleanup)
+            await scheduler.stop()
+        
+        asyncio.run(scenario())
+        self.assertLess(self.calls.index("spam"), 2)
+        self.assertEqual(len(self.calls), 6)
+    
+    def test_global_rate_share(self):
+        """اختبار حصة العملية من الحد العام، ولو كانت أقل من طلب في الثانية"""
+        scheduler = OutboundScheduler()
+        scheduler.set_global_rate(30 / 8)
+        allowed = [scheduler.global_limiter.is_allowed('bot') for _ in range(5)]
+        self.assertEqual(allowed, [True, True, True, False, False])
+        
+        scheduler.set_global_rate(0.5)
+        self.assertTrue(scheduler.global_limiter.is_allowed('bot'))
+        self.assertFalse(scheduler.global_limiter.is_allowed('bot'))
+        self.assertAlmostEqual(scheduler.global_limiter.wait_time('bot'), 2.0, places=1)
+        self.assertEqual(scheduler.get_stats()['global_rate'], 0.5)
+    
+    def test_retry_after_blocks_only_that_chat(self):
+        """اختبار إعادة الطلب بعد 429 دون إيقاف القروبات الأخرى"""
+        attempts = []
+        
+        async def limited():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise RetryAfter(0.05)
+            return "sent"
+        
+        async def scenario():
+            scheduler = OutboundScheduler(workers=2)
+            await scheduler.start()
+            first = asyncio.create_task(scheduler.submit(PRIORITY_REPLY, 1, limited))
+            await asyncio.sleep(0.01)
+            await scheduler.submit(PRIORITY_REPLY, 2, self.make_call("other"))
+            other_done = time.monotonic()
+            result = await first
+            await scheduler.stop()
+            return result, other_done, scheduler.retries
+        
+        result, other_done, retries = asyncio.run(scenario())
+        self.assertEqual((result, retries), ("sent", 1))
+        self.assertLess(other_done, attempts[1])
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.05)
+    
+    def test_status_edits_coalesced(self):
+        """اختبار دمج تعديلات رسالة الحالة التي لم تُرسل بعد"""
+        class StatusMessage:
+            chat_id = 1
+            message_id = 10
+            
+            async def edit_text(message, text):
+                self.calls.append(text)
+                return text
+        
+        async def scenario():
+            scheduler = OutboundScheduler(workers=1)
+            await scheduler.start()
+            release = asyncio.Event()
+            busy = asyncio.create_task(scheduler.submit(PRIORITY_DELETE, 2, release.wait))
+            await asyncio.sleep(0)
+            edits = [
+                asyncio.create_task(scheduler.edit_text(StatusMessage(), f"{index}%"))
+                for index in (10, 50, 90)
+            ]
+            await asyncio.sleep(0)
+            release.set()
+            results = await asyncio.gather(*edits)
+            await busy
+            await scheduler.stop()
+            return results, scheduler.coalesced
+        
+        results, coalesced = asyncio.run(scenario())
+        self.assertEqual(self.calls, ["90%"])
+        self.assertEqual(results, ["90%"] * 3)
+        self.assertEqual(coalesced, 2)
+    
+    def test_chat_message_limit(self):
+        """اختبار حد الرسائل لكل قروب"""
+        async def scenario():
+            scheduler = OutboundScheduler(workers=2, chat_rate=2)
+            await scheduler.start()
+            replies = [
+                asyncio.create_task(scheduler.submit(PRIORITY_REPLY, 1, self.make_call(index)))
+                for index in range(3)
+            ]
+            await scheduler.submit(PRIORITY_REPLY, 2, self.make_call("other"))
+            await asyncio.sleep(0.05)
+            sent = list(self.calls)
+            
+            # بعد امتلاء الدلو تُرسل الرسالة الثالثة
+            scheduler.chat_limiter.reset_all()
+            await scheduler.submit(PRIORITY_DELETE, 3, self.make_call("wake"))
+            await asyncio.gather(*replies)
+            await scheduler.stop()
+            return sent
+        
+        self.assertEqual(sorted(map(str, asyncio.run(scenario()))), ["0", "1", "other"])
+        self.assertIn(2, self.calls)
+
+
+def recorded_message(update_id: int, chat_id: int, text: str, field: str = 'message'):
+    """تحديث كما يرسله تلقرام لرسالة في قروب"""
+    message = {
+        'message_id': update_id,
+        'date': 1700000000,
+        'chat': {'id': chat_id, 'type': 'supergroup', 'title': f'group {chat_id}'},
+        'from': {'id': 500 + update_id, 'is_bot': False, 'first_name': 'user'},
+        'text': text,
+    }
+    if field == 'edited_message':
+        message['edit_date'] = 1700000060
+    return {'update_id': update_id, field: message}
+
+
+RECORDED_UPDATES = [
+    recorded_message(1, -1001, 'السلام عليكم'),
+    recorded_message(2, -1002, 'سكليف رسمي للتواصل واتساب 0551234567'),
+    recorded_message(3, -1001, 'كيف حالكم', 'edited_message'),
+    recorded_message(4, -1003, 'مرحبا'),
+]
+
+
+class TestWebhook(unittest.TestCase):
+    """اختبارات استقبال التحديثات عبر Webhook بخادم uvicorn محلي"""
+    
+    SECRET = 'test-secret'
+    
+    def serve(self, sink, scenario):
+        """تشغيل الخادم على منفذ محلي وتنفيذ scenario(client, url) عليه"""
+        async def run():
+            sock = socket.socket()
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+            server = uvicorn.Server(uvicorn.Config(
+                create_webhook_app(sink, self.SECRET), log_level='warning'
+            ))
+            server.install_signal_handlers = lambda: None
+            task = asyncio.create_task(server.serve(sockets=[sock]))
+            while not server.started:
+                await asyncio.sleep(0.01)
+            try:
+                async with httpx.AsyncClient() as client:
+                    return await scenario(
+                        client, f"http://127.0.0.1:{port}{WEBHOOK_CONFIG['path']}"
+                    )
+            finally:
+                server.should_exit = True
+                await task
+                sock.close()
+        
+        return run
+    
+    def post(self, client, url, update, secret=SECRET):
+        headers = {SECRET_HEADER: secret} if secret is not None else {}
+        return client.post(url, content=json.dumps(update), headers=headers)
+    
+    def test_update_chat_id(self):
+        """اختبار استخراج القروب من التحديث الخام"""
+        self.assertEqual(update_chat_id(RECORDED_UPDATES[1]), -1002)
+        self.assertEqual(update_chat_id(RECORDED_UPDATES[2]), -1001)
+        self.assertEqual(update_chat_id({'update_id': 9, 'poll': {}}), 0)
+    
+    def test_recorded_updates_reach_handlers(self):
+        """اختبار وصول التحديثات المسجلة إلى معالجات التطبيق بالترتيب"""
+        server = FakeBotAPI()
+        server.start()
+        self.addCleanup(server.stop)
+        application = Application.builder().token("123:TEST").base_url(server.base_url).build()
+        received = []
+        
+        async def record(update, context):
+            received.append(
+                (update.update_id, update.effective_chat.id, update.effective_message.text)
+            )
+        
+        application.add_handler(TgMessageHandler(None, record))
+        
+        async def scenario(client, url):
+            statuses = [
+                (await self.post(client, url, update)).status_code for update in RECORDED_UPDATES
+            ]
+            for _ in range(200):
+                if len(received) == len(RECORDED_UPDATES):
+                    break
+                await asyncio.sleep(0.01)
+            return statuses
+        
+        statuses = []
+        
+        async def serve():
+            statuses.extend(await self.serve(application_sink(application), scenario)())
+        
+        asyncio.run(run_application(application, serve))
+        self.assertEqual(statuses, [200] * len(RECORDED_UPDATES))
+        self.assertEqual(received, [
+            (1, -1001, 'السلام عليكم'),
+            (2, -1002, 'سكليف رسمي للتواصل واتساب 0551234567'),
+            (3, -1001, 'كيف حالكم'),
+            (4, -1003, 'مرحبا'),
+        ])
+    
+    def test_rejects_wrong_secret(self):
+        """اختبار رفض الطلبات بدون الرمز السري الصحيح"""
+        sunk = []
+        
+        async def sink(data, body):
+            sunk.append(data)
+            return True
+        
+        async def scenario(client, url):
+            return [
+                (await self.post(client, url, RECORDED_UPDATES[0], secret)).status_code
+                for secret in ('wrong', None, '', self.SECRET)
+            ]
+        
+        self.assertEqual(asyncio.run(self.serve(sink, scenario)()), [403, 403, 403, 200])
+        self.assertEqual(sunk, [RECORDED_UPDATES[0]])
+    
+    def test_backpressure_when_queue_full(self):
+        """اختبار الرد بـ 503 و Retry-After عند امتلاء طابور التطبيق"""
+        application = Application.builder().token("123:TEST").build()
+        
+        async def scenario(client, url):
+            responses = [await self.post(client, url, update) for update in RECORDED_UPDATES[:3]]
+            return [(r.status_code, r.headers.get('Retry-After')) for r in responses]
+        
+        responses = asyncio.run(self.serve(application_sink(application, max_queued=2), scenario)())
+        self.assertEqual(responses, [(200, None), (200, None), (503, '1')])
+        self.assertEqual(application.update_queue.qsize(), 2)
+    
+    def test_set_webhook(self):
+        """اختبار تسجيل العنوان والرمز السري لدى تلقرام"""
+        server = FakeBotAPI()
+        server.start()
+        self.addCleanup(server.stop)
+        
+        async def scenario():
+            async with Bot("123:TEST", base_url=server.base_url) as bot:
+                await set_webhook(bot, 'https://bot.example.com/', self.SECRET, '/hook')
+        
+        asyncio.run(scenario())
+        call = server.calls('setWebhook')[0]
+        self.assertEqual(call['url'], 'https://bot.example.com/hook')
+        self.assertEqual(call['secret_token'], self.SECRET)
+
+
+def collect_frames(index, sock, inherited, results):
+    """عملية عاملة للاختبار: ترسل القروبات التي وصلتها بالترتيب"""
+    for other in inherited:
+        other.close()
+    
+    async def run():
+        reader, writer = await asyncio.open_connection(sock=sock)
+        chats = [update_chat_id(json.loads(frame)) async for frame in read_frames(reader)]
+        writer.close()
+        return chats
+    
+    results.put((index, asyncio.run(run())))
+
+
+class TestChatAffinityRouter(unittest.TestCase):
+    """اختبارات توزيع التحديثات على العمليات العاملة"""
+    
+    def test_worker_sends_at_its_share_of_global_rate(self):
+        """اختبار أن كل عملية عاملة ترسل بحصتها من حد تلقرام العام"""
+        from app.services import prefork
+        self.addCleanup(outbound.set_global_rate, outbound.global_rate)
+        
+        with mock.patch.object(prefork.signal, 'signal'), \
+                mock.patch.object(prefork.asyncio, 'run'), \
+                mock.patch.object(prefork, 'serve_worker', mock.Mock()):
+            prefork._worker_main(0, mock.Mock(), [], mock.Mock(), "123:TEST", 8)
+        self.assertEqual(
+            outbound.global_rate * 8, OUTBOUND_CONFIG['global_requests_per_second']
+        )
+    
+    def test_chat_always_reaches_same_worker_in_order(self):
+        """اختبار وصول كل رسائل القروب لنفس العملية المتفرعة بترتيبها"""
+        import multiprocessing
+        results = multiprocessing.get_context('fork').Queue()
+        processes, sockets = start_workers(3, collect_frames, results)
+        updates = [recorded_message(index, -1000 - index % 7, 'x') for index in range(60)]
+        
+        async def scenario():
+            router = ChatAffinityRouter(sockets)
+            await router.connect()
+            for update in updates:
+                body = json.dumps(update).encode()
+                self.assertTrue(await router.sink(update, body))
+            await router.close()
+            return router.get_stats()
+        
+        stats = asyncio.run(scenario())
+        received = dict(results.get(timeout=10) for _ in processes)
+        for process in processes:
+            process.join(timeout=10)
+            self.assertEqual(process.exitcode, 0)
+        
+        self.assertEqual(sum(stats['routed']), 60)
+        for index, chats in received.items():
+            expected = [
+                update_chat_id(update) for update in updates
+                if worker_index(update_chat_id(update), 3) == index
+            ]
+            self.assertEqual(chats, expected)
+    
+    def test_rejects_when_worker_falls_behind(self):
+        """اختبار رفض تحديثات العملية المتأخرة دون التأثير على غيرها"""
+        pairs = [socket.socketpair() for _ in range(2)]
+        self.addCleanup(lambda: [sock.close() for pair in pairs for sock in pair])
+        
+        async def scenario():
+            router = ChatAffinityRouter([front for front, _ in pairs], max_buffer=64 * 1024)
+            await router.connect()
+            stuck = recorded_message(1, 0, 'x' * 4096)
+            body = json.dumps(stuck).encode()
+            accepted = 0
+            # لا أحد يقرأ من العملية 0
+            while await router.sink(stuck, body):
+                accepted += 1
+                self.assertLess(accepted, 10000)
+            other = recorded_message(2, 1, 'y')
+            other_accepted = await router.sink(other, json.dumps(other).encode())
+            # الإغلاق ينتظر حتى تقرأ العملية ما تراكم لها
+            reader, _ = await asyncio.open_connection(sock=pairs[0][1])
+            await asyncio.gather(router.close(), reader.read())
+            return router.rejected, other_accepted
+        
+        self.assertEqual(asyncio.run(scenario()), (1, True))
+
+
+
+class TestPostInit(unittest.TestCase):
+    """اختبارات تهيئة البوت عند البدء"""
+    
+    def test_failed_step_does_not_stop_the_rest(self):
+        """اختبار أن فشل تسجيل الأوامر أو بدء خدمة لا يمنع بقية الخطوات"""
+        import main
+        
+        services = (
+            main.write_behind, main.outbound, main.chat_dispatcher,
+            main.notification_digest, main.detection_pool, main.reputation_tracker,
+        )
+        starts = {}
+        for service in services:
+            starts[service] = mock.AsyncMock(
+                side_effect=RuntimeError("failed") if service is main.outbound else None
+            )
+            patcher = mock.patch.object(service, 'start', starts[service])
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        loads = []
+        patcher = mock.patch.object(
+            main, '_load_index', lambda name, load: loads.append(name)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        
+        bot = SimpleNamespace(set_my_commands=mock.AsyncMock(side_effect=RuntimeError("timed out")))
+        with mock.patch('builtins.print'):
+            asyncio.run(main.post_init(SimpleNamespace(bot=bot)))
+        
+        bot.set_my_commands.assert_awaited_once()
+        for service in services:
+            starts[service].assert_awaited_once()
+        self.assertEqual(len(loads), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()